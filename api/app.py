@@ -10,21 +10,45 @@ Initializes:
     - ML Models (GNN / anomaly / scoring)
 """
 
+import os
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+# client_code services are imported as packages (data_ingestion.*, anomaly_detection.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.client_packages import register_client_packages
+
+register_client_packages()
+
 from routers.identity_router import router as identity_router
 from routers.anomaly_router import router as anomaly_router
+from routers.anomaly_router import load_anomaly_state, save_anomaly_state
 from routers.credibility_router import router as credibility_router
 from routers.escrow_router import router as escrow_router
 from routers.graph_router import router as graph_router
 from routers.alerts_router import router as alerts_router
 from routers.dashboard_router import router as dashboard_router
 from routers.explainability_router import router as explainability_router
+from routers.ingestion_router import router as ingestion_router
+from routers.ingestion_router import start_webhook_consumer, stop_webhook_consumer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background consumer for micro-batched webhook ingestion
+    await start_webhook_consumer()
+    # Online anomaly statistics survive restarts through a snapshot
+    await load_anomaly_state()
+    yield
+    await stop_webhook_consumer()
+    await save_anomaly_state()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="FundWise Backend")
+    app = FastAPI(title="FundWise Backend", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -42,6 +66,7 @@ def create_app() -> FastAPI:
     app.include_router(alerts_router)
     app.include_router(dashboard_router)
     app.include_router(explainability_router)
+    app.include_router(ingestion_router)
 
     return app
 
@@ -16,4 +16,21 @@ class AppConfig:
         self.secret_key = os.getenv("FASTAPI_SECRET_KEY")
         self.upi_key = os.getenv("UPI_API_KEY")
 
+        self.txn_log_dir = config.get("INGESTION", "TXN_LOG_DIR", fallback="data/transactions_log")
+        self.txn_dedup_index_path = config.get("INGESTION", "TXN_DEDUP_INDEX_PATH", fallback="data/txn_ids.idx")
+        self.txn_dedup_bloom_capacity = config.getint("INGESTION", "TXN_DEDUP_BLOOM_CAPACITY", fallback=0)
+        self.webhook_queue_size = config.getint("INGESTION", "WEBHOOK_QUEUE_SIZE", fallback=10000)
+        self.webhook_batch_size = config.getint("INGESTION", "WEBHOOK_BATCH_SIZE", fallback=500)
+        self.webhook_batch_latency_ms = config.getint("INGESTION", "WEBHOOK_BATCH_LATENCY_MS", fallback=20)
+        self.webhook_spill_dir = config.get("INGESTION", "WEBHOOK_SPILL_DIR", fallback="data/webhook_spill")
+
+        self.anomaly_state_path = config.get("ANOMALY", "ONLINE_STATE_PATH", fallback="data/anomaly_online_state.npz")
+        self.anomaly_z_threshold = config.getfloat("ANOMALY", "Z_THRESHOLD", fallback=3.0)
+        self.anomaly_decay = config.getfloat("ANOMALY", "ONLINE_DECAY", fallback=0.999)
+        self.anomaly_min_count = config.getint("ANOMALY", "ONLINE_MIN_COUNT", fallback=5)
+        self.anomaly_save_every_n = config.getint("ANOMALY", "ONLINE_SAVE_EVERY_N", fallback=1000)
+        self.anomaly_save_interval_seconds = config.getfloat("ANOMALY", "ONLINE_SAVE_INTERVAL_SECONDS", fallback=60.0)
+        self.anomaly_shared_state_dir = config.get("ANOMALY", "SHARED_STATE_DIR", fallback="")
+        self.anomaly_shared_state_reload_seconds = config.getfloat("ANOMALY", "SHARED_STATE_RELOAD_SECONDS", fallback=5.0)
+
 config = AppConfig()
@@ -0,0 +1,137 @@
+"""
+webhook_queue.py
+----------------
+Bounded asyncio queue with a micro-batching consumer for webhook ingestion.
+Requests only enqueue; a single background task drains the queue and
+flushes batches to storage when either the batch size or the latency
+budget is reached.
+
+Queued payloads were already acknowledged (202), so a batch is never
+dropped: a failed flush is retried with exponential backoff, then handed
+to spill_fn (a separate durable log replayed at startup). If the spill
+fails too, the batch keeps being retried; meanwhile the queue fills up
+and new webhooks get 429, which the provider retries.
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger("WebhookQueue")
+
+_STOP = object()
+
+
+class WebhookBatchQueue:
+    def __init__(self, flush_fn: Callable[[List[Dict]], None], max_queue_size: int = 10000,
+                 max_batch_size: int = 500, max_batch_latency_ms: int = 20,
+                 spill_fn: Optional[Callable[[List[Dict]], None]] = None,
+                 max_flush_retries: int = 5, retry_backoff_ms: int = 50, max_backoff_ms: int = 5000):
+        """
+        Args:
+            flush_fn: blocking function that persists a batch of payloads
+            max_queue_size: payloads held in memory before rejecting requests
+            max_batch_size: flush once this many payloads are collected
+            max_batch_latency_ms: flush once the oldest payload waited this long
+            spill_fn: blocking fallback that durably parks a batch flush_fn keeps rejecting
+            max_flush_retries: flush_fn attempts before spilling
+            retry_backoff_ms / max_backoff_ms: first and largest wait between attempts
+        """
+        self.flush_fn = flush_fn
+        self.spill_fn = spill_fn
+        self.max_flush_retries = max_flush_retries
+        self.retry_backoff_ms = retry_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency_ms = max_batch_latency_ms
+        self.queue = None
+        self._consumer = None
+        self.metrics = {'accepted': 0, 'rejected': 0, 'flushed': 0, 'batches': 0, 'flush_errors': 0,
+                        'spilled': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._consumer is not None and not self._consumer.done()
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        """
+        Stop accepting payloads and flush everything still queued
+        """
+        if self._consumer is None:
+            return
+        consumer, self._consumer = self._consumer, None
+        # the sentinel is queued behind pending payloads, so they are flushed first
+        await self.queue.put(_STOP)
+        await consumer
+
+    def offer(self, payload: Dict) -> bool:
+        """
+        Enqueue without waiting. Returns False when the queue is full.
+        """
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.metrics['rejected'] += 1
+            return False
+        self.metrics['accepted'] += 1
+        return True
+
+    async def _flush(self, batch: List[Dict]):
+        """
+        Persist an acknowledged batch; returns only once it is stored or spilled
+        """
+        backoff_ms = self.retry_backoff_ms
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                # disk I/O runs off the event loop so request handling is never blocked
+                await asyncio.to_thread(self.flush_fn, batch)
+                self.metrics['flushed'] += len(batch)
+                self.metrics['batches'] += 1
+                return
+            except Exception as e:
+                self.metrics['flush_errors'] += 1
+                logger.error(f"Webhook batch flush failed (attempt {attempt}, {len(batch)} payloads): {e}")
+            if attempt >= self.max_flush_retries and self.spill_fn is not None:
+                try:
+                    await asyncio.to_thread(self.spill_fn, batch)
+                    self.metrics['spilled'] += len(batch)
+                    logger.warning(f"Spilled {len(batch)} webhook payloads for replay")
+                    return
+                except Exception as e:
+                    logger.error(f"Webhook batch spill failed ({len(batch)} payloads): {e}")
+            await asyncio.sleep(backoff_ms / 1000)
+            backoff_ms = min(backoff_ms * 2, self.max_backoff_ms)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.max_batch_latency_ms / 1000
+            while len(batch) < self.max_batch_size:
+                # drain whatever is already queued before waiting
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    await self._flush(batch)
+                    return
+                batch.append(item)
+            await self._flush(batch)
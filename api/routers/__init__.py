@@ -7,3 +7,4 @@ from . import graph_router
 from . import alerts_router
 from . import dashboard_router
 from . import explainability_router
+from . import ingestion_router
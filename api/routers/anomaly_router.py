@@ -2,13 +2,57 @@
 anomaly_router.py
 -----------------
 Provides anomaly scoring for transactions and behavioral signals.
+Transactions are scored online against per-user (falling back to
+per-channel) running statistics. Each worker starts from the merged
+snapshot and saves its own updates to a new per-worker file every
+ONLINE_SAVE_EVERY_N transactions or ONLINE_SAVE_INTERVAL_SECONDS, and on
+shutdown, so workers sharing ONLINE_STATE_PATH never overwrite each other
+and a crashed worker loses at most one checkpoint interval.
+When a shared state directory is configured, every worker instead scores
+against the same read-only, memory-mapped state published by the exporter.
 """
 
+import os
+
 from fastapi import APIRouter
+from core.config import config
 from schemas.txn_schema import TxnRequest, TxnAnomalyResponse
+from anomaly_detection.anomaly_detector import AnomalyDetector
+from anomaly_detection.shared_model_state import SharedModelState
 
 router = APIRouter(prefix="/anomaly", tags=["Anomaly Detection"])
 
+detector = AnomalyDetector(threshold=config.anomaly_z_threshold,
+                           decay=config.anomaly_decay,
+                           min_count=config.anomaly_min_count)
+shared_state = None
+
+
+async def load_anomaly_state():
+    global shared_state
+    if config.anomaly_shared_state_dir:
+        shared_state = SharedModelState(config.anomaly_shared_state_dir,
+                                        reload_interval_seconds=config.anomaly_shared_state_reload_seconds)
+    else:
+        os.makedirs(os.path.dirname(config.anomaly_state_path) or ".", exist_ok=True)
+        detector.open_worker_state(config.anomaly_state_path)
+
+
+async def save_anomaly_state():
+    if shared_state is not None:
+        return
+    detector.save_worker_state(config.anomaly_state_path)
+
+
 @router.post("/score")
 async def score_anomaly(payload: TxnRequest) -> TxnAnomalyResponse:
-    return TxnAnomalyResponse(anomaly_score=0.12, flagged=False)
+    if shared_state is not None:
+        shared_state.maybe_reload()
+        if shared_state.available:
+            result = shared_state.score(payload.user_id, payload.amount, payload.channel)
+            return TxnAnomalyResponse(anomaly_score=result['anomaly_score'], flagged=result['is_anomaly'])
+    result = detector.score_online(payload.user_id, payload.amount, payload.channel)
+    detector.maybe_save_worker_state(config.anomaly_state_path,
+                                     every_n=config.anomaly_save_every_n,
+                                     interval_seconds=config.anomaly_save_interval_seconds)
+    return TxnAnomalyResponse(anomaly_score=result['anomaly_score'], flagged=result['is_anomaly'])
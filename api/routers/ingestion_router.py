@@ -0,0 +1,81 @@
+"""
+ingestion_router.py
+-------------------
+HTTP entry point for UPI payment-provider webhooks.
+Payloads are queued and persisted in micro-batches; a full queue is
+reported back to the provider so it retries later. Batches that cannot
+be stored after retries are spilled to a side log and replayed at startup.
+"""
+
+from fastapi import APIRouter, HTTPException
+
+from core.config import config
+from core.logging_config import get_logger
+from core.webhook_queue import WebhookBatchQueue
+from schemas.webhook_schema import UPIWebhookPayload, WebhookAck
+from data_ingestion.upi_webhook_ingestor import UPIWebhookIngestor
+from data_ingestion.txn_dedup_index import TxnDedupIndex
+from data_ingestion.transaction_log import SegmentedTransactionLog
+
+router = APIRouter(prefix="/ingest", tags=["Ingestion"])
+logger = get_logger("IngestionRouter")
+
+ingestor = None
+spill_log = None
+
+
+def _flush_batch(payloads):
+    ingestor.ingest_batch(payloads)
+
+
+def _spill_batch(payloads):
+    spill_log.append_many(payloads, sync=True)
+
+
+webhook_queue = WebhookBatchQueue(
+    _flush_batch,
+    max_queue_size=config.webhook_queue_size,
+    max_batch_size=config.webhook_batch_size,
+    max_batch_latency_ms=config.webhook_batch_latency_ms,
+    spill_fn=_spill_batch
+)
+
+
+async def start_webhook_consumer():
+    global ingestor, spill_log
+    dedup_index = TxnDedupIndex(config.txn_dedup_index_path,
+                                bloom_capacity=config.txn_dedup_bloom_capacity or None)
+    ingestor = UPIWebhookIngestor(config.txn_log_dir, dedup_index=dedup_index)
+    spill_log = SegmentedTransactionLog(config.webhook_spill_dir)
+    # acknowledged payloads parked by a previous run; the dedup index drops any already stored
+    replayed = spill_log.drain(ingestor.ingest_batch)
+    if replayed:
+        logger.info(f"Replayed {replayed} spilled webhook payloads")
+    webhook_queue.start()
+
+
+async def stop_webhook_consumer():
+    await webhook_queue.stop()
+    if ingestor is not None:
+        ingestor.close()
+    if spill_log is not None:
+        spill_log.close()
+
+
+@router.post("/upi-webhook", status_code=202)
+async def receive_upi_webhook(payload: UPIWebhookPayload) -> WebhookAck:
+    if not webhook_queue.running:
+        raise HTTPException(status_code=503, detail="Ingestion consumer not running",
+                            headers={"Retry-After": "5"})
+    # fast-path replay check; the consumer re-checks before storing
+    if ingestor.dedup_index.seen(payload.txn_id, wait=False):
+        return WebhookAck(status="duplicate", txn_id=payload.txn_id)
+    if not webhook_queue.offer(payload.dict(exclude_none=True)):
+        raise HTTPException(status_code=429, detail="Ingestion queue full",
+                            headers={"Retry-After": "1"})
+    return WebhookAck(status="queued", txn_id=payload.txn_id)
+
+
+@router.get("/metrics")
+async def ingestion_metrics() -> dict:
+    return {**webhook_queue.metrics, "queue_depth": webhook_queue.queue.qsize() if webhook_queue.queue else 0}
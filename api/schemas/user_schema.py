@@ -15,3 +15,7 @@ class UserKYCRequest(BaseModel):
 class UserKYCResponse(BaseModel):
     status: str
     reasons: List[str]
+
+class UserGraphResponse(BaseModel):
+    is_colluding: bool
+    score: float
@@ -0,0 +1,21 @@
+"""
+webhook_schema.py
+-----------------
+UPI webhook payload + acknowledgement models
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class UPIWebhookPayload(BaseModel):
+    # one line of the dedup index per txn_id
+    txn_id: str = Field(min_length=1, pattern=r'^[^\n]+$')
+    user_id: str
+    fund_id: Optional[str] = None
+    amount: float
+    status: str
+    timestamp: Optional[str] = None
+
+class WebhookAck(BaseModel):
+    status: str
+    txn_id: str
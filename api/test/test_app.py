@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+
+def test_app_starts_and_ingests_webhook(tmp_path, monkeypatch):
+    # relative data paths in the config resolve under tmp_path
+    monkeypatch.chdir(tmp_path)
+    from app import app
+
+    with TestClient(app) as client:
+        ack = client.post("/ingest/upi-webhook", json={"txn_id": "T1", "user_id": "u1", "amount": 5.0, "status": "SUCCESS"})
+        assert ack.status_code == 202
+        bad = client.post("/ingest/upi-webhook", json={"txn_id": "a\nb", "user_id": "u1", "amount": 5.0, "status": "SUCCESS"})
+        assert bad.status_code == 422
+        assert client.get("/graph/collusion/u1").json() == {"is_colluding": False, "score": 0.02}
+    assert (tmp_path / "data").is_dir()
@@ -4,18 +4,190 @@ anomaly_detector.py
 Purpose:
     Compute anomaly scores for transactions or users based on statistical deviation
     from predicted values or historical behavior.
+
+    Besides the batch methods, AnomalyDetector has an online mode: running
+    (optionally decayed) Welford statistics per user and per channel, so a
+    single incoming transaction is scored in O(1) against its own history.
+    Several processes can share one snapshot: each records its own updates
+    and saves them to a per-worker file, and the files are merged on load.
 """
 
-import pandas as pd
+import os
+import glob
+import math
+import time
+import uuid
+import fcntl
 import numpy as np
+import pandas as pd
+
+
+class OnlineStatsStore:
+    """
+    Compact keyed store of running mean / variance.
+    Keys map to slots of flat numpy arrays, so a million users cost a few
+    dozen bytes each instead of a Python object per user.
+
+    With decay < 1 every update first multiplies the accumulated weight by
+    decay, i.e. an observation k updates ago counts decay**k; the effective
+    memory is about 1 / (1 - decay) observations.
+    """
+
+    def __init__(self, decay: float = 1.0, initial_capacity: int = 1024):
+        if not 0.0 < decay <= 1.0:
+            raise ValueError("decay must be in (0, 1]")
+        self.decay = decay
+        self.slots = {}
+        self.keys = []
+        self.count = np.zeros(initial_capacity, dtype=np.int64)
+        self.weight = np.zeros(initial_capacity, dtype=np.float64)
+        self.mean = np.zeros(initial_capacity, dtype=np.float64)
+        self.m2 = np.zeros(initial_capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _grow(self):
+        capacity = 2 * len(self.count)
+        for name in ('count', 'weight', 'mean', 'm2'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slot(self, key) -> int:
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            if slot >= len(self.count):
+                self._grow()
+        return slot
+
+    def stats(self, key):
+        """
+        Returns:
+            (count, mean, std) of a key, or (0, nan, nan) if never seen
+        """
+        slot = self.slots.get(key)
+        if slot is None:
+            return 0, float('nan'), float('nan')
+        weight = float(self.weight[slot])
+        # unbiased (ddof=1) so decay=1 matches z_score_anomaly
+        var = float(self.m2[slot]) / (weight - 1.0) if weight > 1.0 else 0.0
+        return int(self.count[slot]), float(self.mean[slot]), math.sqrt(var)
+
+    def update(self, key, value: float):
+        slot = self._slot(key)
+        weight = float(self.weight[slot]) * self.decay + 1.0
+        mean = float(self.mean[slot])
+        delta = value - mean
+        mean += delta / weight
+        self.m2[slot] = float(self.m2[slot]) * self.decay + delta * (value - mean)
+        self.mean[slot] = mean
+        self.weight[slot] = weight
+        self.count[slot] += 1
+
+    def merge(self, other: 'OnlineStatsStore') -> 'OnlineStatsStore':
+        """
+        Fold in statistics accumulated after this store's (e.g. another
+        worker's updates since both started from the same snapshot): this
+        store first decays by the other's update count, then the two combine
+        with Chan's parallel update of weight / mean / m2
+        """
+        n = len(other.keys)
+        if n == 0:
+            return self
+        slots = np.fromiter((self._slot(k) for k in other.keys), dtype=np.int64, count=n)
+        fade = self.decay ** other.count[:n].astype(np.float64)
+        weight_a, weight_b = self.weight[slots] * fade, other.weight[:n]
+        weight = weight_a + weight_b
+        delta = other.mean[:n] - self.mean[slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(weight > 0, weight_b / weight, 0.0)
+        self.mean[slots] += delta * share
+        self.m2[slots] = self.m2[slots] * fade + other.m2[:n] + delta * delta * weight_a * share
+        self.weight[slots] = weight
+        self.count[slots] += other.count[:n]
+        return self
+
+    def summary_arrays(self):
+        """
+        Keys sorted for binary search, with their count / mean / std
+        (the read-only view exported by shared_model_state)
+        """
+        n = len(self.keys)
+        keys = np.array([str(k) for k in self.keys], dtype=str)
+        order = np.argsort(keys, kind='stable')
+        weight = self.weight[:n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(weight > 1.0, np.sqrt(self.m2[:n] / (weight - 1.0)), 0.0)
+        return keys[order], self.count[:n][order], self.mean[:n][order], std[order]
+
+    def to_arrays(self, prefix: str) -> dict:
+        n = len(self.keys)
+        return {
+            f'{prefix}_keys': np.array([str(k) for k in self.keys], dtype=str),
+            f'{prefix}_count': self.count[:n],
+            f'{prefix}_weight': self.weight[:n],
+            f'{prefix}_mean': self.mean[:n],
+            f'{prefix}_m2': self.m2[:n],
+            f'{prefix}_decay': np.array(self.decay)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'OnlineStatsStore':
+        keys = arrays[f'{prefix}_keys'].tolist()
+        store = cls(decay=float(arrays[f'{prefix}_decay']), initial_capacity=max(len(keys), 1024))
+        store.keys = keys
+        store.slots = {k: i for i, k in enumerate(keys)}
+        for name in ('count', 'weight', 'mean', 'm2'):
+            getattr(store, name)[:len(keys)] = arrays[f'{prefix}_{name}']
+        return store
+
+
+def combine_online_scores(user_stats, channel_stats, amount: float, min_count: int, threshold: float) -> dict:
+    """
+    Online scoring rule shared by AnomalyDetector and the memory-mapped state:
+    the user's z-score once it has min_count observations, else the channel's.
+    Args:
+        user_stats / channel_stats: (count, mean, std) tuples, or None
+    """
+    def z(stats):
+        if stats is None or stats[0] < min_count:
+            return None
+        _, mean, std = stats
+        return (amount - mean) / std if std > 0 else 0.0
+
+    user_z, channel_z = z(user_stats), z(channel_stats)
+    score = user_z if user_z is not None else (channel_z if channel_z is not None else 0.0)
+    return {
+        'anomaly_score': score,
+        'is_anomaly': abs(score) > threshold,
+        'user_z': user_z,
+        'channel_z': channel_z
+    }
+
 
 class AnomalyDetector:
-    def __init__(self, threshold: float = 3.0):
+    def __init__(self, threshold: float = 3.0, decay: float = 1.0, min_count: int = 5):
         """
         Args:
             threshold: z-score threshold for flagging anomalies
+            decay: per-update forgetting factor of the online statistics (1.0 = no decay)
+            min_count: observations a user/channel needs before its online z-score is used
         """
         self.threshold = threshold
+        self.min_count = min_count
+        self.user_stats = OnlineStatsStore(decay)
+        self.channel_stats = OnlineStatsStore(decay)
+        # this worker's own updates since open_worker_state (None: not shared)
+        self.user_delta = None
+        self.channel_delta = None
+        self.worker_id = None
+        self.worker_saves = 0
+        self.worker_updates = 0
+        self.worker_saved_at = None
 
     def z_score_anomaly(self, df: pd.DataFrame, col: str = 'amount') -> pd.DataFrame:
         """
@@ -31,19 +203,359 @@ class AnomalyDetector:
         df['is_anomaly'] = df['anomaly_score'].abs() > self.threshold
         return df
 
-    def deviation_from_forecast(self, df: pd.DataFrame, forecast_df: pd.DataFrame) -> pd.DataFrame:
+    # ---------- grouped batch mode ----------
+    @staticmethod
+    def _group_codes(df: pd.DataFrame, by) -> np.ndarray:
+        # dense int codes, one hash pass; NaN keys get -1 and are left unscored
+        codes = df.groupby(by, sort=False, observed=True, dropna=True).ngroup()
+        # ngroup() marks dropped keys with NaN (float); bincount needs ints
+        return codes.fillna(-1).to_numpy(dtype=np.int64)
+
+    @staticmethod
+    def _grouped_z(values: np.ndarray, codes: np.ndarray, min_group_size: int) -> np.ndarray:
+        valid = (codes >= 0) & ~np.isnan(values)
+        c, x = codes[valid], values[valid]
+        n_groups = codes.max() + 1 if len(codes) else 0
+        n = np.bincount(c, minlength=n_groups)
+        mean = np.bincount(c, weights=x, minlength=n_groups) / np.maximum(n, 1)
+        dev = x - mean[c]
+        # two-pass variance: no catastrophic cancellation on large amounts
+        std = np.sqrt(np.bincount(c, weights=dev * dev, minlength=n_groups) / np.maximum(n - 1, 1))
+        score = np.full(len(values), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(std[c] > 0, dev / std[c], 0.0)
+        score[valid] = np.where(n[c] >= min_group_size, z, np.nan)
+        return score
+
+    @staticmethod
+    def _grouped_mad(values: np.ndarray, codes: np.ndarray, min_group_size: int) -> np.ndarray:
+        valid = (codes >= 0) & ~np.isnan(values)
+        c, x = codes[valid], values[valid]
+        n_groups = codes.max() + 1 if len(codes) else 0
+
+        def group_median(v):
+            # per-group reduce then gather by code: cheaper than transform's scatter
+            reduced = pd.Series(v).groupby(c).median()
+            full = np.full(n_groups, np.nan)
+            full[reduced.index.to_numpy()] = reduced.to_numpy()
+            return full[c]
+
+        n = np.bincount(c, minlength=n_groups)[c]
+        median = group_median(x)
+        mad = group_median(np.abs(x - median))
+        score = np.full(len(values), np.nan)
+        # 0.6745 = Phi^-1(0.75): makes the MAD score comparable to a z-score
+        with np.errstate(divide='ignore', invalid='ignore'):
+            robust = np.where(mad > 0, 0.6745 * (x - median) / mad, 0.0)
+        score[valid] = np.where(n >= min_group_size, robust, np.nan)
+        return score
+
+    def grouped_anomaly_scores(self, df: pd.DataFrame, col: str = 'amount',
+                               group_cols=('user_id', 'fund_id', 'channel'),
+                               methods=('zscore', 'mad'), min_group_size: int = 5,
+                               mad_threshold: float = 3.5) -> pd.DataFrame:
+        """
+        Score each row against its own group's distribution rather than the
+        global one, so habitually large (or small) users are judged by their
+        own baseline.
+        Args:
+            df: transactions; it is read, never copied or modified
+            col: numeric column to score
+            group_cols: grouping keys, each scored separately; a tuple entry
+                        such as ('user_id', 'channel') scores that combination
+            methods: 'zscore' (mean/std) and/or 'mad' (median/MAD, robust to
+                     the outliers it is looking for)
+            min_group_size: groups smaller than this get NaN scores
+            mad_threshold: flag level for the MAD score (3.5 is customary)
+        Returns:
+            DataFrame on df's index with one '<method>_<group>' column per
+            combination, 'anomaly_score' and 'is_anomaly'. anomaly_score is the
+            most extreme score divided by its own flag level, sign kept: z and
+            MAD scores have different scales, so |anomaly_score| > 1 exactly
+            when is_anomaly, and negative values mean unusually small amounts.
+        """
+        values = df[col].to_numpy(dtype=np.float64)
+        scores, scaled, flags = {}, [], np.zeros(len(df), dtype=bool)
+        for group in group_cols:
+            by = list(group) if isinstance(group, (list, tuple)) else [group]
+            missing = [c for c in by if c not in df.columns]
+            if missing:
+                continue
+            codes = self._group_codes(df, by)
+            name = '_'.join(by)
+            for method in methods:
+                if method == 'zscore':
+                    score, limit = self._grouped_z(values, codes, min_group_size), self.threshold
+                elif method == 'mad':
+                    score, limit = self._grouped_mad(values, codes, min_group_size), mad_threshold
+                else:
+                    raise ValueError(f"Unknown scoring method: {method}")
+                scores[f'{method}_{name}'] = score
+                scaled.append(score / limit)
+                flags |= np.abs(np.nan_to_num(score)) > limit
+
+        out = pd.DataFrame(scores, index=df.index)
+        if scaled:
+            scaled = np.vstack(scaled)
+            magnitude = np.where(np.isnan(scaled), -1.0, np.abs(scaled))
+            out['anomaly_score'] = scaled[magnitude.argmax(axis=0), np.arange(len(df))]
+        else:
+            out['anomaly_score'] = np.nan
+        out['is_anomaly'] = flags
+        return out
+
+    def score_online(self, user_id, amount: float, channel: str = None, update: bool = True) -> dict:
+        """
+        Score one transaction against the running statistics, then fold it in
+        Args:
+            user_id: user of the transaction
+            amount: transaction amount
+            channel: payment channel, used while the user is still warming up
+            update: add the transaction to the statistics after scoring
+        Returns:
+            dict with 'anomaly_score', 'is_anomaly', 'user_z', 'channel_z'
+            (a z-score is None until its key has min_count observations)
+        """
+        amount = float(amount)
+        result = combine_online_scores(self.user_stats.stats(str(user_id)),
+                                       self.channel_stats.stats(str(channel)) if channel is not None else None,
+                                       amount, self.min_count, self.threshold)
+        if update:
+            self.update_online(user_id, amount, channel)
+        return result
+
+    def update_online(self, user_id, amount: float, channel: str = None):
+        # keys are strings, as in the saved snapshots and SharedModelState lookups
+        user_id, amount = str(user_id), float(amount)
+        channel = str(channel) if channel is not None else None
+        self.user_stats.update(user_id, amount)
+        if channel is not None:
+            self.channel_stats.update(channel, amount)
+        if self.user_delta is not None:
+            self.user_delta.update(user_id, amount)
+            if channel is not None:
+                self.channel_delta.update(channel, amount)
+            self.worker_updates += 1
+
+    def fit_online(self, df: pd.DataFrame, col: str = 'amount'):
+        """
+        Warm the online statistics from historical transactions (in time order
+        if a 'timestamp' column is present, since decay is order dependent)
+        """
+        if 'timestamp' in df.columns:
+            df = df.sort_values('timestamp', kind='stable')
+        channels = df['channel'] if 'channel' in df.columns else [None] * len(df)
+        for user_id, amount, channel in zip(df['user_id'], df[col], channels):
+            self.update_online(user_id, amount, channel)
+
+    def save_online_state(self, path: str):
+        """
+        Snapshot the online statistics (np.savez, written then renamed)
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **self.user_stats.to_arrays('user'), **self.channel_stats.to_arrays('channel'))
+        os.replace(tmp_path, path)
+
+    def load_online_state(self, path: str):
+        """
+        Load a snapshot and merge any per-worker files saved next to it
+        """
+        if os.path.exists(path):
+            with np.load(path) as arrays:
+                self.user_stats = OnlineStatsStore.from_arrays(arrays, 'user')
+                self.channel_stats = OnlineStatsStore.from_arrays(arrays, 'channel')
+        for worker_path in self._worker_state_files(path):
+            with np.load(worker_path) as arrays:
+                self.user_stats.merge(OnlineStatsStore.from_arrays(arrays, 'user'))
+                self.channel_stats.merge(OnlineStatsStore.from_arrays(arrays, 'channel'))
+
+    @staticmethod
+    def _worker_state_files(path: str) -> list:
+        # oldest first: with decay the merge order is the order of the updates
+        return sorted((p for p in glob.glob(glob.escape(path) + '.worker-*.npz')
+                       if not p.endswith('.tmp.npz')), key=os.path.getmtime)
+
+    def open_worker_state(self, path: str):
+        """
+        Start one of several processes sharing the snapshot at path: merge the
+        snapshot with every saved worker file, compact them into the snapshot
+        (under a file lock), and from now on record this worker's updates
+        separately so save_worker_state never counts an observation twice
+        """
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            worker_files = self._worker_state_files(path)
+            if os.path.exists(path) or worker_files:
+                self.load_online_state(path)
+            if worker_files:
+                self.save_online_state(path)
+                for worker_path in worker_files:
+                    os.remove(worker_path)
+        self.user_delta = OnlineStatsStore(self.user_stats.decay)
+        self.channel_delta = OnlineStatsStore(self.channel_stats.decay)
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.worker_saves = 0
+        self.worker_updates = 0
+        self.worker_saved_at = time.monotonic()
+
+    def save_worker_state(self, path: str):
+        """
+        Save this worker's updates since its last save to a new file next to
+        the snapshot (the next load or open merges it) and start recording
+        afresh; safe to call periodically as a checkpoint
+        """
+        if self.user_delta is None:
+            raise RuntimeError("open_worker_state must be called before save_worker_state")
+        self.worker_saves += 1
+        worker_path = f'{path}.worker-{self.worker_id}-{self.worker_saves}.npz'
+        tmp_path = worker_path + '.tmp.npz'
+        np.savez(tmp_path, **self.user_delta.to_arrays('user'), **self.channel_delta.to_arrays('channel'))
+        os.replace(tmp_path, worker_path)
+        self.user_delta = OnlineStatsStore(self.user_stats.decay)
+        self.channel_delta = OnlineStatsStore(self.channel_stats.decay)
+        self.worker_updates = 0
+        self.worker_saved_at = time.monotonic()
+
+    def maybe_save_worker_state(self, path: str, every_n: int = 1000,
+                                interval_seconds: float = 60.0) -> bool:
+        """
+        Checkpoint with save_worker_state once every_n updates or
+        interval_seconds have passed since the last save (and there is
+        something to save), so a crashed worker loses at most that much
+        Returns:
+            True if the state was saved
+        """
+        if self.user_delta is None or not self.worker_updates:
+            return False
+        if self.worker_updates < every_n and time.monotonic() - self.worker_saved_at < interval_seconds:
+            return False
+        self.save_worker_state(path)
+        return True
+
+    def deviation_from_forecast(self, df: pd.DataFrame, forecast_df: pd.DataFrame,
+                                key_col: str = None, freq: str = 'D', value_col: str = 'amount',
+                                aggregate: bool = False, tolerance=None) -> pd.DataFrame:
         """
         Compare actual vs forecasted values to detect anomalies
+        Transactions are aligned to the forecast period containing them
+        (timestamp floored to freq) of their own series; with freq=None the
+        latest forecast at or before the timestamp is used instead (as-of join),
+        provided it is at most `tolerance` old. Unmatched rows get NaN forecasts.
         Args:
-            df: actual data with 'timestamp', 'amount'
+            df: actual data with 'timestamp', 'amount' (and key_col for many series)
             forecast_df: predicted data with 'ds', 'yhat', 'yhat_lower', 'yhat_upper'
+                         (and key_col, e.g. TimeSeriesModel.forecast_batch output)
+            key_col: series key such as 'user_id' or 'fund_id'; None for one series
+            freq: forecast period, or None for an as-of join
+            value_col: actual value column
+            aggregate: compare per-period totals (what the forecast predicts)
+                       instead of individual transactions
+            tolerance: as-of join only; how long a forecast point stays valid
+                       (Timedelta or string). Default: one forecast step, the
+                       median spacing of forecast_df['ds'] (0 if it has one point)
         Returns:
-            DataFrame with anomaly flags
+            DataFrame with 'yhat', 'yhat_lower', 'yhat_upper', 'residual',
+            'deviation_score' (residual / interval half-width on its side, so
+            |score| > 1 means outside the interval) and 'is_anomaly'
         """
-        df = df.copy()
-        forecast_df = forecast_df.set_index('ds')
-        df['yhat'] = df['timestamp'].map(forecast_df['yhat'])
-        df['yhat_upper'] = df['timestamp'].map(forecast_df['yhat_upper'])
-        df['yhat_lower'] = df['timestamp'].map(forecast_df['yhat_lower'])
-        df['is_anomaly'] = (df['amount'] > df['yhat_upper']) | (df['amount'] < df['yhat_lower'])
+        ts = pd.to_datetime(df['timestamp'])
+        keys = [key_col] if key_col else []
+        forecast_ds = pd.to_datetime(forecast_df['ds'])
+
+        if aggregate:
+            period = ts.dt.floor(freq or 'D')
+            grouped = pd.DataFrame({**{k: df[k].to_numpy() for k in keys},
+                                    'timestamp': period.to_numpy(),
+                                    value_col: df[value_col].to_numpy()})
+            df = grouped.groupby(keys + ['timestamp'], sort=False, observed=True)[value_col].sum().reset_index()
+            ts = df['timestamp']
+        else:
+            df = df.copy()
+
+        if freq is not None:
+            # hash join on (series key, period)
+            forecast = forecast_df.assign(ds=forecast_ds.dt.floor(freq)) \
+                .drop_duplicates(keys + ['ds'], keep='last')
+            right = pd.MultiIndex.from_arrays([forecast[k] for k in keys] + [forecast['ds']])
+            left = pd.MultiIndex.from_arrays([df[k] for k in keys] + [ts.dt.floor(freq)])
+            pos = right.get_indexer(left)
+            for col in ('yhat', 'yhat_lower', 'yhat_upper'):
+                values = forecast[col].to_numpy(dtype=np.float64)
+                df[col] = np.where(pos >= 0, values[np.maximum(pos, 0)], np.nan)
+        else:
+            # merge_asof rejects null keys: rows without a timestamp stay unmatched
+            valid = np.flatnonzero(ts.notna().to_numpy())
+            order = valid[np.argsort(ts.to_numpy()[valid], kind='stable')]
+            left = pd.DataFrame({'_row': order, '_ts': ts.to_numpy()[order],
+                                 **{k: df[k].to_numpy()[order] for k in keys}})
+            right = forecast_df[keys + ['yhat', 'yhat_lower', 'yhat_upper']].assign(_ts=forecast_ds) \
+                .dropna(subset=['_ts']).sort_values('_ts', kind='stable')
+            if tolerance is None:
+                steps = np.diff(np.unique(forecast_ds.dropna().to_numpy()))
+                tolerance = pd.Timedelta(np.median(steps)) if len(steps) else pd.Timedelta(0)
+            # a transaction past the horizon must not reuse the last forecast
+            joined = pd.merge_asof(left, right, on='_ts', by=key_col, direction='backward',
+                                   tolerance=pd.Timedelta(tolerance))
+            for col in ('yhat', 'yhat_lower', 'yhat_upper'):
+                values = np.full(len(df), np.nan)
+                values[joined['_row'].to_numpy()] = joined[col].to_numpy(dtype=np.float64)
+                df[col] = values
+
+        actual = pd.to_numeric(df[value_col], errors='coerce').to_numpy(dtype=np.float64)
+        yhat = df['yhat'].to_numpy()
+        residual = actual - yhat
+        half_width = np.where(residual >= 0, df['yhat_upper'].to_numpy() - yhat, yhat - df['yhat_lower'].to_numpy())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(half_width > 0, residual / half_width,
+                             np.where(residual == 0, 0.0, np.sign(residual) * np.inf))
+        df['residual'] = residual
+        df['deviation_score'] = score
+        df['is_anomaly'] = np.abs(np.nan_to_num(score)) > 1.0
         return df
+
+
+def benchmark(num_rows: int = 10_000_000, num_events: int = 200_000, num_users: int = 50_000):
+    """
+    Throughput of grouped batch scoring and per-transaction latency of the online path
+    """
+    rng = np.random.default_rng(0)
+    batch = pd.DataFrame({
+        'user_id': rng.integers(0, num_users * 20, size=num_rows),
+        'fund_id': rng.integers(0, 1000, size=num_rows),
+        # code -1 is a missing channel: those rows must stay unscored per channel
+        'channel': pd.Categorical.from_codes(rng.integers(-1, 5, size=num_rows),
+                                             ['UPI', 'CARD', 'WALLET', 'NETBANKING', 'AGENT']),
+        'amount': rng.lognormal(5, 1, size=num_rows)
+    })
+    detector = AnomalyDetector()
+    start = time.perf_counter()
+    scores = detector.grouped_anomaly_scores(batch)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {num_rows} rows ({len(scores.columns) - 2} grouped scores) in {elapsed:.2f}s, "
+          f"{int(scores['is_anomaly'].sum())} flagged")
+    no_channel = batch['channel'].isna().to_numpy()
+    assert scores.loc[no_channel, ['zscore_channel', 'mad_channel']].isna().all().all()
+    assert scores.loc[~no_channel, 'zscore_channel'].notna().all()
+
+    users = rng.integers(0, num_users, size=num_events).astype(str)
+    amounts = rng.exponential(200, size=num_events)
+    channels = rng.choice(['UPI', 'CARD', 'WALLET', 'NETBANKING', 'AGENT'], size=num_events)
+    detector = AnomalyDetector(decay=0.999)
+    start = time.perf_counter()
+    for user_id, amount, channel in zip(users.tolist(), amounts.tolist(), channels.tolist()):
+        detector.score_online(user_id, amount, channel)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {num_events} transactions online in {elapsed:.2f}s "
+          f"({elapsed / num_events * 1e6:.1f} us/txn, {len(detector.user_stats)} users)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 10_000_000)
+    else:
+        detector = AnomalyDetector(min_count=3)
+        for amount in [100, 120, 90, 110, 105]:
+            detector.score_online('user_1', amount, 'UPI')
+        print(detector.score_online('user_1', 5000, 'UPI'))
@@ -4,40 +4,176 @@ feature_extractor.py
 Purpose:
     Extract relevant features from transactional data for anomaly detection.
     Works on individual transactions as well as user/group aggregated features.
+
+    User aggregates can also be maintained incrementally: a mergeable
+    per-user state (see utils/aggregate_state.py) absorbs each new batch in
+    O(batch), and partial states built on other workers merge into it.
+    user_aggregated_features, the incremental state and
+    generate_features_chunked share those aggregates over whole paise, so
+    their counts, sums, means, min and max are bit-identical; std agrees to
+    ~1e-12 relative.
+
+    Large-transaction flags compare amounts against streaming quantile
+    sketches (global and per fund/channel, see utils/quantile_sketch.py),
+    so the threshold no longer depends on the size of the frame passed in.
+    The sketches are fed by the streaming path only (the transaction stream
+    processor, or merge_sketches from other workers); until they hold any
+    data the frame's own quantile is used.
+
+    Velocity features (per-user rolling counts and sums over 5m/1h/24h/7d)
+    come in a vectorized batch form and an online ring-buffer form that
+    return bitwise-identical values for the same time-ordered events.
 """
 
+import os
+import time
+import bisect
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Iterable, Union
+from utils.aggregate_state import empty_aggregates, partial_aggregates, merge_aggregates, finalize_aggregates
+from utils.dataset_io import iter_table
+from utils.helpers import parse_utc_timestamps
+from utils.quantile_sketch import QuantileSketchStore
+
+USER_FEATURE_NAMES = {
+    'count': 'txn_count',
+    'sum': 'txn_sum',
+    'mean': 'txn_mean',
+    'std': 'txn_std',
+    'max': 'txn_max',
+    'min': 'txn_min',
+    'last_ts': 'last_txn_ts'
+}
+USER_AGG_COLUMNS = ['user_id', 'txn_count', 'txn_sum', 'txn_mean', 'txn_std', 'txn_max', 'txn_min']
+# amounts are aggregated in whole paise (DECIMAL(12,2)), so sums do not depend on batching
+AMOUNT_SCALE = 100
+
+# window label -> length in nanoseconds
+VELOCITY_WINDOWS = {
+    '5m': pd.Timedelta(minutes=5).value,
+    '1h': pd.Timedelta(hours=1).value,
+    '24h': pd.Timedelta(hours=24).value,
+    '7d': pd.Timedelta(days=7).value
+}
+
+_INT64_BUDGET = 2 ** 62
+
+
+def _as_ns(timestamps) -> np.ndarray:
+    return parse_utc_timestamps(timestamps).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+class VelocityTracker:
+    """
+    Online per-user velocity features for the live path.
+    Each user keeps a ring buffer of (timestamp, running amount sum) covering
+    the largest window, so a transaction is scored with one bisect per window
+    and sums are differences of running sums, exactly as in the batch path.
+    Running sums are kept in integer paise (amount is DECIMAL(12,2)), which
+    makes them exact and independent of summation order.
+    Events of a user are expected in timestamp order.
+    """
+
+    def __init__(self, windows: Dict[str, int] = None):
+        self.windows = dict(windows or VELOCITY_WINDOWS)
+        self.max_window = max(self.windows.values())
+        # user -> [timestamps, running sums, head index, sum before head, running sum]
+        self.users = {}
+
+    def update(self, user_id, timestamp, amount: float) -> Dict[str, float]:
+        """
+        Add one transaction and return its velocity features (the transaction included)
+        """
+        ts = pd.Timestamp(timestamp).value
+        amount = float(amount)
+        paise = round(amount * 100) if amount == amount else 0
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = [[], [], 0, 0, 0]
+        times, sums = state[0], state[1]
+        state[4] = running = state[4] + paise
+        times.append(ts)
+        sums.append(running)
+
+        # evict entries older than the largest window, remembering their running sum
+        head = bisect.bisect_right(times, ts - self.max_window, state[2])
+        if head > state[2]:
+            state[3] = sums[head - 1]
+            state[2] = head
+            if head > 1024 and head * 2 > len(times):
+                del times[:head], sums[:head]
+                state[2] = head = 0
+
+        features = {}
+        end = len(times)
+        for label, window in self.windows.items():
+            j = bisect.bisect_right(times, ts - window, head)
+            features[f'txn_count_{label}'] = end - j
+            features[f'txn_sum_{label}'] = (running - (sums[j - 1] if j > head else state[3])) / 100
+        return features
+
 
 class FeatureExtractor:
-    def __init__(self):
+    def __init__(self, state_path: str = None, sketch_path: str = None,
+                 large_txn_quantile: float = 0.95, large_txn_group: str = 'fund_id'):
         """
         Initialize feature extractor. 
         Can extend to load feature configs or scaling parameters.
+        Args:
+            state_path: optional file holding the incremental per-user state
+            sketch_path: optional file holding the amount quantile sketches
+            large_txn_quantile: amount quantile above which a transaction is large
+            large_txn_group: column whose own sketch sets the threshold
+                             (global sketch while the group is small or absent)
         """
-        pass
+        self.state_path = state_path
+        self.user_state = empty_aggregates('user_id', AMOUNT_SCALE)
+        if state_path and os.path.exists(state_path):
+            self.user_state = pd.read_pickle(state_path)
 
-    def basic_transaction_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.sketch_path = sketch_path
+        self.large_txn_quantile = large_txn_quantile
+        self.large_txn_group = large_txn_group
+        if sketch_path and os.path.exists(sketch_path):
+            self.amount_sketches = QuantileSketchStore.load(sketch_path)
+        else:
+            self.amount_sketches = QuantileSketchStore('amount', group_cols=('fund_id', 'channel'))
+
+    def basic_transaction_features(self, df: pd.DataFrame, update_sketches: bool = False) -> pd.DataFrame:
         """
         Extract basic features from transactions
         Args:
             df: pandas DataFrame with columns ['user_id', 'amount', 'timestamp', 'fund_id']
+            update_sketches: fold the batch into the amount sketches before flagging;
+                             only the streaming path opts in (each record is seen once there),
+                             so scoring or re-scoring a frame never moves the thresholds
         Returns:
             DataFrame with new feature columns
         """
         df = df.copy()
         # Transaction amount statistics
         df['log_amount'] = np.log1p(df['amount'])
-        df['is_large_txn'] = df['amount'] > df['amount'].quantile(0.95)
+        if update_sketches:
+            self.amount_sketches.update(df)
+        thresholds = self._large_txn_thresholds(df)
+        df['is_large_txn'] = df['amount'].to_numpy() > thresholds
 
         # Time-based features
-        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
+        timestamps = parse_utc_timestamps(df['timestamp'])
+        df['hour'] = timestamps.dt.hour
+        df['day_of_week'] = timestamps.dt.dayofweek
         df['is_weekend'] = df['day_of_week'].isin([5,6]).astype(int)
 
         return df
 
+    def _large_txn_thresholds(self, df: pd.DataFrame) -> np.ndarray:
+        if self.amount_sketches.global_digest.count > 0:
+            return self.amount_sketches.thresholds(df, self.large_txn_quantile, self.large_txn_group)
+        # no sketch yet (fresh extractor used on a batch): the batch's own quantile
+        batch_value = pd.to_numeric(df['amount'], errors='coerce').quantile(self.large_txn_quantile)
+        return np.full(len(df), batch_value)
+
     def user_aggregated_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Aggregate features per user
@@ -46,18 +182,101 @@ class FeatureExtractor:
         Returns:
             DataFrame with user-level aggregated features
         """
-        agg_df = df.groupby('user_id').agg(
-            txn_count=('amount', 'count'),
-            txn_sum=('amount', 'sum'),
-            txn_mean=('amount', 'mean'),
-            txn_std=('amount', 'std'),
-            txn_max=('amount', 'max'),
-            txn_min=('amount', 'min')
-        ).reset_index()
+        # the aggregates of the incremental / chunked paths, over the whole frame
+        partial = partial_aggregates(df, 'user_id', 'amount', scale=AMOUNT_SCALE)
+        features = finalize_aggregates(partial, USER_FEATURE_NAMES, sort=True)
+        return features[USER_AGG_COLUMNS]
+
+    def velocity_features(self, df: pd.DataFrame, windows: Dict[str, int] = None) -> pd.DataFrame:
+        """
+        Per-user rolling transaction count and amount sum over trailing windows
+        (t - window, t], counting each transaction itself and earlier ones.
+        Args:
+            df: transactions with 'user_id', 'timestamp', 'amount' (not copied)
+            windows: label -> window length in ns (default VELOCITY_WINDOWS)
+        Returns:
+            DataFrame on df's index with 'txn_count_<label>' and 'txn_sum_<label>'
+        """
+        windows = dict(windows or VELOCITY_WINDOWS)
+        n = len(df)
+        codes = pd.factorize(df['user_id'])[0].astype(np.int64)
+        ts = _as_ns(df['timestamp'])
+        amounts = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+
+        # lexsort is stable: equal timestamps keep arrival order, like the online path
+        order = np.lexsort((ts, codes))
+        c, t = codes[order], ts[order]
+        # exact integer paise: differences of one global running sum are exact
+        # within each user and identical to VelocityTracker's
+        running = np.cumsum(np.rint(amounts[order] * 100).astype(np.int64))
+        is_start = np.ones(n, dtype=bool)
+        is_start[1:] = c[1:] != c[:-1]
+
+        out = {}
+        for label in windows:
+            out[f'txn_count_{label}'] = np.empty(n, dtype=np.int64)
+            out[f'txn_sum_{label}'] = np.empty(n, dtype=np.float64)
+        if n == 0:
+            return pd.DataFrame(out, index=df.index)
 
-        # Fill missing std with 0
-        agg_df['txn_std'] = agg_df['txn_std'].fillna(0)
-        return agg_df
+        # users laid end to end on one time axis: key = user_slot * stride + t.
+        # Users are processed in blocks small enough for the keys to fit int64.
+        t_rel = t - t.min()
+        stride = int(t_rel.max()) + max(windows.values()) + 1
+        users_per_block = max(1, _INT64_BUDGET // stride)
+        user_starts = np.flatnonzero(is_start)
+        for b in range(0, len(user_starts), users_per_block):
+            lo = user_starts[b]
+            hi = user_starts[b + users_per_block] if b + users_per_block < len(user_starts) else n
+            slot = np.cumsum(is_start[lo:hi]) - 1
+            key = slot * stride + t_rel[lo:hi]
+            rows = np.arange(lo, hi)
+            for label, window in windows.items():
+                j = lo + np.searchsorted(key, key - window, side='right')
+                before = np.where(j > 0, running[np.maximum(j - 1, 0)], 0)
+                out[f'txn_count_{label}'][order[lo:hi]] = rows - j + 1
+                out[f'txn_sum_{label}'][order[lo:hi]] = (running[lo:hi] - before) / 100
+        return pd.DataFrame(out, index=df.index)
+
+    # ---------- incremental mode ----------
+    @staticmethod
+    def partial_user_state(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Per-user aggregate state of one batch; safe to compute on any worker
+        """
+        time_col = 'timestamp' if 'timestamp' in df.columns else None
+        return partial_aggregates(df, 'user_id', 'amount', time_col, scale=AMOUNT_SCALE)
+
+    def merge_user_state(self, partial: pd.DataFrame):
+        self.user_state = merge_aggregates(self.user_state, partial)
+
+    def update_user_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fold a new batch of transactions into the per-user state
+        Returns:
+            current user-level features, same columns as user_aggregated_features
+            plus 'last_txn_ts'
+        """
+        self.merge_user_state(self.partial_user_state(df))
+        return self.incremental_user_features()
+
+    def incremental_user_features(self) -> pd.DataFrame:
+        return finalize_aggregates(self.user_state, USER_FEATURE_NAMES)
+
+    def save_user_state(self, path: str = None):
+        path = path or self.state_path
+        tmp_path = path + '.tmp'
+        pd.to_pickle(self.user_state, tmp_path)
+        os.replace(tmp_path, path)
+
+    def merge_sketches(self, other: QuantileSketchStore):
+        """
+        Merge amount sketches built by another worker
+        """
+        self.amount_sketches.merge(other)
+
+    def save_sketches(self, path: str = None):
+        self.amount_sketches.save(path or self.sketch_path)
 
     def generate_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -67,8 +286,65 @@ class FeatureExtractor:
         df_user = self.user_aggregated_features(df_txn)
         return df_user
 
+    # ---------- out-of-core mode ----------
+    def generate_features_chunked(self, source: Union[str, Iterable[pd.DataFrame]],
+                                  chunk_rows: int = None, memory_mb: int = None) -> pd.DataFrame:
+        """
+        generate_features over a transactions table that does not fit in memory:
+        chunks are streamed and reduced to per-user partial aggregates, and the
+        partials are merged (the amount sketches are left alone, as in generate_features)
+        Args:
+            source: transactions table path (CSV / Parquet / Arrow) or an iterable of DataFrame chunks
+            chunk_rows: rows per chunk (default: derived from memory_mb)
+            memory_mb: memory budget per chunk (default: [FEATURES] CHUNK_MEMORY_MB)
+        Returns:
+            same frame as generate_features on the whole table
+        """
+        if isinstance(source, str):
+            source = iter_table(source, chunk_rows=chunk_rows, memory_mb=memory_mb)
+        state = empty_aggregates('user_id', AMOUNT_SCALE)
+        for chunk in source:
+            state = merge_aggregates(state, partial_aggregates(chunk, 'user_id', 'amount', scale=AMOUNT_SCALE))
+        features = finalize_aggregates(state, USER_FEATURE_NAMES, sort=True)
+        return features[USER_AGG_COLUMNS]
+
+
+def benchmark(num_rows: int = 5_000_000, num_users: int = 200_000):
+    """
+    Batch velocity features vs the online tracker on the same events
+    """
+    rng = np.random.default_rng(0)
+    start_ns = pd.Timestamp('2025-09-01').value
+    df = pd.DataFrame({
+        'user_id': rng.integers(0, num_users, size=num_rows),
+        'timestamp': pd.to_datetime(start_ns + np.sort(rng.integers(0, 90 * 86400, size=num_rows)) * 10 ** 9),
+        'amount': rng.lognormal(5, 1, size=num_rows).round(2)
+    })
+    fe = FeatureExtractor()
+    start = time.perf_counter()
+    batch = fe.velocity_features(df)
+    elapsed = time.perf_counter() - start
+    print(f"Batch velocity features for {num_rows} rows in {elapsed:.2f}s")
+
+    sample = min(num_rows, 200_000)
+    tracker = VelocityTracker()
+    start = time.perf_counter()
+    online = [tracker.update(u, ts, a) for u, ts, a in
+              zip(df['user_id'][:sample].tolist(), df['timestamp'][:sample], df['amount'][:sample].tolist())]
+    elapsed = time.perf_counter() - start
+    print(f"Online velocity features: {elapsed / sample * 1e6:.1f} us/txn")
+    online = pd.DataFrame(online)
+    expected = fe.velocity_features(df.iloc[:sample])
+    print("Batch == online:", bool((online.to_numpy() == expected[online.columns].to_numpy()).all()))
+
 
 if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 5_000_000)
+        sys.exit(0)
+
     # Example usage
     sample_data = pd.DataFrame({
         'user_id': [1, 1, 2, 2],
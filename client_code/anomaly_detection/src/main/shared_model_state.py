@@ -0,0 +1,308 @@
+"""
+shared_model_state.py
+---------------------
+Purpose:
+    Share read-only anomaly model state between API worker processes.
+    An exporter writes the state (per-user / per-channel statistics,
+    forecast bands, thresholds) as a versioned directory of .npy arrays
+    plus a JSON manifest:
+
+        <root>/v000042/manifest.json
+        <root>/v000042/user_keys.npy, user_count.npy, user_mean.npy, user_std.npy, ...
+        <root>/CURRENT              -> "v000042"
+
+    Workers np.load every array with mmap_mode='r', so startup is a few
+    opens and all workers share the same page-cache pages instead of each
+    holding a copy. Keys are stored sorted and looked up with searchsorted.
+
+    Publishing is atomic: a version directory is fully written under a
+    temporary name, renamed into place, and only then is CURRENT swapped
+    with os.replace. Exporters hold an flock on <root>/.export.lock from
+    choosing the version number to pruning, so concurrent exporters publish
+    distinct, increasing versions. Workers pick the new version up in maybe_reload();
+    old versions stay readable through open mappings until they are pruned.
+    A version that fails to load is logged and skipped: the worker keeps
+    serving the last good one and retries on the next check; so is a
+    version written with a different FORMAT_VERSION.
+
+    The exporter normally runs as a scheduler job after the transaction
+    stream processor (TransactionStreamProcessor.publish_model_state), so
+    every published version includes the transactions scored so far.
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from anomaly_detection.anomaly_detector import AnomalyDetector, combine_online_scores
+from utils.logger import get_logger
+
+logger = get_logger("SharedModelState")
+
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+EXPORT_LOCK_FILE = '.export.lock'
+FORMAT_VERSION = 1
+
+
+def _next_version(root: str) -> str:
+    existing = [int(name[1:]) for name in os.listdir(root) if name.startswith('v') and name[1:].isdigit()]
+    return f"v{(max(existing) + 1 if existing else 1):06d}"
+
+
+@contextmanager
+def _export_lock(root: str):
+    fd = os.open(os.path.join(root, EXPORT_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def export_model_state(root: str, detector: AnomalyDetector, forecast_df: pd.DataFrame = None,
+                       key_col: str = None, freq: str = 'D', thresholds: Dict[str, float] = None,
+                       keep_versions: int = 3) -> str:
+    """
+    Publish a new version of the shared state
+    Args:
+        root: state directory shared by the workers
+        detector: AnomalyDetector whose online statistics are exported
+        forecast_df: optional forecast bands ('ds', 'yhat', 'yhat_lower', 'yhat_upper')
+                     with key_col (e.g. TimeSeriesModel.forecast_batch output)
+        key_col: series key of forecast_df
+        freq: forecast period length
+        thresholds: optional named thresholds (e.g. per-fund large-transaction limits)
+        keep_versions: number of published versions kept on disk
+    Returns:
+        name of the published version
+    """
+    os.makedirs(root, exist_ok=True)
+    with _export_lock(root):
+        return _export_locked(root, detector, forecast_df, key_col, freq, thresholds, keep_versions)
+
+
+def _export_locked(root: str, detector: AnomalyDetector, forecast_df: Optional[pd.DataFrame],
+                   key_col: Optional[str], freq: str, thresholds: Optional[Dict[str, float]],
+                   keep_versions: int) -> str:
+    version = _next_version(root)
+    tmp_dir = os.path.join(root, f".{version}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+
+    arrays = {}
+    for prefix, store in (('user', detector.user_stats), ('channel', detector.channel_stats)):
+        keys, count, mean, std = store.summary_arrays()
+        arrays.update({f'{prefix}_keys': keys, f'{prefix}_count': count,
+                       f'{prefix}_mean': mean, f'{prefix}_std': std})
+
+    if forecast_df is not None and len(forecast_df):
+        fc_keys = forecast_df[key_col].astype(str).to_numpy() if key_col else np.full(len(forecast_df), '')
+        ds = pd.to_datetime(forecast_df['ds']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        order = np.lexsort((ds, fc_keys))
+        fc_keys, ds = fc_keys[order], ds[order]
+        # CSR layout: one entry per key, its bands in forecast_ds[offsets[i]:offsets[i + 1]]
+        unique_keys, starts = np.unique(fc_keys, return_index=True)
+        arrays.update({
+            'forecast_keys': unique_keys.astype(str),
+            'forecast_offsets': np.append(starts, len(fc_keys)).astype(np.int64),
+            'forecast_ds': ds,
+            'forecast_yhat': forecast_df['yhat'].to_numpy(dtype=np.float64)[order],
+            'forecast_lower': forecast_df['yhat_lower'].to_numpy(dtype=np.float64)[order],
+            'forecast_upper': forecast_df['yhat_upper'].to_numpy(dtype=np.float64)[order]
+        })
+
+    if thresholds:
+        names = np.array(sorted(thresholds), dtype=str)
+        arrays['threshold_keys'] = names
+        arrays['threshold_values'] = np.array([thresholds[n] for n in names.tolist()], dtype=np.float64)
+
+    for name, values in arrays.items():
+        with open(os.path.join(tmp_dir, f"{name}.npy"), 'wb') as f:
+            np.save(f, np.ascontiguousarray(values), allow_pickle=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'created_at': pd.Timestamp.now().isoformat(),
+        'z_threshold': detector.threshold,
+        'min_count': detector.min_count,
+        'forecast_freq': freq,
+        'forecast_period_ns': (pd.Timestamp(0) + pd.tseries.frequencies.to_offset(freq)).value,
+        'forecast_key': key_col,
+        'arrays': {name: {'dtype': str(values.dtype), 'shape': list(values.shape)} for name, values in arrays.items()}
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_dir, os.path.join(root, version))
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+    _fsync_dir(root)
+
+    # readers that still map an old version keep their pages after the unlink
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v') and name[1:].isdigit())
+    for old in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+class SharedModelState:
+    def __init__(self, root: str, reload_interval_seconds: float = 5.0):
+        """
+        Args:
+            root: state directory written by export_model_state
+            reload_interval_seconds: how often maybe_reload looks at CURRENT
+        """
+        self.root = root
+        self.reload_interval_seconds = reload_interval_seconds
+        self.version = None
+        self.manifest = {}
+        self.arrays = {}
+        self._last_check = 0.0
+        self.maybe_reload(force=True)
+
+    @property
+    def available(self) -> bool:
+        return self.version is not None
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load(self, version: str):
+        version_dir = os.path.join(self.root, version)
+        with open(os.path.join(version_dir, MANIFEST_FILE), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"format version {manifest.get('format_version')}, expected {FORMAT_VERSION}")
+        arrays = {name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+                  for name in manifest['arrays']}
+        # switch over only once every array of the new version is mapped
+        self.manifest, self.arrays, self.version = manifest, arrays, version
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """
+        Switch to the published version if it changed; if it cannot be
+        loaded the current mapping stays in use
+        Returns:
+            True if a new version was loaded
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval_seconds:
+            return False
+        self._last_check = now
+        current = self._read_current()
+        if current is None or current == self.version:
+            return False
+        try:
+            self._load(current)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot load shared model state {current}, keeping {self.version}: {e}")
+            return False
+        return True
+
+    # ---------- lookups ----------
+    def _index(self, keys_name: str, key) -> int:
+        keys = self.arrays.get(keys_name)
+        if keys is None or not len(keys):
+            return -1
+        key = str(key)
+        i = int(np.searchsorted(keys, key))
+        return i if i < len(keys) and keys[i] == key else -1
+
+    def _stats(self, prefix: str, key):
+        i = self._index(f'{prefix}_keys', key)
+        if i < 0:
+            return None
+        return (int(self.arrays[f'{prefix}_count'][i]), float(self.arrays[f'{prefix}_mean'][i]),
+                float(self.arrays[f'{prefix}_std'][i]))
+
+    def user_stats(self, user_id):
+        """
+        (count, mean, std) of a user, or None if unknown
+        """
+        return self._stats('user', user_id)
+
+    def channel_stats(self, channel):
+        return self._stats('channel', channel)
+
+    def score(self, user_id, amount: float, channel: str = None) -> dict:
+        """
+        Score one transaction with the same rule as AnomalyDetector.score_online
+        (read-only: the shared statistics are refreshed by the exporter)
+        """
+        return combine_online_scores(self.user_stats(user_id),
+                                     self.channel_stats(channel) if channel is not None else None,
+                                     float(amount), self.manifest.get('min_count', 0),
+                                     self.manifest.get('z_threshold', 3.0))
+
+    def forecast_band(self, key, timestamp) -> Optional[dict]:
+        """
+        Forecast band of the period containing timestamp for a series key
+        """
+        i = self._index('forecast_keys', key if self.manifest.get('forecast_key') else '')
+        if i < 0:
+            return None
+        offsets = self.arrays['forecast_offsets']
+        lo, hi = int(offsets[i]), int(offsets[i + 1])
+        ts = pd.Timestamp(timestamp).value
+        pos = lo + int(np.searchsorted(self.arrays['forecast_ds'][lo:hi], ts, side='right')) - 1
+        if pos < lo:
+            return None
+        if ts >= int(self.arrays['forecast_ds'][pos]) + self.manifest['forecast_period_ns']:
+            return None
+        return {
+            'ds': pd.Timestamp(int(self.arrays['forecast_ds'][pos])),
+            'yhat': float(self.arrays['forecast_yhat'][pos]),
+            'yhat_lower': float(self.arrays['forecast_lower'][pos]),
+            'yhat_upper': float(self.arrays['forecast_upper'][pos])
+        }
+
+    def threshold(self, name: str, default: float = None) -> Optional[float]:
+        i = self._index('threshold_keys', name)
+        return float(self.arrays['threshold_values'][i]) if i >= 0 else default
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'export':
+        # publish an online-statistics snapshot (AnomalyDetector.save_online_state)
+        detector = AnomalyDetector()
+        detector.load_online_state(sys.argv[2])
+        print(f"Published {export_model_state(sys.argv[3], detector)}")
+    else:
+        import tempfile
+
+        detector = AnomalyDetector(min_count=3)
+        for amount in [100, 120, 90, 110, 105]:
+            detector.update_online('user_1', amount, 'UPI')
+        with tempfile.TemporaryDirectory() as root:
+            export_model_state(root, detector, thresholds={'large_txn_p95': 2500.0})
+            state = SharedModelState(root)
+            print(state.version, state.score('user_1', 5000, 'UPI'), state.threshold('large_txn_p95'))
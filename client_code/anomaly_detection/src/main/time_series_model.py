@@ -2,24 +2,196 @@
 time_series_model.py
 --------------------
 Purpose:
-    Build time-series models (ARIMA or Prophet) for predicting user/fund contributions.
+    Build time-series models (ARIMA, Prophet or Holt-Winters) for predicting
+    user/fund contributions.
     Used to detect anomalies based on deviation from expected patterns.
+
+    'holt_winters' is a NumPy additive Holt-Winters / EWMA backend meant for
+    first-pass screening: forecast_batch runs it over every series at once
+    as one padded (series x periods) array. Prophet and statsmodels are only
+    imported when their methods are used.
+
+    fit_batch fits one model per series (fund, heavy contributor, ...) across
+    a process pool with a per-series timeout. The timeout is raised inside the
+    worker by SIGALRM and enforced again by the parent, which terminates the
+    pool if a fit ignores the signal (e.g. stuck in native code) and carries
+    on with the remaining series in a fresh pool. Fitted models are cached on
+    disk under a content hash of the resampled series and the model settings,
+    so series that did not change since the last run are not refitted.
+
+    The cache holds pickles, and loading a pickle can run arbitrary code:
+    cache_dir must only be writable by the service account that runs the
+    fits (never a shared or user-supplied directory).
 """
 
+import os
+import json
+import pickle
+import signal
+import hashlib
+import time
+import numpy as np
 import pandas as pd
-from prophet import Prophet
-from statsmodels.tsa.arima.model import ARIMA
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from typing import Dict
 
+from utils.helpers import parse_utc_timestamps
+
+METHODS = ('prophet', 'arima', 'holt_winters')
+
+DEFAULT_PARAMS = {
+    'prophet': {'daily_seasonality': True},
+    'arima': {'order': (5, 1, 0)},
+    # beta=0 and season_length=None reduce this to a plain EWMA
+    'holt_winters': {'alpha': 0.3, 'beta': 0.05, 'gamma': 0.1, 'season_length': 7, 'interval_width': 0.8}
+}
+
+
+def _resample(df: pd.DataFrame, freq: str = 'D') -> pd.DataFrame:
+    """
+    Aggregate transactions to a regular series with columns ['ds', 'y']
+    (empty periods between the first and last transaction are 0)
+    """
+    s = pd.Series(pd.to_numeric(df['amount'], errors='coerce').to_numpy(),
+                  index=parse_utc_timestamps(df['timestamp']).to_numpy())
+    s = s.sort_index().resample(freq).sum().fillna(0)
+    return pd.DataFrame({'ds': s.index, 'y': s.to_numpy()})
+
+
+def _holt_winters_fit(Y: np.ndarray, alpha: float, beta: float, gamma: float,
+                     season_length: int = None, **_) -> dict:
+    """
+    Run additive Holt-Winters over many series at once.
+    Args:
+        Y: (n_series, n_periods) array on a shared calendar; NaN before a
+           series starts (left padding), real values (0 for quiet periods) after
+    Returns:
+        dict of per-series arrays: level, trend, season (n_series, m),
+        sigma2 (one-step residual variance) and n_periods
+    """
+    n, T = Y.shape
+    m = season_length or 1
+    gamma = gamma if season_length else 0.0
+    level = np.zeros(n)
+    trend = np.zeros(n)
+    season = np.zeros((n, m))
+    started = np.zeros(n, dtype=bool)
+    sse = np.zeros(n)
+    n_resid = np.zeros(n)
+
+    for t in range(T):
+        y = Y[:, t]
+        present = ~np.isnan(y)
+        new = present & ~started
+        level[new] = y[new]
+        started |= new
+        active = present & ~new
+        if not active.any():
+            continue
+        s = season[:, t % m]
+        forecast = level + trend + s
+        resid = np.where(active, y - forecast, 0.0)
+        sse += resid * resid
+        n_resid += active
+
+        y_active = np.where(active, y, 0.0)
+        new_level = alpha * (y_active - s) + (1 - alpha) * (level + trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        new_season = gamma * (y_active - new_level) + (1 - gamma) * s
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+        season[:, t % m] = np.where(active, new_season, s)
+
+    sigma2 = np.where(n_resid > 1, sse / np.maximum(n_resid - 1, 1), 0.0)
+    return {'level': level, 'trend': trend, 'season': season, 'sigma2': sigma2,
+            'n_periods': T, 'alpha': alpha, 'beta': beta, 'gamma': gamma, 'season_length': m}
+
+
+def _holt_winters_predict(state: dict, periods: int, interval_width: float = 0.8):
+    """
+    h-step forecasts with normal prediction intervals
+    Returns:
+        (yhat, yhat_lower, yhat_upper), each (n_series, periods)
+    """
+    m, T = state['season_length'], state['n_periods']
+    h = np.arange(1, periods + 1)
+    yhat = state['level'][:, None] + h[None, :] * state['trend'][:, None] \
+        + state['season'][:, (T + h - 1) % m]
+
+    # ETS(A,A,A) variance: sigma2 * (1 + sum_{j<h} c_j^2), c_j = alpha(1 + j beta) + gamma [j % m == 0]
+    j = np.arange(1, periods)
+    c = state['alpha'] * (1 + j * state['beta'])
+    if m > 1:
+        c = c + state['gamma'] * (j % m == 0)
+    var_factor = 1.0 + np.concatenate([[0.0], np.cumsum(c * c)])
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+    half_width = z * np.sqrt(state['sigma2'][:, None] * var_factor[None, :])
+    return yhat, yhat - half_width, yhat + half_width
+
+
+def _series_hash(df_ts: pd.DataFrame, method: str, params: dict, freq: str) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps({'method': method, 'params': params, 'freq': freq}, sort_keys=True, default=str).encode())
+    h.update(df_ts['ds'].to_numpy(dtype='datetime64[ns]').tobytes())
+    h.update(df_ts['y'].to_numpy(dtype='float64').tobytes())
+    return h.hexdigest()
+
+
+# extra time the parent allows before killing a fit, so the worker's own alarm normally fires first
+PARENT_TIMEOUT_GRACE_SECONDS = 5.0
+
+
+def _terminate_pool(executor: ProcessPoolExecutor):
+    # ProcessPoolExecutor cannot cancel a running task; only killing its worker frees the slot
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("series fit timed out")
+
+
+def _fit_series_task(method: str, params: dict, df_ts: pd.DataFrame,
+                     timeout_seconds: int, cache_path: str = None, freq: str = 'D'):
+    """
+    Worker entry point: fit one resampled series under an alarm-based timeout.
+    Module-level so it can be pickled for the process pool.
+    """
+    previous = signal.signal(signal.SIGALRM, _on_timeout)
+    signal.alarm(max(int(timeout_seconds), 1))
+    try:
+        model = TimeSeriesModel(method, params)
+        model._fit_resampled(df_ts, freq)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+    if cache_path is not None:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(model, f)
+        os.replace(tmp_path, cache_path)
+    return model
+
+
 class TimeSeriesModel:
-    def __init__(self, method='prophet'):
+    def __init__(self, method='prophet', params: dict = None):
         """
         Initialize time-series model
         Args:
-            method: 'prophet' or 'arima'
+            method: 'prophet', 'arima' or 'holt_winters'
+            params: model settings (Prophet kwargs, {'order': (p, d, q)} for ARIMA,
+                    smoothing / season_length / interval_width for Holt-Winters)
         """
+        if method not in METHODS:
+            raise ValueError(f"Method must be one of {METHODS}")
         self.method = method
+        self.params = dict(DEFAULT_PARAMS.get(method, {}) if params is None else params)
         self.model = None
+        self.models = {}
+        self.batch_status = {}
 
     def fit(self, df: pd.DataFrame, user_id: int = None):
         """
@@ -28,19 +200,109 @@ class TimeSeriesModel:
             df: DataFrame with columns ['timestamp', 'amount']
             user_id: optional, for logging purposes
         """
-        df_ts = df.copy()
-        df_ts['timestamp'] = pd.to_datetime(df_ts['timestamp'])
-        df_ts = df_ts.set_index('timestamp').resample('D').sum().fillna(0).reset_index()
-        df_ts.rename(columns={'timestamp': 'ds', 'amount': 'y'}, inplace=True)
+        self._fit_resampled(_resample(df))
 
+    def _fit_resampled(self, df_ts: pd.DataFrame, freq: str = 'D'):
         if self.method == 'prophet':
-            self.model = Prophet(daily_seasonality=True)
+            from prophet import Prophet
+            self.model = Prophet(**self.params)
             self.model.fit(df_ts)
         elif self.method == 'arima':
-            self.model = ARIMA(df_ts['y'], order=(5,1,0))
+            from statsmodels.tsa.arima.model import ARIMA
+            self.model = ARIMA(df_ts['y'], **self.params)
             self.model = self.model.fit()
         else:
-            raise ValueError("Method must be 'prophet' or 'arima'")
+            state = _holt_winters_fit(df_ts['y'].to_numpy(dtype=np.float64)[None, :], **self.params)
+            state['last_ds'] = df_ts['ds'].iloc[-1]
+            state['freq'] = freq
+            self.model = state
+
+    def fit_batch(self, df: pd.DataFrame, key_col: str, max_workers: int = None,
+                  timeout_seconds: int = 600, cache_dir: str = None, freq: str = 'D',
+                  min_points: int = 2) -> Dict:
+        """
+        Fit one model per series in parallel
+        Args:
+            df: transactions with key_col, 'timestamp', 'amount'
+            key_col: column identifying a series (e.g. 'fund_id' or 'user_id')
+            max_workers: process pool size (default: CPU count)
+            timeout_seconds: per-series fit budget; slower fits are abandoned
+                             (a worker that overruns it is killed)
+            cache_dir: directory of cached fitted models (pickles), keyed by content hash;
+                       trusted input, so writable only by this service
+            freq: resampling frequency
+            min_points: series with fewer resampled points are skipped
+        Returns:
+            dict key -> fitted TimeSeriesModel (failed/skipped keys are absent);
+            per-key outcome in self.batch_status
+        """
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.models, self.batch_status = {}, {}
+        pending = {}
+        for key, group in df.groupby(key_col, sort=False):
+            df_ts = _resample(group, freq)
+            if len(df_ts) < min_points:
+                self.batch_status[key] = 'skipped: too few points'
+                continue
+            cache_path = None
+            if cache_dir:
+                cache_path = os.path.join(cache_dir, f"{_series_hash(df_ts, self.method, self.params, freq)}.pkl")
+                if os.path.exists(cache_path):
+                    with open(cache_path, 'rb') as f:
+                        self.models[key] = pickle.load(f)
+                    self.batch_status[key] = 'cached'
+                    continue
+            pending[key] = (df_ts, cache_path)
+
+        if pending:
+            self._fit_pending(pending, max_workers or os.cpu_count() or 1, timeout_seconds, freq)
+        return self.models
+
+    def _fit_pending(self, pending: Dict, max_workers: int, timeout_seconds: int, freq: str):
+        """
+        Fit the pending series with at most max_workers in flight, so a task
+        starts running when it is submitted and its deadline can be kept here
+        """
+        queue = list(pending.items())
+        budget = timeout_seconds + PARENT_TIMEOUT_GRACE_SECONDS
+        while queue:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            in_flight = {}
+            timed_out = False
+            try:
+                while (queue or in_flight) and not timed_out:
+                    while queue and len(in_flight) < max_workers:
+                        key, (df_ts, cache_path) = queue.pop(0)
+                        future = executor.submit(_fit_series_task, self.method, self.params,
+                                                 df_ts, timeout_seconds, cache_path, freq)
+                        in_flight[future] = (key, time.monotonic() + budget)
+                    next_deadline = min(deadline for _, deadline in in_flight.values())
+                    done, _ = wait(in_flight, timeout=max(0.0, next_deadline - time.monotonic()),
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key, _ = in_flight.pop(future)
+                        try:
+                            self.models[key] = future.result()
+                            self.batch_status[key] = 'fitted'
+                        except TimeoutError:
+                            self.batch_status[key] = 'timeout'
+                        except Exception as e:
+                            self.batch_status[key] = f"error: {e}"
+                    now = time.monotonic()
+                    for future, (key, deadline) in list(in_flight.items()):
+                        if deadline <= now and not future.done():
+                            del in_flight[future]
+                            self.batch_status[key] = 'timeout'
+                            timed_out = True
+            finally:
+                if timed_out:
+                    _terminate_pool(executor)
+                    # unfinished fits were killed with the pool: run them again in a fresh one
+                    queue = [(key, pending[key]) for key, _ in in_flight.values()] + queue
+                else:
+                    executor.shutdown(wait=True)
 
     def predict(self, periods: int = 7) -> pd.DataFrame:
         """
@@ -57,3 +319,77 @@ class TimeSeriesModel:
         elif self.method == 'arima':
             forecast = self.model.forecast(steps=periods)
             return pd.DataFrame({'yhat': forecast})
+        else:
+            yhat, lower, upper = _holt_winters_predict(self.model, periods,
+                                                       self.params.get('interval_width', 0.8))
+            ds = pd.date_range(self.model['last_ds'], periods=periods + 1, freq=self.model['freq'])[1:]
+            return pd.DataFrame({'ds': ds, 'yhat': yhat[0], 'yhat_lower': lower[0], 'yhat_upper': upper[0]})
+
+    def forecast_batch(self, df: pd.DataFrame, key_col: str, periods: int = 7,
+                       freq: str = 'D') -> pd.DataFrame:
+        """
+        Holt-Winters forecasts for every series at once
+        Args:
+            df: transactions with key_col, 'timestamp', 'amount'
+            key_col: column identifying a series
+            periods: number of future periods
+            freq: resampling frequency
+        Returns:
+            long DataFrame [key_col, 'ds', 'yhat', 'yhat_lower', 'yhat_upper'];
+            all series share the calendar, so forecasts start after the latest period
+        """
+        if self.method != 'holt_winters':
+            raise ValueError("forecast_batch needs method='holt_winters'; use fit_batch for Prophet/ARIMA")
+        periods_idx = parse_utc_timestamps(df['timestamp'], errors='coerce').dt.floor(freq)
+        # rows without a key or a timestamp belong to no cell: factorize / get_indexer
+        # would give them -1, which numpy indexing wraps onto the last series / period
+        valid = (df[key_col].notna() & periods_idx.notna()).to_numpy()
+        if not valid.any():
+            return pd.DataFrame(columns=[key_col, 'ds', 'yhat', 'yhat_lower', 'yhat_upper'])
+        codes, keys = pd.factorize(df[key_col][valid], sort=True)
+        periods_idx = periods_idx[valid]
+        calendar = pd.date_range(periods_idx.min(), periods_idx.max(), freq=freq)
+        col = calendar.get_indexer(periods_idx)
+        amounts = pd.to_numeric(df['amount'][valid], errors='coerce').fillna(0).to_numpy()
+
+        # padded (series x periods) matrix: NaN until a series' first transaction
+        Y = np.zeros((len(keys), len(calendar)))
+        np.add.at(Y, (codes, col), amounts)
+        first_col = np.full(len(keys), len(calendar))
+        np.minimum.at(first_col, codes, col)
+        Y[np.arange(len(calendar))[None, :] < first_col[:, None]] = np.nan
+
+        state = _holt_winters_fit(Y, **self.params)
+        yhat, lower, upper = _holt_winters_predict(state, periods, self.params.get('interval_width', 0.8))
+        ds = pd.date_range(calendar[-1], periods=periods + 1, freq=freq)[1:]
+        return pd.DataFrame({
+            key_col: np.repeat(keys.to_numpy(), periods),
+            'ds': np.tile(ds.to_numpy(), len(keys)),
+            'yhat': yhat.ravel(),
+            'yhat_lower': lower.ravel(),
+            'yhat_upper': upper.ravel()
+        })
+
+
+def benchmark(num_series: int = 100_000, num_days: int = 180, periods: int = 7):
+    """
+    Vectorized Holt-Winters over many synthetic daily series
+    """
+    rng = np.random.default_rng(0)
+    Y = rng.poisson(3, size=(num_series, num_days)) * rng.lognormal(5, 1, size=(num_series, 1))
+    starts = rng.integers(0, num_days // 2, size=num_series)
+    Y = Y.astype(np.float64)
+    Y[np.arange(num_days)[None, :] < starts[:, None]] = np.nan
+    params = DEFAULT_PARAMS['holt_winters']
+    start = time.perf_counter()
+    state = _holt_winters_fit(Y, **params)
+    yhat, lower, upper = _holt_winters_predict(state, periods, params['interval_width'])
+    elapsed = time.perf_counter() - start
+    print(f"Holt-Winters forecasts for {num_series} series x {num_days} days in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_detection.anomaly_detector import AnomalyDetector, OnlineStatsStore
+
+
+def _transactions():
+    rng = np.random.default_rng(0)
+    amounts = rng.normal(1000, 50, 200)
+    amounts[5] = 5000     # far above the user's usual amount
+    amounts[17] = 10      # far below it
+    return pd.DataFrame({'user_id': ['u1'] * 100 + ['u2'] * 100, 'amount': amounts})
+
+
+def test_combined_score_is_signed_and_in_threshold_units():
+    detector = AnomalyDetector()
+    df = _transactions()
+    out = detector.grouped_anomaly_scores(df, group_cols=('user_id',))
+
+    assert out.loc[5, 'anomaly_score'] > 1
+    assert out.loc[17, 'anomaly_score'] < -1
+    np.testing.assert_array_equal(out['anomaly_score'].abs() > 1, out['is_anomaly'])
+    # the MAD score alone sits on another scale than the z-score
+    expected = max(out.loc[5, 'zscore_user_id'] / detector.threshold, out.loc[5, 'mad_user_id'] / 3.5)
+    assert out.loc[5, 'anomaly_score'] == expected
+
+
+def test_combined_score_is_nan_without_any_score():
+    df = pd.DataFrame({'user_id': ['u1', 'u2'], 'amount': [1.0, 2.0]})
+    out = AnomalyDetector().grouped_anomaly_scores(df, group_cols=('user_id',))
+    assert out['anomaly_score'].isna().all()
+    assert not out['is_anomaly'].any()
+
+
+def test_as_of_deviation_leaves_rows_without_timestamp_unmatched():
+    forecast = pd.DataFrame({'ds': pd.date_range('2024-01-01', periods=3, freq='D'),
+                             'yhat': [100.0] * 3, 'yhat_lower': [90.0] * 3, 'yhat_upper': [110.0] * 3})
+    df = pd.DataFrame({'timestamp': ['2024-01-02 10:00', None, '2024-01-01 12:00'],
+                       'amount': [130.0, 100.0, 95.0]})
+    out = AnomalyDetector().deviation_from_forecast(df, forecast, freq=None)
+
+    assert out.loc[0, 'deviation_score'] == 3.0
+    assert np.isnan(out.loc[1, 'deviation_score'])
+    assert not out.loc[1, 'is_anomaly']
+    assert out.loc[2, 'deviation_score'] == -0.5
+
+
+def test_online_channel_keys_are_strings():
+    detector = AnomalyDetector(min_count=1)
+    for amount in (100.0, 110.0, 90.0):
+        detector.update_online('u1', amount, channel=7)
+    result = detector.score_online('u2', 100.0, channel='7', update=False)
+    assert result['channel_z'] is not None
+
+
+def test_worker_state_is_checkpointed_periodically(tmp_path):
+    path = str(tmp_path / 'state.npz')
+    worker = AnomalyDetector()
+    worker.open_worker_state(path)
+    for i in range(3):
+        worker.score_online('u1', 100.0 + i, channel='upi')
+        assert worker.maybe_save_worker_state(path, every_n=3, interval_seconds=3600) == (i == 2)
+    assert not worker.maybe_save_worker_state(path, every_n=3, interval_seconds=0)
+
+    restarted = AnomalyDetector()
+    restarted.load_online_state(path)
+    assert restarted.user_stats.stats('u1')[0] == 3
+
+
+def test_online_stats_without_decay_match_the_batch_statistics():
+    df = _transactions()
+    detector = AnomalyDetector()
+    detector.fit_online(df)
+    for user_id, amounts in df.groupby('user_id')['amount']:
+        count, mean, std = detector.user_stats.stats(user_id)
+        assert count == len(amounts)
+        assert np.isclose(mean, amounts.mean()) and np.isclose(std, amounts.std())
+
+
+def test_merged_worker_stats_equal_one_sequential_store():
+    rng = np.random.default_rng(4)
+    values = rng.normal(100, 10, 60)
+    sequential, base, worker = (OnlineStatsStore(decay=0.95) for _ in range(3))
+    for v in values:
+        sequential.update('u1', v)
+    for v in values[:40]:
+        base.update('u1', v)
+    for v in values[40:]:
+        worker.update('u1', v)
+    np.testing.assert_allclose(base.merge(worker).stats('u1'), sequential.stats('u1'))
+
+
+def test_new_user_is_scored_against_its_channel():
+    detector = AnomalyDetector(min_count=5)
+    for i in range(20):
+        detector.update_online(f'u{i}', 100.0 + i % 3, channel='upi')
+    result = detector.score_online('newcomer', 1000.0, channel='upi')
+    assert result['user_z'] is None
+    assert result['anomaly_score'] == result['channel_z'] and result['is_anomaly']
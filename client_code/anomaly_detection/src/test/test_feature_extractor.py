@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_detection.feature_extractor import FeatureExtractor, VelocityTracker
+
+
+def _transactions(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': [f'u{i % 10}' for i in range(n)],
+        'fund_id': [f'f{i % 3}' for i in range(n)],
+        'amount': rng.lognormal(6, 1, n).round(2),
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='h').strftime('%Y-%m-%dT%H:%M:%S')
+    })
+
+
+def test_is_large_txn_on_fresh_extractor_uses_batch_quantile():
+    df = _transactions()
+    features = FeatureExtractor().basic_transaction_features(df)
+    expected = df['amount'] > df['amount'].quantile(0.95)
+    assert features['is_large_txn'].sum() == expected.sum() > 0
+    assert (features['is_large_txn'] == expected).all()
+
+
+def test_generate_features_does_not_move_the_sketches():
+    df = _transactions()
+    extractor = FeatureExtractor()
+    extractor.generate_features(df)
+    extractor.generate_features(df)
+    extractor.generate_features_chunked([df.iloc[:100], df.iloc[100:]])
+    assert extractor.amount_sketches.global_digest.count == 0
+
+
+def test_streaming_updates_feed_the_sketches():
+    extractor = FeatureExtractor()
+    history = _transactions(seed=1)
+    extractor.basic_transaction_features(history, update_sketches=True)
+    assert extractor.amount_sketches.global_digest.count == len(history)
+
+    # a frame of small amounts is judged against the history, not against itself
+    small = _transactions(20, seed=2).assign(amount=1.0)
+    assert not extractor.basic_transaction_features(small)['is_large_txn'].any()
+
+
+def test_user_features_batch_incremental_and_chunked_agree():
+    df = _transactions(5000, seed=3).assign(user_id=lambda d: d['user_id'] + d['fund_id'])
+    extractor = FeatureExtractor()
+    batch = extractor.user_aggregated_features(df)
+    chunked = extractor.generate_features_chunked(df.iloc[i:i + 700] for i in range(0, len(df), 700))
+    for part in np.array_split(np.arange(len(df)), 9):
+        incremental = extractor.update_user_features(df.iloc[part])
+    incremental = incremental.sort_values('user_id', ignore_index=True)[batch.columns]
+
+    exact = ['user_id', 'txn_count', 'txn_sum', 'txn_mean', 'txn_max', 'txn_min']
+    for got in (chunked, incremental):
+        pd.testing.assert_frame_equal(got[exact], batch[exact], check_exact=True)
+        pd.testing.assert_frame_equal(got, batch, check_exact=False, rtol=1e-12)
+
+
+def _bursty_transactions():
+    rng = np.random.default_rng(5)
+    offsets = np.sort(rng.integers(0, 3 * 24 * 3600, 300))
+    return pd.DataFrame({
+        'user_id': rng.choice(['u1', 'u2', 'u3'], 300),
+        'amount': rng.lognormal(5, 1, 300).round(2),
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(offsets, unit='s'),
+    })
+
+
+def test_velocity_features_count_the_trailing_window():
+    df = _bursty_transactions()
+    hour = pd.Timedelta('1h').value
+    out = FeatureExtractor().velocity_features(df, windows={'1h': hour})
+
+    for i in range(0, len(df), 37):
+        row = df.iloc[i]
+        mine = df[(df['user_id'] == row['user_id']) & (df['timestamp'] <= row['timestamp'])
+                  & (df['timestamp'] > row['timestamp'] - pd.Timedelta('1h'))]
+        assert out.loc[i, 'txn_count_1h'] == len(mine)
+        assert np.isclose(out.loc[i, 'txn_sum_1h'], mine['amount'].sum())
+
+
+def test_online_tracker_matches_the_batch_features():
+    df = _bursty_transactions()
+    batch = FeatureExtractor().velocity_features(df)
+    tracker = VelocityTracker()
+    online = pd.DataFrame([tracker.update(u, t, a) for u, t, a in zip(df['user_id'], df['timestamp'], df['amount'])])
+    pd.testing.assert_frame_equal(online[batch.columns], batch, check_dtype=False)
@@ -0,0 +1,51 @@
+import json
+import multiprocessing
+import os
+
+from anomaly_detection.anomaly_detector import AnomalyDetector
+from anomaly_detection.shared_model_state import MANIFEST_FILE, SharedModelState, export_model_state
+
+
+def _detector():
+    detector = AnomalyDetector(min_count=3)
+    for amount in [100, 120, 90, 110, 105]:
+        detector.update_online('user_1', amount, 'UPI')
+    return detector
+
+
+def _export_many(root, n):
+    detector = _detector()
+    for _ in range(n):
+        export_model_state(root, detector, keep_versions=100)
+
+
+def test_concurrent_exporters_publish_distinct_versions(tmp_path):
+    root = str(tmp_path)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_export_many, args=(root, 5)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v'))
+    assert versions == [f"v{i:06d}" for i in range(1, 21)]
+    assert SharedModelState(root).version == 'v000020'
+
+
+def test_format_version_mismatch_keeps_last_good_version(tmp_path):
+    root = str(tmp_path)
+    detector = _detector()
+    export_model_state(root, detector)
+    state = SharedModelState(root, reload_interval_seconds=0)
+    newer = export_model_state(root, detector)
+    manifest_path = os.path.join(root, newer, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['format_version'] += 1
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+    assert not state.maybe_reload(force=True)
+    assert state.version == 'v000001'
+    assert state.user_stats('user_1')[0] == 5
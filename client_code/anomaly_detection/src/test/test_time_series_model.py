@@ -0,0 +1,66 @@
+import signal
+import time
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection import time_series_model
+from anomaly_detection.time_series_model import TimeSeriesModel
+
+
+def _transactions():
+    days = pd.date_range('2024-01-01', periods=28, freq='D')
+    return pd.DataFrame({
+        'fund_id': ['a'] * 28 + ['b'] * 28,
+        'timestamp': [d.isoformat() for d in days] * 2,
+        'amount': np.r_[np.full(28, 100.0), np.full(28, 5.0)]
+    })
+
+
+def test_forecast_batch_ignores_rows_without_key_or_timestamp():
+    clean = _transactions()
+    noisy = pd.concat([clean, pd.DataFrame({
+        'fund_id': [None, np.nan, 'b', 'b'],
+        'timestamp': ['2024-01-05', '2024-01-06', None, 'not a date'],
+        'amount': [1e6, 1e6, 1e6, 1e6]
+    })], ignore_index=True)
+    model = TimeSeriesModel(method='holt_winters')
+
+    expected = model.forecast_batch(clean, 'fund_id', periods=3)
+    got = model.forecast_batch(noisy, 'fund_id', periods=3)
+
+    pd.testing.assert_frame_equal(got, expected)
+    assert set(got['fund_id']) == {'a', 'b'}
+    assert got.loc[got['fund_id'] == 'b', 'yhat'].max() < 10
+
+
+def test_forecast_batch_without_valid_rows_is_empty():
+    df = pd.DataFrame({'fund_id': [None], 'timestamp': ['2024-01-01'], 'amount': [1.0]})
+    assert TimeSeriesModel(method='holt_winters').forecast_batch(df, 'fund_id').empty
+
+
+_original_fit_task = time_series_model._fit_series_task
+
+
+def _stuck_or_fit(method, params, df_ts, timeout_seconds, cache_path=None, freq='D'):
+    if df_ts['y'].iloc[0] == 999:
+        # a fit the worker's alarm cannot interrupt
+        signal.signal(signal.SIGALRM, signal.SIG_IGN)
+        time.sleep(60)
+    return _original_fit_task(method, params, df_ts, timeout_seconds, cache_path, freq)
+
+
+def test_fit_batch_kills_fits_that_overrun_the_timeout(monkeypatch):
+    monkeypatch.setattr(time_series_model, '_fit_series_task', _stuck_or_fit)
+    monkeypatch.setattr(time_series_model, 'PARENT_TIMEOUT_GRACE_SECONDS', 0.5)
+    df = _transactions()
+    stuck = df[df['fund_id'] == 'a'].assign(fund_id='stuck', amount=999.0)
+    df = pd.concat([stuck, df, df.assign(fund_id=df['fund_id'] + '2')], ignore_index=True)
+
+    model = TimeSeriesModel(method='holt_winters')
+    start = time.monotonic()
+    models = model.fit_batch(df, 'fund_id', max_workers=2, timeout_seconds=1)
+
+    assert time.monotonic() - start < 15
+    assert model.batch_status == {'stuck': 'timeout', 'a': 'fitted', 'b': 'fitted', 'a2': 'fitted', 'b2': 'fitted'}
+    assert sorted(models) == ['a', 'a2', 'b', 'b2']
@@ -4,16 +4,87 @@ behavior_score_model.py
 Purpose:
     Compute behavior scores for users based on profile deviations and clustering.
     Score can be used for trust scoring or anomaly detection.
+
+    A fitted scaler + IsolationForest is saved as one versioned joblib
+    artifact, so new users are scored with score_batch (chunked, multi-core,
+    bounded memory) without refitting on the whole population.
+
+    To follow drift without full retrains, refresh() replaces the oldest
+    fraction of trees with trees grown on a recent sample (warm start), and
+    maybe_refresh() does so only when the score distribution has drifted
+    from the one seen at fit time (PSI / KS). Splicing trees edits private
+    IsolationForest attributes, so refresh() only runs on the scikit-learn
+    versions it was verified against (REFRESH_SKLEARN_VERSIONS) and on a
+    model fitted by the running version; otherwise it raises and a full
+    fit_model is needed.
 """
 
+import os
+import sys
+import time
 import pandas as pd
 import numpy as np
+import sklearn
+import joblib
+from joblib import Parallel, delayed
+from typing import List
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import IsolationForest
+from utils.client_packages import package_call
+from utils.logger import get_logger
+
+logger = get_logger("BehaviorScoreModel")
+
+ARTIFACT_FORMAT = 1
+REFERENCE_SCORES = 10_000
+# major.minor releases whose IsolationForest internals refresh() was checked against
+REFRESH_SKLEARN_VERSIONS = ('1.9',)
+REFRESH_FOREST_ATTRIBUTES = ('_max_samples', '_seeds', '_decision_path_lengths', '_average_path_length_per_tree')
+
+
+def population_stability_index(reference: np.ndarray, current: np.ndarray, bins: int = 10) -> float:
+    """
+    PSI of current vs reference over reference-quantile bins
+    (< 0.1 stable, 0.1-0.2 moderate shift, > 0.2 significant shift)
+    """
+    edges = np.unique(np.quantile(reference, np.linspace(0, 1, bins + 1)[1:-1]))
+    ref_share = np.bincount(np.searchsorted(edges, reference, side='right'), minlength=len(edges) + 1) / len(reference)
+    cur_share = np.bincount(np.searchsorted(edges, current, side='right'), minlength=len(edges) + 1) / len(current)
+    ref_share, cur_share = np.maximum(ref_share, 1e-6), np.maximum(cur_share, 1e-6)
+    return float(np.sum((cur_share - ref_share) * np.log(cur_share / ref_share)))
+
+
+def ks_statistic(reference: np.ndarray, current: np.ndarray) -> float:
+    """
+    Two-sample Kolmogorov-Smirnov statistic: largest gap between the empirical CDFs
+    """
+    reference, current = np.sort(reference), np.sort(current)
+    points = np.concatenate([reference, current])
+    cdf_ref = np.searchsorted(reference, points, side='right') / len(reference)
+    cdf_cur = np.searchsorted(current, points, side='right') / len(current)
+    return float(np.max(np.abs(cdf_ref - cdf_cur)))
+
+
+def _score_chunk(scaler: StandardScaler, model: IsolationForest, features: pd.DataFrame) -> np.ndarray:
+    return model.decision_function(scaler.transform(features))
+
 
 class BehaviorScoreModel:
-    def __init__(self):
+    def __init__(self, n_jobs: int = -1, chunk_size: int = 100_000):
+        """
+        Args:
+            n_jobs: worker processes used by score_batch (-1 = all cores)
+            chunk_size: rows scored per task; bounds the memory of one task
+        """
         self.model = IsolationForest(contamination=0.05, random_state=42)
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.scaler = None
+        self.feature_names: List[str] = []
+        self.model_version = 0
+        self.fitted_at = None
+        self.reference_scores = None
+        self.sklearn_version = None
 
     def fit_model(self, user_profiles: pd.DataFrame):
         """
@@ -27,18 +98,256 @@ class BehaviorScoreModel:
         self.scaler = scaler
         self.model.fit(scaled_features)
         self.user_profiles = user_profiles
+        self.feature_names = list(features.columns)
+        self.model_version += 1
+        self.fitted_at = pd.Timestamp.now().isoformat()
+        self.sklearn_version = sklearn.__version__
+        self._set_reference_scores(self.model.decision_function(scaled_features))
+
+    def _set_reference_scores(self, scores: np.ndarray):
+        # a bounded sample of the score distribution the drift checks compare against
+        if len(scores) > REFERENCE_SCORES:
+            scores = np.random.default_rng(self.model_version).choice(scores, REFERENCE_SCORES, replace=False)
+        self.reference_scores = np.sort(scores)
 
     def compute_scores(self) -> pd.DataFrame:
         """
         Compute anomaly scores (-1 = anomaly, 1 = normal)
         """
-        features = self.user_profiles.drop(columns=['user_id'])
-        scaled_features = self.scaler.transform(features)
-        scores = self.model.decision_function(scaled_features)
-        self.user_profiles['behavior_score'] = scores
+        self.user_profiles['behavior_score'] = self.score_batch(self.user_profiles)['behavior_score'].to_numpy()
         return self.user_profiles[['user_id','behavior_score']]
 
+    def score_batch(self, user_profiles: pd.DataFrame, chunk_size: int = None, n_jobs: int = None) -> pd.DataFrame:
+        """
+        Score users with the fitted scaler and forest (no refit), e.g. new signups
+        Args:
+            user_profiles: DataFrame with user_id and the fitted feature columns
+            chunk_size: rows per task (default self.chunk_size)
+            n_jobs: worker processes (default self.n_jobs); a single chunk is scored inline
+        Returns:
+            DataFrame with ['user_id', 'behavior_score'] in input order
+        """
+        if self.scaler is None:
+            raise ValueError("Model not fitted yet.")
+        missing = [c for c in self.feature_names if c not in user_profiles.columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        chunk_size = chunk_size or self.chunk_size
+        n_jobs = n_jobs if n_jobs is not None else self.n_jobs
+        # same columns, in the same order, as at fit time
+        features = user_profiles[self.feature_names]
+
+        if len(features) <= chunk_size or n_jobs == 1:
+            scores = np.concatenate([_score_chunk(self.scaler, self.model, features.iloc[i:i + chunk_size])
+                                     for i in range(0, len(features), chunk_size)] or [np.empty(0)])
+        else:
+            # generator output: finished chunks are collected in order while
+            # at most pre_dispatch chunks are in flight; loky workers are fresh
+            # interpreters, so the task goes through package_call
+            results = Parallel(n_jobs=n_jobs, return_as='generator')(
+                delayed(package_call)(__spec__.name, '_score_chunk', self.scaler, self.model,
+                                      features.iloc[i:i + chunk_size])
+                for i in range(0, len(features), chunk_size))
+            scores = np.concatenate(list(results))
+        return pd.DataFrame({'user_id': user_profiles['user_id'].to_numpy(), 'behavior_score': scores})
+
+    def check_drift(self, user_profiles: pd.DataFrame, psi_threshold: float = 0.2,
+                    ks_threshold: float = 0.1) -> dict:
+        """
+        Compare the score distribution of user_profiles with the reference from fit time
+        Returns:
+            dict with psi, ks and drifted (either statistic above its threshold)
+        """
+        if self.reference_scores is None:
+            raise ValueError("Model not fitted yet.")
+        scores = self.score_batch(user_profiles)['behavior_score'].to_numpy()
+        psi = population_stability_index(self.reference_scores, scores)
+        ks = ks_statistic(self.reference_scores, scores)
+        return {'psi': psi, 'ks': ks, 'drifted': psi > psi_threshold or ks > ks_threshold}
+
+    def _check_refresh_supported(self, *forests: IsolationForest):
+        running = '.'.join(sklearn.__version__.split('.')[:2])
+        if running not in REFRESH_SKLEARN_VERSIONS:
+            raise RuntimeError(f"refresh() is not supported on scikit-learn {sklearn.__version__} "
+                               f"(verified: {', '.join(REFRESH_SKLEARN_VERSIONS)}); use fit_model instead")
+        if self.sklearn_version != sklearn.__version__:
+            raise RuntimeError(f"Model was fitted with scikit-learn {self.sklearn_version}, running "
+                               f"{sklearn.__version__}; its trees cannot be mixed with new ones, use fit_model")
+        for forest in forests:
+            missing = [name for name in REFRESH_FOREST_ATTRIBUTES if not hasattr(forest, name)]
+            if missing:
+                raise RuntimeError(f"IsolationForest of scikit-learn {sklearn.__version__} lacks {missing}; "
+                                   f"refresh() cannot splice trees, use fit_model")
+
+    def refresh(self, recent_profiles: pd.DataFrame, fraction: float = 0.2, random_state: int = None):
+        """
+        Warm-start refresh: replace the oldest fraction of trees with trees
+        grown on a recent sample, keeping the fitted scaler. New trees are
+        appended, so the front of estimators_ is always the oldest.
+        The contamination offset is recomputed on the recent sample.
+        Args:
+            recent_profiles: recent user profiles (user_id + fitted feature columns)
+            fraction: share of trees replaced
+            random_state: seed of the new trees (default: derived from the model version)
+        Raises:
+            RuntimeError: on a scikit-learn version refresh() was not verified against
+        """
+        if self.scaler is None:
+            raise ValueError("Model not fitted yet.")
+        forest = self.model
+        self._check_refresh_supported(forest)
+        n_new = min(max(1, int(round(fraction * len(forest.estimators_)))), len(forest.estimators_))
+        scaled = self.scaler.transform(recent_profiles[self.feature_names])
+        # same per-tree sample size as the original trees, so path lengths stay comparable
+        donor = IsolationForest(n_estimators=n_new, max_samples=min(forest._max_samples, len(scaled)),
+                                max_features=forest.max_features, bootstrap=forest.bootstrap,
+                                contamination=forest.contamination,
+                                random_state=random_state if random_state is not None else self.model_version + 1)
+        donor.fit(scaled)
+        self._check_refresh_supported(donor)
+
+        forest.estimators_ = forest.estimators_[n_new:] + donor.estimators_
+        forest.estimators_features_ = forest.estimators_features_[n_new:] + donor.estimators_features_
+        forest._seeds = np.concatenate([forest._seeds[n_new:], donor._seeds])
+        forest._decision_path_lengths = tuple(forest._decision_path_lengths[n_new:]) + donor._decision_path_lengths
+        forest._average_path_length_per_tree = tuple(forest._average_path_length_per_tree[n_new:]) \
+            + donor._average_path_length_per_tree
+        # scores are normalised by the expected path length of _max_samples points
+        if forest.contamination != 'auto':
+            forest.offset_ = np.percentile(forest.score_samples(scaled), 100.0 * forest.contamination)
+
+        self.model_version += 1
+        self.fitted_at = pd.Timestamp.now().isoformat()
+        self._set_reference_scores(forest.decision_function(scaled))
+
+    def maybe_refresh(self, recent_profiles: pd.DataFrame, fraction: float = 0.2,
+                      psi_threshold: float = 0.2, ks_threshold: float = 0.1) -> dict:
+        """
+        Refresh the forest from recent_profiles only if their scores drifted
+        Returns:
+            drift report with refreshed flag
+        """
+        report = self.check_drift(recent_profiles, psi_threshold, ks_threshold)
+        report['refreshed'] = report['drifted']
+        if report['drifted']:
+            self.refresh(recent_profiles, fraction)
+        return report
+
+    def save(self, path: str):
+        """
+        Persist the fitted scaler + forest as one versioned artifact (atomic replace)
+        """
+        if self.scaler is None:
+            raise ValueError("Model not fitted yet.")
+        artifact = {
+            'format': ARTIFACT_FORMAT,
+            'model_version': self.model_version,
+            'fitted_at': self.fitted_at,
+            'sklearn_version': self.sklearn_version,
+            'feature_names': self.feature_names,
+            'reference_scores': self.reference_scores,
+            'scaler': self.scaler,
+            'model': self.model
+        }
+        tmp_path = path + '.tmp'
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, n_jobs: int = -1, chunk_size: int = 100_000) -> "BehaviorScoreModel":
+        artifact = joblib.load(path)
+        if artifact.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported model artifact format: {artifact.get('format')}")
+        if artifact['sklearn_version'] != sklearn.__version__:
+            logger.warning(f"Model saved with scikit-learn {artifact['sklearn_version']}, "
+                           f"running {sklearn.__version__}; refresh() is disabled until fit_model")
+        model = cls(n_jobs=n_jobs, chunk_size=chunk_size)
+        model.model = artifact['model']
+        model.scaler = artifact['scaler']
+        model.feature_names = artifact['feature_names']
+        model.model_version = artifact['model_version']
+        model.fitted_at = artifact['fitted_at']
+        model.reference_scores = artifact['reference_scores']
+        model.sklearn_version = artifact['sklearn_version']
+        return model
+
+
+def benchmark(num_users: int = 2_000_000, num_features: int = 8):
+    """
+    score_batch on new users after fitting on a sample, inline vs parallel
+    """
+    rng = np.random.default_rng(0)
+    columns = [f'feature_{i}' for i in range(num_features)]
+    population = pd.DataFrame(rng.random((num_users, num_features)), columns=columns)
+    population.insert(0, 'user_id', np.arange(num_users))
+    model = BehaviorScoreModel()
+    model.fit_model(population.iloc[:100_000].copy())
+
+    start = time.perf_counter()
+    inline = model.score_batch(population, n_jobs=1)
+    print(f"Inline scoring of {num_users} users in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    parallel = model.score_batch(population)
+    print(f"Parallel scoring ({os.cpu_count()} cores) in {time.perf_counter() - start:.2f}s")
+    print("Same scores:", bool(np.array_equal(inline['behavior_score'], parallel['behavior_score'])))
+
+
+def benchmark_refresh(num_users: int = 1_000_000, num_features: int = 8, recent_users: int = 50_000,
+                      fraction: float = 0.2):
+    """
+    Warm-start refresh vs full refit after a drift: cost, and how much
+    holdout scores move (rank correlation with the previous model)
+    """
+    rng = np.random.default_rng(0)
+    columns = [f'feature_{i}' for i in range(num_features)]
+
+    def users(n, shift=0.0):
+        profiles = pd.DataFrame(rng.normal(size=(n, num_features)) + shift, columns=columns)
+        profiles.insert(0, 'user_id', np.arange(n))
+        return profiles
+
+    population, holdout = users(num_users), users(20_000)
+    # part of the recent users behave differently
+    recent = users(recent_users)
+    recent.iloc[:recent_users // 3, 1:] += 1.5
+    shifted = pd.concat([population, recent], ignore_index=True)
+
+    def rank_corr(a, b):
+        return float(np.corrcoef(np.argsort(np.argsort(a)), np.argsort(np.argsort(b)))[0, 1])
+
+    model = BehaviorScoreModel(n_jobs=1)
+    model.fit_model(population)
+    before = model.score_batch(holdout)['behavior_score'].to_numpy()
+    report = model.check_drift(recent)
+    print(f"Drift on recent users: PSI={report['psi']:.3f} KS={report['ks']:.3f} drifted={report['drifted']}")
+
+    start = time.perf_counter()
+    full = BehaviorScoreModel(n_jobs=1)
+    full.fit_model(shifted)
+    full_time = time.perf_counter() - start
+    full_scores = full.score_batch(holdout)['behavior_score'].to_numpy()
+
+    start = time.perf_counter()
+    report = model.maybe_refresh(recent, fraction)
+    refresh_time = time.perf_counter() - start
+    refreshed_scores = model.score_batch(holdout)['behavior_score'].to_numpy()
+
+    print(f"Full refit on {len(shifted)} users: {full_time:.2f}s, "
+          f"holdout rank corr vs previous {rank_corr(before, full_scores):.3f}")
+    print(f"Refresh of {fraction:.0%} trees on {recent_users} users: {refresh_time:.2f}s "
+          f"(refreshed={report['refreshed']}), holdout rank corr vs previous "
+          f"{rank_corr(before, refreshed_scores):.3f}, vs full refit {rank_corr(full_scores, refreshed_scores):.3f}")
+    print(f"Drift vs the re-armed reference: PSI={model.check_drift(recent)['psi']:.3f}")
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(*(int(arg) for arg in sys.argv[2:3]))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark-refresh':
+        benchmark_refresh(*(int(arg) for arg in sys.argv[2:3]))
+        sys.exit(0)
+
     user_profiles = pd.DataFrame({
         'user_id':[1,2,3],
         'avg_session_duration':[0.8,0.5,0.9],
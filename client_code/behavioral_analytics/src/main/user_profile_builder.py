@@ -4,46 +4,402 @@ user_profile_builder.py
 Purpose:
     Build structured user profiles using behavioral features.
     Profiles are later used for anomaly detection and credibility scoring.
+
+    Profiles are served from a ProfileStore: a contiguous float32 feature
+    matrix plus a user_id -> row dict, so a lookup or an in-place update of
+    one user is O(1) instead of a scan over every profile.
+
+    Min-max scaling is split into fit and transform. The fitted min/max are
+    persisted as a versioned JSON file, new users are transformed against
+    them in O(1), and a refit happens only when the share of feature values
+    outside the fitted range exceeds a drift threshold. Other users'
+    profiles therefore stay stable when someone is onboarded.
+
+    Every fitted version is also kept in its own file (scaler.v<N>.json next
+    to scaler.json), and a refit moves the stored profiles onto the new
+    parameters, so the store never mixes two scales.
+
+    The profiles themselves can be persisted next to the scaler
+    (profiles_path), tagged with the scaler version they were normalized
+    with, so a restarted builder serves and extends the same store instead
+    of starting empty. Profiles of another version are rescaled from that
+    version's file, or refused if it is gone.
 """
 
+import os
+import json
+import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Iterable, List
+from utils.logger import get_logger
+
+logger = get_logger("UserProfileBuilder")
+
+class ProfileStore:
+    def __init__(self, profiles: pd.DataFrame = None, id_col: str = 'user_id'):
+        """
+        Args:
+            profiles: DataFrame with id_col and numeric feature columns
+            id_col: column holding the user id
+        """
+        self.id_col = id_col
+        self.columns: List[str] = []
+        self._col_pos: Dict[str, int] = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids: List = []
+        self._rows: Dict = {}
+        # version of the scaler the features were normalized with (None: unknown)
+        self.scaler_version = None
+        if profiles is not None:
+            self.load_frame(profiles)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Feature matrix, one row per user in insertion order (a view, not a copy)
+        """
+        return self._matrix[:len(self._ids)]
+
+    def load_frame(self, profiles: pd.DataFrame):
+        """
+        Replace the store content with a profiles DataFrame
+        """
+        ids = profiles[self.id_col]
+        if ids.duplicated().any():
+            raise ValueError(f"Duplicate {self.id_col} values in profiles.")
+        self.columns = [c for c in profiles.select_dtypes(include='number').columns if c != self.id_col]
+        self._col_pos = {c: i for i, c in enumerate(self.columns)}
+        self._matrix = np.ascontiguousarray(profiles[self.columns].to_numpy(dtype=np.float32))
+        self._ids = ids.tolist()
+        self._rows = {user_id: row for row, user_id in enumerate(self._ids)}
+        self.scaler_version = profiles.attrs.get('scaler_version')
+
+    def add_columns(self, columns: Iterable[str]):
+        """
+        Append feature columns the store does not have yet (NaN for existing users)
+        """
+        new = [c for c in columns if c not in self._col_pos and c != self.id_col]
+        if not new:
+            return
+        grown = np.full((len(self._matrix), len(self.columns) + len(new)), np.nan, dtype=np.float32)
+        grown[:, :len(self.columns)] = self._matrix
+        self._matrix = grown
+        for c in new:
+            self._col_pos[c] = len(self.columns)
+            self.columns.append(c)
+
+    def save(self, path: str):
+        tmp_path = path + '.tmp'
+        pd.to_pickle(self.to_frame(), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, id_col: str = 'user_id') -> 'ProfileStore':
+        return cls(pd.read_pickle(path), id_col)
+
+    def get_profile(self, user_id) -> Dict:
+        """
+        Profile of one user as a dict, {} if unknown
+        """
+        row = self._rows.get(user_id)
+        if row is None:
+            return {}
+        profile = {self.id_col: user_id}
+        profile.update(zip(self.columns, self._matrix[row].tolist()))
+        return profile
+
+    def get_rows(self, user_ids: Iterable) -> np.ndarray:
+        """
+        Row positions of many users at once (-1 for unknown users); O(len(user_ids))
+        through the id -> row dict, which update() keeps current, so appending
+        users never forces a rebuild over the whole store
+        """
+        if not hasattr(user_ids, '__len__'):
+            user_ids = list(user_ids)
+        rows = self._rows
+        return np.fromiter((rows.get(user_id, -1) for user_id in user_ids), dtype=np.intp, count=len(user_ids))
+
+    def get_profiles(self, user_ids: Iterable) -> pd.DataFrame:
+        """
+        Profiles of many users in the requested order; unknown users get NaN features
+        """
+        if not hasattr(user_ids, '__len__'):
+            user_ids = list(user_ids)
+        rows = self.get_rows(user_ids)
+        values = self._matrix[np.maximum(rows, 0)] if len(self._ids) \
+            else np.empty((len(rows), len(self.columns)), dtype=np.float32)
+        values[rows < 0] = np.nan
+        profiles = pd.DataFrame(values, columns=self.columns)
+        profiles.insert(0, self.id_col, np.asarray(user_ids))
+        return profiles
+
+    def update(self, user_id, features: Dict[str, float]):
+        """
+        Overwrite features of one user in place; unknown users are appended
+        (amortized O(1): the matrix grows by doubling)
+        Args:
+            user_id: user to update
+            features: feature name -> value; names not in the store are ignored
+        """
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._matrix):
+                grown = np.full((max(2 * row, 16), len(self.columns)), np.nan, dtype=np.float32)
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            else:
+                self._matrix[row] = np.nan
+            self._ids.append(user_id)
+            self._rows[user_id] = row
+        for name, value in features.items():
+            pos = self._col_pos.get(name)
+            if pos is not None:
+                self._matrix[row, pos] = value
+
+    def to_frame(self) -> pd.DataFrame:
+        profiles = pd.DataFrame(self.matrix.copy(), columns=self.columns)
+        profiles.insert(0, self.id_col, self._ids)
+        profiles.attrs['scaler_version'] = self.scaler_version
+        return profiles
 
 class UserProfileBuilder:
-    def __init__(self):
-        self.profiles = pd.DataFrame()
+    def __init__(self, scaler_path: str = None, drift_threshold: float = 0.05, min_drift_samples: int = 100,
+                 profiles_path: str = None):
+        """
+        Args:
+            scaler_path: JSON file the fitted scaling parameters are persisted to
+            drift_threshold: share of feature values outside the fitted range that triggers a refit
+            min_drift_samples: values add_user must see before its drift share is trusted
+            profiles_path: file the profile store is persisted to (see save_profiles)
+        """
+        self.store = ProfileStore()
+        self.scaler_path = scaler_path
+        self.profiles_path = profiles_path
+        self.drift_threshold = drift_threshold
+        self.min_drift_samples = min_drift_samples
+        self.scaler = None
+        self.needs_refit = False
+        self._streamed_values = 0
+        self._streamed_outside = 0
+        if profiles_path and os.path.exists(profiles_path):
+            self.store = ProfileStore.load(profiles_path)
+        if scaler_path and os.path.exists(scaler_path):
+            self.load_scaler(scaler_path)
+
+    @property
+    def profiles(self) -> pd.DataFrame:
+        return self.store.to_frame()
 
-    def build_profile(self, user_features: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def _feature_columns(df: pd.DataFrame) -> List[str]:
+        return [c for c in df.select_dtypes(include='number').columns if c != 'user_id']
+
+    # ---------- scaling parameters ----------
+    @staticmethod
+    def versioned_scaler_path(path: str, version: int) -> str:
+        root, ext = os.path.splitext(path)
+        return f"{root}.v{version}{ext}"
+
+    def fit(self, user_features: pd.DataFrame) -> Dict:
         """
-        Generate profile by normalizing and structuring features
+        Fit min-max scaling parameters on a population and persist them as a
+        new version; profiles already stored are rescaled to it
         Args:
             user_features: DataFrame with raw behavioral features
         Returns:
-            DataFrame with structured user profiles
+            scaler dict (version, fitted_at, n_users, columns -> {min, max})
         """
-        df = user_features.copy()
+        columns = self._feature_columns(user_features)
+        mins, maxs = user_features[columns].min(), user_features[columns].max()
+        previous = self.scaler
+        self.scaler = {
+            'version': (self.scaler['version'] + 1) if self.scaler else 1,
+            'fitted_at': pd.Timestamp.now().isoformat(),
+            'n_users': int(len(user_features)),
+            'columns': {c: {'min': float(mins[c]), 'max': float(maxs[c])} for c in columns}
+        }
+        self.needs_refit = False
+        self._streamed_values = self._streamed_outside = 0
+        if previous is not None and len(self.store):
+            self.store = ProfileStore(self.rescale(self.store.to_frame(), previous))
+        self.store.scaler_version = self.scaler['version']
+        self.store.add_columns(self.scaler['columns'])
+        if self.scaler_path:
+            self.save_scaler(self.scaler_path)
+        return self.scaler
+
+    def save_scaler(self, path: str):
+        """
+        Write the scaler to path and to its own version file, which later
+        loads use to rescale profiles normalized with this version
+        """
+        for target in (self.versioned_scaler_path(path, self.scaler['version']), path):
+            tmp_path = target + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.scaler, f, indent=2)
+            os.replace(tmp_path, target)
+
+    def load_scaler(self, path: str):
+        """
+        Load the current scaler; stored profiles of another version are
+        rescaled from that version's file
+        Raises:
+            ValueError: the profiles' scaler version file is missing
+        """
+        with open(path, 'r') as f:
+            self.scaler = json.load(f)
+        version = self.store.scaler_version
+        if len(self.store) and version is not None and version != self.scaler['version']:
+            old_path = self.versioned_scaler_path(path, version)
+            if not os.path.exists(old_path):
+                raise ValueError(f"Profiles were normalized with scaler v{version}, "
+                                 f"but {old_path} is missing; rebuild them with build_profile")
+            with open(old_path, 'r') as f:
+                previous = json.load(f)
+            logger.info(f"Rescaling {len(self.store)} profiles from scaler v{version} to v{self.scaler['version']}")
+            self.store = ProfileStore(self.rescale(self.store.to_frame(), previous))
+        self.store.scaler_version = self.scaler['version']
+        # add_user only writes columns the store has
+        self.store.add_columns(self.scaler['columns'])
 
-        # Feature scaling (min-max normalization)
-        numeric_cols = df.select_dtypes(include='number').columns
-        for col in numeric_cols:
-            min_val = df[col].min()
-            max_val = df[col].max()
+    def save_profiles(self, path: str = None):
+        """
+        Persist the profile store (write-then-rename); build_profile does this
+        automatically, after add_user / update_profile call it when convenient
+        """
+        self.store.save(path or self.profiles_path)
+
+    def transform(self, user_features: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scale features with the fitted parameters; values outside the fitted
+        range are clipped to [0, 1]. Columns without parameters are left as is.
+        """
+        if self.scaler is None:
+            raise ValueError("Scaler not fitted yet.")
+        df = user_features.copy()
+        for col, params in self.scaler['columns'].items():
+            if col not in df.columns:
+                continue
+            min_val, max_val = params['min'], params['max']
             if max_val > min_val:
-                df[col] = (df[col] - min_val) / (max_val - min_val)
+                df[col] = ((df[col] - min_val) / (max_val - min_val)).clip(0.0, 1.0)
             else:
                 df[col] = 0.0
+        return df
+
+    def rescale(self, profiles: pd.DataFrame, scaler: Dict) -> pd.DataFrame:
+        """
+        Move profiles normalized with an older scaler onto the current one
+        (inverse transform, then transform). Values clipped by the old scaler
+        stay at its bounds; columns it does not know are left as is.
+        """
+        columns = [c for c in scaler['columns'] if c in profiles.columns]
+        raw = profiles[columns].astype(np.float64)
+        for col in columns:
+            min_val, max_val = scaler['columns'][col]['min'], scaler['columns'][col]['max']
+            raw[col] = min_val + raw[col] * (max_val - min_val)
+        rescaled = profiles.copy()
+        rescaled[columns] = self.transform(raw)
+        return rescaled
+
+    def drift(self, user_features: pd.DataFrame) -> float:
+        """
+        Share of feature values outside the fitted [min, max] range
+        """
+        if self.scaler is None:
+            return 1.0
+        columns = [c for c in self.scaler['columns'] if c in user_features.columns]
+        if not columns or not len(user_features):
+            return 0.0
+        values = user_features[columns].to_numpy(dtype=np.float64)
+        mins = np.array([self.scaler['columns'][c]['min'] for c in columns])
+        maxs = np.array([self.scaler['columns'][c]['max'] for c in columns])
+        outside = (values < mins) | (values > maxs)
+        return float(outside.sum() / np.isfinite(values).sum()) if np.isfinite(values).any() else 0.0
+
+    def build_profile(self, user_features: pd.DataFrame, refit: bool = False) -> pd.DataFrame:
+        """
+        Generate profile by normalizing and structuring features.
+        Scaling parameters are fitted on the first call, and refitted only
+        when refit is set or drift exceeds drift_threshold.
+        Users already in the store but not in user_features (e.g. onboarded
+        with add_user) are kept, rescaled to the new parameters after a refit.
+        Args:
+            user_features: DataFrame with raw behavioral features
+            refit: force a new fit of the scaling parameters
+        Returns:
+            DataFrame with structured user profiles
+        """
+        if refit or self.scaler is None or self.drift(user_features) > self.drift_threshold:
+            # rescales the stored profiles
+            self.fit(user_features)
+        df = self.transform(user_features)
+        kept = self.store.to_frame()
+        kept = kept[~kept['user_id'].isin(df['user_id'])]
+        self.store = ProfileStore(pd.concat([df, kept], ignore_index=True) if len(kept) else df)
+        self.store.scaler_version = self.scaler['version']
+        if self.profiles_path:
+            self.save_profiles()
+        return df
 
-        self.profiles = df
-        return self.profiles
+    def add_user(self, user_id: int, features: Dict[str, float]) -> Dict:
+        """
+        Transform one user's raw features against the fitted parameters and
+        store the profile, without touching other users. Values outside the
+        fitted range count towards drift; needs_refit is set once they exceed
+        drift_threshold.
+        Args:
+            user_id: new or existing user
+            features: raw feature name -> value
+        Returns:
+            the stored (normalized) profile
+        """
+        if self.scaler is None:
+            raise ValueError("Scaler not fitted yet.")
+        profile = {}
+        for col, params in self.scaler['columns'].items():
+            value = features.get(col)
+            if value is None or value != value:
+                continue
+            min_val, max_val = params['min'], params['max']
+            self._streamed_values += 1
+            self._streamed_outside += value < min_val or value > max_val
+            profile[col] = min(max((value - min_val) / (max_val - min_val), 0.0), 1.0) \
+                if max_val > min_val else 0.0
+        self.store.update(user_id, profile)
+        if self._streamed_values >= self.min_drift_samples and \
+                self._streamed_outside > self.drift_threshold * self._streamed_values:
+            self.needs_refit = True
+        return self.store.get_profile(user_id)
 
     def get_profile(self, user_id: int) -> Dict:
         """
         Retrieve a specific user profile
         """
-        if self.profiles.empty:
+        if not len(self.store):
+            raise ValueError("Profiles not generated yet.")
+        return self.store.get_profile(user_id)
+
+    def get_profiles(self, user_ids: Iterable) -> pd.DataFrame:
+        """
+        Retrieve many user profiles with one vectorized lookup
+        """
+        if not len(self.store):
             raise ValueError("Profiles not generated yet.")
-        profile = self.profiles[self.profiles['user_id'] == user_id].to_dict(orient='records')
-        return profile[0] if profile else {}
+        return self.store.get_profiles(user_ids)
+
+    def update_profile(self, user_id: int, features: Dict[str, float]):
+        """
+        Update one user's (already normalized) profile features in place
+        """
+        self.store.update(user_id, features)
 
 if __name__ == "__main__":
     # Example usage
@@ -58,3 +414,8 @@ if __name__ == "__main__":
     profiles = builder.build_profile(user_features)
     print(profiles)
     print(builder.get_profile(1))
+    # onboard a user against the fitted parameters; users 1 and 2 are unchanged
+    builder.add_user(3, {'avg_session_duration': 1350, 'total_sessions': 5,
+                         'contribution_count': 1, 'avg_contribution': 150})
+    print(builder.get_profiles([3, 1, 99]))
+    print(f"scaler v{builder.scaler['version']}, needs refit: {builder.needs_refit}")
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from behavioral_analytics.behavior_feature_pipeline import BehaviorFeaturePipeline
+
+EXACT = ['user_id', 'contribution_count', 'avg_contribution', 'max_contribution', 'min_contribution']
+
+
+def _contributions(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': rng.integers(0, 50, n),
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n), unit='min'),
+        'amount': rng.lognormal(7, 2, n).round(2)
+    })
+
+
+def _sessions(n=3000, seed=1):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n) * 60 + rng.integers(0, 59, n), unit='s')
+    sessions = pd.DataFrame({
+        'user_id': rng.integers(0, 40, n),
+        'session_start': start,
+        'session_end': start + pd.to_timedelta(rng.integers(1, 10 ** 9, n), unit='us')
+    })
+    # the incremental mode watermarks sessions by their end
+    return sessions.sort_values('session_end', ignore_index=True)
+
+
+def _assert_same(got, expected, exact):
+    pd.testing.assert_frame_equal(got[exact], expected[exact], check_exact=True)
+    pd.testing.assert_frame_equal(got, expected, check_exact=False, rtol=1e-12)
+
+
+def test_contributions_batch_incremental_and_chunked_agree():
+    df = _contributions()
+    pipeline = BehaviorFeaturePipeline()
+    batch = pipeline.compute_behavior_patterns(df)
+
+    incremental = BehaviorFeaturePipeline()
+    for part in np.array_split(np.arange(len(df)), 7):
+        features = incremental.update_behavior_patterns(df.iloc[part])
+    chunked = pipeline.compute_behavior_patterns_chunked(df.iloc[i:i + 333] for i in range(0, len(df), 333))
+
+    _assert_same(features, batch, EXACT)
+    _assert_same(chunked, batch, EXACT)
+    assert incremental.metrics['late_contributions'] == 0
+
+
+def test_sessions_batch_incremental_and_chunked_agree():
+    df = _sessions()
+    pipeline = BehaviorFeaturePipeline()
+    batch = pipeline.compute_session_features(df)
+
+    incremental = BehaviorFeaturePipeline()
+    for part in np.array_split(np.arange(len(df)), 5):
+        features = incremental.update_session_features(df.iloc[part])
+    chunked = pipeline.compute_session_features_chunked(df.iloc[i:i + 250] for i in range(0, len(df), 250))
+
+    pd.testing.assert_frame_equal(features, batch, check_exact=True)
+    pd.testing.assert_frame_equal(chunked, batch, check_exact=True)
+
+
+def test_rows_at_or_before_the_watermark_are_counted():
+    df = _contributions(100)
+    pipeline = BehaviorFeaturePipeline()
+    pipeline.update_behavior_patterns(df.iloc[50:])
+    features = pipeline.update_behavior_patterns(df.iloc[:60])
+    assert pipeline.metrics['late_contributions'] == 60
+    assert features['contribution_count'].sum() == 50
+
+
+def test_state_of_another_scale_is_rejected():
+    from utils.aggregate_state import partial_aggregates
+    pipeline = BehaviorFeaturePipeline()
+    pipeline.update_behavior_patterns(_contributions(10))
+    with pytest.raises(ValueError):
+        pipeline.state['contributions'].merge(partial_aggregates(_contributions(10), 'user_id', 'amount'))
+
+
+def test_login_gaps_match_a_groupby_reference():
+    sessions = _sessions().sample(frac=1.0, random_state=2)
+    features = BehaviorFeaturePipeline().compute_login_gap_features(sessions).set_index('user_id')
+
+    ordered = sessions.sort_values(['user_id', 'session_start'])
+    gaps = (ordered['session_start'] - ordered.groupby('user_id')['session_end'].shift()) \
+        .dt.total_seconds().clip(lower=0).dropna()
+    reference = gaps.groupby(ordered['user_id']).agg(['mean', 'median', 'max'])
+    np.testing.assert_allclose(features.loc[reference.index, 'mean_login_gap'], reference['mean'])
+    np.testing.assert_allclose(features.loc[reference.index, 'median_login_gap'], reference['median'])
+    np.testing.assert_allclose(features.loc[reference.index, 'max_login_gap'], reference['max'])
+
+    days = ordered.groupby('user_id')['session_start'].agg(lambda s: s.dt.normalize().nunique())
+    np.testing.assert_allclose(features.loc[days.index, 'logins_per_day'],
+                               ordered.groupby('user_id').size() / days)
+
+
+def test_single_and_open_sessions_have_zero_gaps():
+    sessions = pd.DataFrame({
+        'user_id': ['a', 'b', 'b'],
+        'session_start': pd.to_datetime(['2024-01-01 10:00', '2024-01-01 10:00', '2024-01-01 11:00']),
+        'session_end': pd.to_datetime(['2024-01-01 10:30', None, '2024-01-01 11:30']),
+    })
+    features = BehaviorFeaturePipeline().compute_login_gap_features(sessions).set_index('user_id')
+    assert features.loc['a', 'max_login_gap'] == 0 and features.loc['a', 'login_burstiness'] == 0
+    # b's open session counts as ending when it started
+    assert features.loc['b', 'mean_login_gap'] == 3600
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from behavioral_analytics.behavior_score_model import BehaviorScoreModel
+
+
+def _profiles(n, shift=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'user_id': np.arange(n), 'sessions': rng.normal(10 + shift, 2, n),
+                         'avg_amount': rng.normal(500 + 100 * shift, 50, n)})
+
+
+def _fitted():
+    model = BehaviorScoreModel(n_jobs=1)
+    model.fit_model(_profiles(500))
+    return model
+
+
+def test_chunked_and_parallel_scores_match_one_pass():
+    model = _fitted()
+    new_users = _profiles(300, seed=1)
+    expected = model.score_batch(new_users, chunk_size=10_000)
+
+    pd.testing.assert_frame_equal(model.score_batch(new_users, chunk_size=64), expected)
+    pd.testing.assert_frame_equal(model.score_batch(new_users, chunk_size=100, n_jobs=2), expected)
+    with pytest.raises(ValueError, match='avg_amount'):
+        model.score_batch(new_users.drop(columns=['avg_amount']))
+
+
+def test_saved_artifact_scores_like_the_fitted_model(tmp_path):
+    model = _fitted()
+    path = str(tmp_path / 'behavior_model.joblib')
+    model.save(path)
+    restored = BehaviorScoreModel.load(path, n_jobs=1)
+
+    assert restored.model_version == model.model_version
+    new_users = _profiles(50, seed=2)
+    pd.testing.assert_frame_equal(restored.score_batch(new_users), model.score_batch(new_users))
+
+
+def test_refresh_replaces_only_the_oldest_trees():
+    model = _fitted()
+    trees = list(model.model.estimators_)
+    model.refresh(_profiles(300, shift=1.0, seed=3), fraction=0.25)
+
+    kept = len(trees) - len(trees) // 4
+    assert len(model.model.estimators_) == len(trees)
+    assert model.model.estimators_[:kept] == trees[-kept:]
+    assert model.model_version == 2
+    assert model.score_batch(_profiles(10))['behavior_score'].notna().all()
+
+
+def test_refresh_runs_only_on_drift():
+    model = _fitted()
+    report = model.maybe_refresh(_profiles(500, seed=4))
+    assert not report['refreshed'] and model.model_version == 1
+
+    report = model.maybe_refresh(_profiles(500, shift=3.0, seed=5))
+    assert report['refreshed'] and model.model_version == 2
+
+
+def test_refresh_refuses_a_model_of_another_sklearn_version():
+    model = _fitted()
+    model.sklearn_version = '0.0.0'
+    with pytest.raises(RuntimeError, match='fit_model'):
+        model.refresh(_profiles(100, seed=6))
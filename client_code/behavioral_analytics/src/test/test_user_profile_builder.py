@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from behavioral_analytics.user_profile_builder import ProfileStore, UserProfileBuilder
+
+
+def _features(user_ids, sessions):
+    return pd.DataFrame({'user_id': user_ids, 'total_sessions': sessions})
+
+
+def test_store_lookups_follow_appended_users():
+    store = ProfileStore(pd.DataFrame({'user_id': [1, 2], 'x': [0.1, 0.2]}))
+    store.update(3, {'x': 0.3})
+
+    np.testing.assert_array_equal(store.get_rows([3, 99, 1]), [2, -1, 0])
+    profiles = store.get_profiles(iter([3, 99]))
+    assert profiles['x'].iloc[0] == np.float32(0.3)
+    assert np.isnan(profiles['x'].iloc[1])
+
+
+def test_build_profile_keeps_users_added_since():
+    builder = UserProfileBuilder()
+    builder.build_profile(_features([1, 2], [0.0, 10.0]))
+    builder.add_user(3, {'total_sessions': 5.0})
+
+    builder.build_profile(_features([1, 2], [0.0, 10.0]))
+    assert builder.get_profile(3)['total_sessions'] == 0.5
+
+    # after a refit the kept user is moved onto the new range
+    builder.build_profile(_features([1, 2], [0.0, 20.0]), refit=True)
+    assert builder.get_profile(3)['total_sessions'] == 0.25
+    assert builder.get_profile(2)['total_sessions'] == 1.0
+
+
+def _persisted_builder(tmp_path):
+    builder = UserProfileBuilder(scaler_path=str(tmp_path / 'scaler.json'),
+                                 profiles_path=str(tmp_path / 'profiles.pkl'))
+    builder.build_profile(_features([1, 2], [0.0, 10.0]))
+    # a second process refits while these v1 profiles stay on disk
+    UserProfileBuilder(scaler_path=str(tmp_path / 'scaler.json')).fit(_features([1, 2], [0.0, 20.0]))
+
+
+def test_restart_rescales_profiles_of_an_older_scaler_version(tmp_path):
+    _persisted_builder(tmp_path)
+    restarted = UserProfileBuilder(scaler_path=str(tmp_path / 'scaler.json'),
+                                   profiles_path=str(tmp_path / 'profiles.pkl'))
+
+    assert restarted.scaler['version'] == 2
+    assert restarted.store.scaler_version == 2
+    assert restarted.get_profile(2)['total_sessions'] == 0.5
+
+
+def test_restart_refuses_profiles_without_their_scaler_version(tmp_path):
+    _persisted_builder(tmp_path)
+    (tmp_path / 'scaler.v1.json').unlink()
+    with pytest.raises(ValueError, match='v1'):
+        UserProfileBuilder(scaler_path=str(tmp_path / 'scaler.json'),
+                           profiles_path=str(tmp_path / 'profiles.pkl'))
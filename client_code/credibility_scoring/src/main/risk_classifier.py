@@ -6,7 +6,7 @@ Purpose:
     to trigger additional verification or restrict fund access.
 """
 
-from scoring_engine import CredibilityScoringEngine
+from credibility_scoring.scoring_engine import CredibilityScoringEngine
 
 class RiskClassifier:
     def __init__(self, weight_config=None):
@@ -4,25 +4,250 @@ ingestion_scheduler.py
 Purpose:
     Schedule periodic ingestion of UPI transactions and user events
     to ensure data pipelines are up-to-date.
+    Jobs can depend on each other (e.g. ingest -> features -> scoring):
+    a dependent job runs once all of its upstream jobs have completed.
+    Overlapping runs are bounded per job, missed runs are coalesced, and
+    run duration / schedule lag are tracked per job.
+
+    Every run of a job, periodic or dependency-triggered, is started by
+    _trigger as its own one-off APScheduler job and counted against the
+    job's max_instances there; the interval schedule only fires a cheap
+    tick on the 'triggers' executor. So max_instances bounds all runs of a
+    job together, not each kind separately.
 """
 
+import time
+import threading
+from collections import defaultdict
+from datetime import datetime
+
 from apscheduler.schedulers.background import BackgroundScheduler
-from upi_webhook_ingestor import UPIWebhookIngestor
-from user_event_ingestor import UserEventIngestor
+from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from data_ingestion.upi_webhook_ingestor import UPIWebhookIngestor
+from data_ingestion.user_event_ingestor import UserEventIngestor
+from data_ingestion.transaction_stream_processor import TransactionStreamProcessor
+
+RUN_ID_SEPARATOR = '#'
+# run suffix of the interval job that only triggers runs
+TICK_SUFFIX = 'tick'
+
+
+def _timed_call(func, args, kwargs):
+    """
+    Run a job and report its wall-clock window.
+    Module-level so it can be pickled for the process pool.
+    """
+    started_at = time.time()
+    func(*args, **kwargs)
+    return {'started_at': started_at, 'finished_at': time.time()}
+
+
+def _empty_metrics():
+    return {
+        'runs': 0,
+        'failures': 0,
+        'missed': 0,
+        'skipped_overlap': 0,
+        'last_duration': None,
+        'avg_duration': None,
+        'max_duration': 0.0,
+        'last_lag': None,
+        'max_lag': 0.0
+    }
+
 
 class IngestionScheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, thread_workers: int = 10, process_workers: int = 2,
+                 coalesce: bool = True, misfire_grace_time: int = 30):
+        """
+        Args:
+            thread_workers: size of the 'default' thread pool (I/O-bound jobs)
+            process_workers: size of the 'processpool' executor (CPU-bound jobs;
+                             job functions and arguments must be picklable)
+            coalesce: collapse a backlog of missed runs into a single run
+            misfire_grace_time: seconds a late run may still start
+        """
+        self.scheduler = BackgroundScheduler(
+            executors={
+                'default': ThreadPoolExecutor(thread_workers),
+                'processpool': ProcessPoolExecutor(process_workers),
+                # interval ticks only call _trigger; kept off the job pools so they are never starved
+                'triggers': ThreadPoolExecutor(1)
+            },
+            job_defaults={'coalesce': coalesce, 'max_instances': 1, 'misfire_grace_time': misfire_grace_time}
+        )
+        self.scheduler.add_listener(
+            self._on_job_event,
+            EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+        )
+        self.jobs = {}
+        self.downstream = defaultdict(list)
+        self.metrics = defaultdict(_empty_metrics)
+        self._lock = threading.Lock()
+        self._upstream_done = defaultdict(set)
+        self._running = defaultdict(int)
+        self._rerun_pending = set()
+        self._run_counter = 0
+        self._submit_lock = threading.Lock()
+        self._stopping = False
+
+    def add_job(self, name: str, func, interval_seconds: int = None, depends_on=(),
+                args=(), kwargs=None, executor: str = 'default', max_instances: int = 1):
+        """
+        Register a job
+        Args:
+            name: unique job name (registering a name twice raises ValueError;
+                  schedule_ingestion picks a free name instead)
+            func: callable to run
+            interval_seconds: run periodically; omit for purely dependency-triggered jobs
+            depends_on: names of upstream jobs that must complete before this one runs
+            executor: 'default' (threads) or 'processpool'
+            max_instances: maximum concurrent runs of this job, periodic and triggered together
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job already registered: {name}")
+        missing = [dep for dep in depends_on if dep not in self.jobs]
+        if missing:
+            # upstream jobs must exist first, which also rules out cycles
+            raise ValueError(f"Unknown upstream jobs for {name}: {missing}")
+        if interval_seconds is None and not depends_on:
+            raise ValueError(f"Job {name} needs an interval or upstream dependencies")
+
+        self.jobs[name] = {
+            'func': func,
+            'args': tuple(args),
+            'kwargs': kwargs or {},
+            'depends_on': set(depends_on),
+            'executor': executor,
+            'max_instances': max_instances
+        }
+        for dep in depends_on:
+            self.downstream[dep].append(name)
+
+        if interval_seconds is not None:
+            self.scheduler.add_job(
+                self._trigger, 'interval', seconds=interval_seconds, id=f"{name}{RUN_ID_SEPARATOR}{TICK_SUFFIX}",
+                args=(name, False), executor='triggers', max_instances=1
+            )
+        print(f"Job {name} registered" +
+              (f" every {interval_seconds} seconds" if interval_seconds else "") +
+              (f" after {sorted(depends_on)}" if depends_on else ""))
 
     def schedule_ingestion(self, interval_seconds: int, function, *args, **kwargs):
-        self.scheduler.add_job(function, 'interval', seconds=interval_seconds, args=args, kwargs=kwargs)
+        """
+        Run function(*args, **kwargs) periodically. As before job names existed,
+        the same function may be scheduled several times (e.g. with other args):
+        later registrations are named <function>_2, <function>_3, ...
+        """
+        name, k = function.__name__, 1
+        while name in self.jobs:
+            k += 1
+            name = f"{function.__name__}_{k}"
+        self.add_job(name, function, interval_seconds=interval_seconds, args=args, kwargs=kwargs)
+        return name
+
+    def _trigger(self, name: str, rerun_if_busy: bool = True):
+        """
+        Start a run of a job now, respecting its max_instances.
+        A dependency trigger arriving while the job is saturated is coalesced
+        into one rerun; a periodic tick is skipped, like a missed interval run.
+        """
+        spec = self.jobs[name]
+        with self._lock:
+            if self._running[name] >= spec['max_instances']:
+                if rerun_if_busy:
+                    self._rerun_pending.add(name)
+                self.metrics[name]['skipped_overlap'] += 1
+                return
+            self._running[name] += 1
+            self._run_counter += 1
+            run_id = f"{name}{RUN_ID_SEPARATOR}{self._run_counter}"
+        with self._submit_lock:
+            # a run finishing during shutdown() must not block on the stopped scheduler
+            if self._stopping:
+                return
+            self.scheduler.add_job(
+                _timed_call, 'date', run_date=datetime.now(), id=run_id,
+                args=(spec['func'], spec['args'], spec['kwargs']), executor=spec['executor'],
+                misfire_grace_time=None
+            )
+
+    def _on_job_event(self, event):
+        name, _, run_suffix = event.job_id.partition(RUN_ID_SEPARATOR)
+        if run_suffix == TICK_SUFFIX:
+            if event.code == EVENT_JOB_MISSED:
+                with self._lock:
+                    self.metrics[name]['missed'] += 1
+            elif event.code == EVENT_JOB_ERROR:
+                print(f"Job {name} could not be triggered: {event.exception}")
+            return
+
+        if event.code in (EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES):
+            with self._lock:
+                key = 'missed' if event.code == EVENT_JOB_MISSED else 'skipped_overlap'
+                self.metrics[name][key] += 1
+                self._running[name] -= 1
+            return
+
+        ready, rerun = [], False
+        with self._lock:
+            m = self.metrics[name]
+            self._running[name] -= 1
+            if name in self._rerun_pending:
+                self._rerun_pending.discard(name)
+                rerun = True
+
+            if event.code == EVENT_JOB_ERROR:
+                m['failures'] += 1
+                print(f"Job {name} failed: {event.exception}")
+            else:
+                timing = event.retval
+                duration = timing['finished_at'] - timing['started_at']
+                lag = max(0.0, timing['started_at'] - event.scheduled_run_time.timestamp())
+                m['runs'] += 1
+                m['last_duration'] = duration
+                m['avg_duration'] = duration if m['avg_duration'] is None else \
+                    m['avg_duration'] + (duration - m['avg_duration']) / m['runs']
+                m['max_duration'] = max(m['max_duration'], duration)
+                m['last_lag'] = lag
+                m['max_lag'] = max(m['max_lag'], lag)
+
+                for child in self.downstream[name]:
+                    done = self._upstream_done[child]
+                    done.add(name)
+                    if done >= self.jobs[child]['depends_on']:
+                        done.clear()
+                        ready.append(child)
+
+        for child in ready:
+            self._trigger(child)
+        if rerun:
+            self._trigger(name)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {name: dict(m) for name, m in self.metrics.items()}
+
+    def start(self):
         self.scheduler.start()
-        print(f"Ingestion job scheduled every {interval_seconds} seconds for {function.__name__}")
+
+    def shutdown(self, wait: bool = True):
+        with self._submit_lock:
+            self._stopping = True
+        self.scheduler.shutdown(wait=wait)
 
 if __name__ == "__main__":
-    upi_ingestor = UPIWebhookIngestor('transactions.csv')
-    user_ingestor = UserEventIngestor('user_events.csv')
+    upi_ingestor = UPIWebhookIngestor('transactions_log')
+    user_ingestor = UserEventIngestor('user_events')
+    processor = TransactionStreamProcessor('transactions_log', 'transactions_log/processor.ckpt', 'transaction_scores.csv')
 
     scheduler = IngestionScheduler()
-    scheduler.schedule_ingestion(30, upi_ingestor.ingest_webhook, {'txn_id':'TXN999','user_id':102,'fund_id':202,'amount':300,'status':'SUCCESS'})
+    scheduler.add_job('ingest_upi', upi_ingestor.ingest_webhook, interval_seconds=30,
+                      args=({'txn_id':'TXN999','user_id':102,'fund_id':202,'amount':300,'status':'SUCCESS'},))
+    scheduler.add_job('score_transactions', processor.process_transactions, depends_on=['ingest_upi'])
+    # API workers in shared mode ([ANOMALY] SHARED_STATE_DIR) read the versions published here
+    scheduler.add_job('publish_model_state', processor.publish_model_state, depends_on=['score_transactions'],
+                      args=('anomaly_shared_state',))
     scheduler.schedule_ingestion(60, user_ingestor.ingest_event, 102, 'login', {'ip':'10.0.0.1'})
+    scheduler.start()
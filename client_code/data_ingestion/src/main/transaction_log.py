@@ -0,0 +1,397 @@
+"""
+transaction_log.py
+------------------
+Purpose:
+    Append-only, segmented storage for ingested transactions.
+    Records are appended to rolling segment files with group commit
+    (fsync every N records or every T milliseconds), so the cost of
+    storing one webhook does not depend on how much history exists.
+    A background flusher enforces the T ms bound when appends stop.
+
+    Record format (one per line):
+        <crc32 as 8 hex chars>\t<json payload>\n
+
+    On startup the active (last) segment is scanned and truncated at the
+    first torn or corrupt record, which makes recovery after a crash safe.
+
+    Several writer processes (e.g. API workers) may share one log directory:
+    append, roll and recovery run under an fcntl.flock on <log_dir>/LOCK,
+    and every write is flushed to the OS before the lock is released, so
+    records never interleave and a torn tail can only come from a crash.
+"""
+
+import os
+import json
+import time
+import zlib
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+SEGMENT_SUFFIX = '.log'
+LOCK_FILE = 'LOCK'
+
+# (segment index, byte offset inside that segment)
+LogPosition = Tuple[int, int]
+
+
+def _encode_record(record: Dict) -> bytes:
+    body = json.dumps(record, default=str, separators=(',', ':')).encode('utf-8')
+    return b'%08x\t%s\n' % (zlib.crc32(body), body)
+
+
+def _decode_line(line: bytes) -> Optional[Dict]:
+    """
+    Decode one log line. Returns None if the line is torn or corrupt.
+    """
+    if not line.endswith(b'\n') or len(line) < 10 or line[8:9] != b'\t':
+        return None
+    body = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(body):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class SegmentedTransactionLog:
+    def __init__(self, log_dir: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 sync_every_n: int = 100, sync_interval_ms: int = 50, read_only: bool = False):
+        """
+        Args:
+            log_dir: directory holding the segment files
+            max_segment_bytes: roll over to a new segment after this size
+            sync_every_n: fsync after this many unsynced records
+            sync_interval_ms: fsync when the oldest unsynced record is older than this
+            read_only: open for reading only (e.g. from a consumer process);
+                       skips recovery, which belongs to the writer
+        """
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.sync_every_n = sync_every_n
+        self.sync_interval_ms = sync_interval_ms
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._first_pending_at = None
+        self._closed = threading.Event()
+        self._flusher = None
+        self._lock_fd = None
+
+        os.makedirs(log_dir, exist_ok=True)
+        if not read_only:
+            self._lock_fd = os.open(os.path.join(log_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            with self._exclusive():
+                self._recover()
+            if sync_interval_ms > 0:
+                self._flusher = threading.Thread(target=self._flush_idle, daemon=True)
+                self._flusher.start()
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Thread lock plus the cross-process file lock of the log directory
+        """
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ---------- segment helpers ----------
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.log_dir, f"{index:010d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[int]:
+        """
+        Sorted indices of all segment files on disk
+        """
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.log_dir)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _fsync_dir(self):
+        fd = os.open(self.log_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _open_segment(self, index: int):
+        self._segment_index = index
+        self._file = open(self._segment_path(index), 'ab')
+        self._segment_size = self._file.tell()
+        self._fsync_dir()
+
+    def _recover(self):
+        """
+        Truncate the active segment after its last valid record.
+        Sealed segments were fsynced before rolling and are trusted as-is.
+        """
+        segments = self.segments()
+        if not segments:
+            self._open_segment(0)
+            return
+
+        active = segments[-1]
+        path = self._segment_path(active)
+        valid_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if _decode_line(line) is None:
+                    break
+                valid_bytes += len(line)
+
+        if valid_bytes < os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+            print(f"Recovered transaction log: truncated segment {active} to {valid_bytes} bytes")
+        self._open_segment(active)
+
+    # ---------- writes ----------
+    def _follow_tail_locked(self):
+        """
+        Pick up segment rolls and appends made by other processes
+        """
+        if os.path.exists(self._segment_path(self._segment_index + 1)):
+            self._sync_locked()
+            self._file.close()
+            self._open_segment(self.segments()[-1])
+        else:
+            self._segment_size = os.fstat(self._file.fileno()).st_size
+
+    def _roll(self):
+        # fsync even with nothing pending here: other writers may have left unsynced
+        # records in this segment, and sealed segments are trusted by _recover
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._first_pending_at = None
+        self._file.close()
+        self._open_segment(self._segment_index + 1)
+
+    def _sync_locked(self):
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self._first_pending_at = None
+
+    def _maybe_sync_locked(self):
+        if self._pending >= self.sync_every_n:
+            self._sync_locked()
+        elif (self._first_pending_at is not None and
+              (time.monotonic() - self._first_pending_at) * 1000 >= self.sync_interval_ms):
+            self._sync_locked()
+
+    def _flush_idle(self):
+        # append() only checks the interval when the next record arrives;
+        # this loop commits the tail when traffic stops
+        while not self._closed.wait(self.sync_interval_ms / 1000):
+            with self._lock:
+                if self._file is not None:
+                    self._maybe_sync_locked()
+
+    def _write_locked(self, data: bytes) -> LogPosition:
+        if self._segment_size and self._segment_size + len(data) > self.max_segment_bytes:
+            self._roll()
+        position = (self._segment_index, self._segment_size)
+        self._file.write(data)
+        self._segment_size += len(data)
+        if self._pending == 0:
+            self._first_pending_at = time.monotonic()
+        self._pending += 1
+        return position
+
+    def append(self, record: Dict) -> LogPosition:
+        """
+        Append a single record. Durable once the next group commit runs.
+        Returns:
+            position of the record in the log
+        """
+        data = _encode_record(record)
+        with self._exclusive():
+            self._follow_tail_locked()
+            position = self._write_locked(data)
+            # visible to the other writers before the file lock is released
+            self._file.flush()
+            self._maybe_sync_locked()
+        return position
+
+    def append_many(self, records: List[Dict], sync: bool = True) -> List[LogPosition]:
+        """
+        Append a batch of records, optionally committing them with a single fsync
+        """
+        encoded = [_encode_record(r) for r in records]
+        with self._exclusive():
+            self._follow_tail_locked()
+            positions = [self._write_locked(data) for data in encoded]
+            self._file.flush()
+            if sync:
+                self._sync_locked()
+            else:
+                self._maybe_sync_locked()
+        return positions
+
+    def sync(self):
+        """
+        Force a group commit of all pending records
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def commit(self) -> LogPosition:
+        """
+        Make every record written so far durable, including records other
+        writer processes have not fsynced yet
+        Returns:
+            position up to which the log is on disk
+        """
+        with self._exclusive():
+            self._follow_tail_locked()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self._first_pending_at = None
+            return (self._segment_index, self._segment_size)
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def drain(self, consume) -> int:
+        """
+        Hand every stored record to consume(records), then discard them.
+        Runs under the file lock; other writers move on to the fresh segment
+        that replaces the drained ones. Used for small side logs (e.g. the
+        webhook spill log), not for the main transaction log.
+        Returns:
+            number of records drained
+        """
+        with self._exclusive():
+            self._follow_tail_locked()
+            self._sync_locked()
+            old_segments = self.segments()
+            records = []
+            for index in old_segments:
+                with open(self._segment_path(index), 'rb') as f:
+                    for line in f:
+                        record = _decode_line(line)
+                        if record is None:
+                            break
+                        records.append(record)
+            if records:
+                consume(records)
+            self._file.close()
+            self._open_segment(old_segments[-1] + 1)
+            for index in old_segments:
+                os.remove(self._segment_path(index))
+            self._fsync_dir()
+        return len(records)
+
+    # ---------- reads ----------
+    def end_position(self) -> LogPosition:
+        """
+        Position just after the last written record (by any writer process)
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        segments = self.segments()
+        if not segments:
+            return (0, 0)
+        return (segments[-1], os.path.getsize(self._segment_path(segments[-1])))
+
+    def bytes_after(self, position: LogPosition) -> int:
+        """
+        Number of log bytes written after a position, i.e. consumer lag
+        """
+        segment, offset = position
+        total = 0
+        for index in self.segments():
+            if index >= segment:
+                size = os.path.getsize(self._segment_path(index))
+                total += size - offset if index == segment else size
+        return max(total, 0)
+
+    def read_from(self, position: LogPosition = (0, 0),
+                  max_records: int = None) -> Tuple[List[Dict], LogPosition]:
+        """
+        Read committed records starting at a position
+        Args:
+            position: (segment, offset) to start reading from
+            max_records: optional limit on the number of records returned
+        Returns:
+            (records, position to continue reading from)
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+        records = []
+        segment, offset = position
+        for index in self.segments():
+            if index < segment:
+                continue
+            if index > segment:
+                segment, offset = index, 0
+            with open(self._segment_path(index), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    record = _decode_line(line)
+                    if record is None:
+                        # torn tail still being written, stop here
+                        return records, (segment, offset)
+                    records.append(record)
+                    offset += len(line)
+                    if max_records is not None and len(records) >= max_records:
+                        return records, (segment, offset)
+        return records, (segment, offset)
+
+    def iter_records(self) -> Iterator[Dict]:
+        position = (0, 0)
+        while True:
+            records, position = self.read_from(position, max_records=10000)
+            if not records:
+                return
+            yield from records
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Materialize the whole log, e.g. for offline analysis or backfills
+        """
+        return pd.DataFrame(list(self.iter_records()))
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = SegmentedTransactionLog(tmp, max_segment_bytes=4096, sync_every_n=50)
+        start = time.perf_counter()
+        for i in range(20000):
+            log.append({'txn_id': f'TXN{i}', 'user_id': 101, 'fund_id': 201, 'amount': 500, 'status': 'SUCCESS'})
+        log.close()
+        elapsed = time.perf_counter() - start
+        print(f"Appended 20000 records in {elapsed:.2f}s across {len(log.segments())} segments")
+        print(SegmentedTransactionLog(tmp).to_dataframe().tail())
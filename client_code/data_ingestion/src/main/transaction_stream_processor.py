@@ -4,28 +4,283 @@ transaction_stream_processor.py
 Purpose:
     Continuously process ingested transactions for feature extraction,
     anomaly detection, and scoring.
+    Reads the append-only transaction log from a durable checkpoint,
+    processes only records that arrived since the last run and appends
+    their scores to a sink, so cost scales with new data, not history.
+
+    Each transaction is scored against persistent per-user / per-channel
+    running statistics (AnomalyDetector.score_online), so a score does not
+    depend on how the stream happens to be cut into batches.
+
+    Checkpointing is O(users) (the statistics and the amount quantile
+    sketches are rewritten), so it runs every checkpoint_every_n batches,
+    after checkpoint_interval_seconds, and whenever the processor catches
+    up. The offset is advanced in memory after every batch but persisted
+    only together with the state snapshot, so the saved statistics always
+    match the saved log position and a restart replays exactly the batches
+    they do not contain.
+
+    Timestamps are parsed as ISO 8601 in UTC (the ingestor normalizes
+    them); the watermark and the event-time lag are UTC. A batch that still
+    cannot be scored is appended to a dead-letter file and skipped, so one
+    bad record cannot stall the checkpoint.
+
+    publish_model_state exports the same statistics as a shared, read-only
+    version for the API workers (see anomaly_detection/shared_model_state.py).
+
+    Delivery is at-least-once: the sink is written after every batch, so a
+    crash re-scores (and re-appends) the batches since the last checkpoint.
 """
 
+import os
+import json
+import time
+import threading
+import numpy as np
 import pandas as pd
 from anomaly_detection.feature_extractor import FeatureExtractor
 from anomaly_detection.anomaly_detector import AnomalyDetector
+from anomaly_detection.shared_model_state import export_model_state
+
+from data_ingestion.transaction_log import SegmentedTransactionLog
+from utils.helpers import parse_utc_timestamps
+from utils.logger import get_logger
+
+logger = get_logger("TransactionStreamProcessor")
+
+SCORE_COLUMNS = ['txn_id', 'user_id', 'fund_id', 'anomaly_score', 'is_anomaly']
+
+
+def _utc(timestamp) -> pd.Timestamp:
+    # watermarks of older checkpoints are naive; they were written as UTC
+    ts = pd.Timestamp(timestamp)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
 
 class TransactionStreamProcessor:
-    def __init__(self, txn_path: str):
-        self.txn_path = txn_path
-        self.txn_df = pd.read_csv(txn_path)
-        self.feature_extractor = FeatureExtractor()
+    def __init__(self, log_dir: str, checkpoint_path: str, sink_path: str, batch_size: int = 10000,
+                 state_path: str = None, sketch_path: str = None, dead_letter_path: str = None,
+                 checkpoint_every_n: int = 10, checkpoint_interval_seconds: float = 30.0):
+        """
+        Args:
+            log_dir: transaction log written by UPIWebhookIngestor
+            checkpoint_path: JSON file holding the consumer offset and watermark
+            sink_path: append-only CSV receiving the scores
+            batch_size: maximum records processed per batch
+            state_path: npz snapshot of the online anomaly statistics
+                        (default: next to the checkpoint)
+            sketch_path: JSON file of the amount quantile sketches
+                         (default: next to the checkpoint)
+            dead_letter_path: JSON-lines file receiving records of batches that fail
+                              to score (default: next to the checkpoint)
+            checkpoint_every_n: persist state and offset after this many batches
+            checkpoint_interval_seconds: ... or once this much time has passed since the last save
+        """
+        self.log = SegmentedTransactionLog(log_dir, read_only=True)
+        self.checkpoint_path = checkpoint_path
+        self.sink_path = sink_path
+        self.batch_size = batch_size
+        self.state_path = state_path or checkpoint_path + '.anomaly.npz'
+        self.sketch_path = sketch_path or checkpoint_path + '.sketches.json'
+        self.dead_letter_path = dead_letter_path or checkpoint_path + '.deadletter.jsonl'
+        self.checkpoint_every_n = checkpoint_every_n
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.feature_extractor = FeatureExtractor(sketch_path=self.sketch_path)
         self.anomaly_detector = AnomalyDetector()
+        if os.path.exists(self.state_path):
+            self.anomaly_detector.load_online_state(self.state_path)
+        # scoring mutates the statistics that publish_model_state reads
+        self._state_lock = threading.Lock()
+        self.checkpoint = self._load_checkpoint()
+        # batches processed since the checkpoint file was last written
+        self._unsaved_batches = 0
+        self._last_save = time.monotonic()
+        self.metrics = {
+            'records_processed': 0,
+            'batches': 0,
+            'last_batch_records': 0,
+            'last_batch_seconds': 0.0,
+            'throughput_rps': 0.0,
+            'lag_bytes': 0,
+            'event_time_lag_seconds': None,
+            'dead_letter_batches': 0,
+            'dead_letter_records': 0,
+            'checkpoints': 0
+        }
+
+    # ---------- checkpoint ----------
+    def _load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'segment': 0, 'offset': 0, 'watermark': None, 'records_processed': 0}
+
+    def _save_checkpoint(self):
+        # write-then-rename so a crash never leaves a half-written checkpoint
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def save_checkpoint(self):
+        """
+        Persist the state snapshot and then the offset it corresponds to
+        """
+        with self._state_lock:
+            self._save_state()
+        self._save_checkpoint()
+        self._unsaved_batches = 0
+        self._last_save = time.monotonic()
+        self.metrics['checkpoints'] += 1
+
+    def _maybe_save_checkpoint(self):
+        if (self._unsaved_batches >= self.checkpoint_every_n or
+                time.monotonic() - self._last_save >= self.checkpoint_interval_seconds):
+            self.save_checkpoint()
+
+    @property
+    def position(self):
+        return (self.checkpoint['segment'], self.checkpoint['offset'])
 
-    def process_transactions(self):
+    # ---------- processing ----------
+    def score_batch(self, txn_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compute features and anomaly scores for a batch of transactions
+        """
+        txn_df['amount'] = pd.to_numeric(txn_df['amount'], errors='coerce')
+        # parse before any state is touched: a bad timestamp fails the batch cleanly
+        txn_df['timestamp'] = parse_utc_timestamps(txn_df['timestamp'])
+        features = self.feature_extractor.basic_transaction_features(txn_df, update_sketches=True)
+        channels = features['channel'] if 'channel' in features.columns else [None] * len(features)
+        scores = np.full(len(features), np.nan)
+        flags = np.zeros(len(features), dtype=bool)
+        # log order: each transaction is scored against everything before it, then folded in
+        for i, (user_id, amount, channel) in enumerate(zip(features['user_id'], features['amount'], channels)):
+            if pd.isna(amount) or user_id is None:
+                continue
+            result = self.anomaly_detector.score_online(user_id, amount, channel if pd.notna(channel) else None)
+            scores[i] = result['anomaly_score']
+            flags[i] = result['is_anomaly']
+        features['anomaly_score'] = scores
+        features['is_anomaly'] = flags
+        return features.reindex(columns=SCORE_COLUMNS)
+
+    def _save_state(self):
+        self.anomaly_detector.save_online_state(self.state_path)
+        self.feature_extractor.save_sketches(self.sketch_path)
+
+    def _write_dead_letter(self, records: list, error: Exception):
+        with open(self.dead_letter_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps({'error': str(error), 'record': record}, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.metrics['dead_letter_batches'] += 1
+        self.metrics['dead_letter_records'] += len(records)
+
+    def _write_sink(self, scores: pd.DataFrame):
+        write_header = not os.path.exists(self.sink_path)
+        with open(self.sink_path, 'a', newline='') as f:
+            scores.to_csv(f, header=write_header, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def process_batch(self) -> pd.DataFrame:
+        """
+        Process at most batch_size records after the checkpoint
+        Returns:
+            scores of the processed records (empty when caught up or dead-lettered)
+        """
+        return self._process_next()[0]
+
+    def _process_next(self):
+        start = time.perf_counter()
+        records, next_position = self.log.read_from(self.position, max_records=self.batch_size)
+        if not records:
+            # caught up: persist what is still only in memory
+            if self._unsaved_batches:
+                self.save_checkpoint()
+            self._update_lag()
+            return pd.DataFrame(columns=SCORE_COLUMNS), 0
+
+        txn_df = pd.DataFrame(records)
+        try:
+            with self._state_lock:
+                scores = self.score_batch(txn_df)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Dead-lettering {len(records)} records at {self.position}: {e}")
+            self._write_dead_letter(records, e)
+            scores = pd.DataFrame(columns=SCORE_COLUMNS)
+        else:
+            self._write_sink(scores)
+
+        batch_max_ts = parse_utc_timestamps(txn_df['timestamp'], errors='coerce').max()
+        watermark = self.checkpoint['watermark']
+        if pd.notna(batch_max_ts):
+            batch_max_ts = batch_max_ts.tz_localize('UTC')
+            if watermark is None or batch_max_ts > _utc(watermark):
+                watermark = batch_max_ts.isoformat()
+        self.checkpoint = {
+            'segment': next_position[0],
+            'offset': next_position[1],
+            'watermark': watermark,
+            'records_processed': self.checkpoint['records_processed'] + len(records)
+        }
+        self._unsaved_batches += 1
+        self._maybe_save_checkpoint()
+
+        elapsed = time.perf_counter() - start
+        self.metrics['records_processed'] += len(records)
+        self.metrics['batches'] += 1
+        self.metrics['last_batch_records'] = len(records)
+        self.metrics['last_batch_seconds'] = elapsed
+        self.metrics['throughput_rps'] = len(records) / elapsed if elapsed > 0 else 0.0
+        self._update_lag()
+        return scores, len(records)
+
+    def publish_model_state(self, root: str, keep_versions: int = 3) -> str:
+        """
+        Publish the online statistics as a new shared-state version for the
+        API workers; run it as a job downstream of process_transactions
+        Returns:
+            name of the published version
+        """
+        with self._state_lock:
+            return export_model_state(root, self.anomaly_detector, keep_versions=keep_versions)
+
+    def _update_lag(self):
+        self.metrics['lag_bytes'] = self.log.bytes_after(self.position)
+        watermark = self.checkpoint['watermark']
+        if watermark is not None:
+            self.metrics['event_time_lag_seconds'] = (pd.Timestamp.now(tz='UTC') - _utc(watermark)).total_seconds()
+
+    def process_transactions(self) -> pd.DataFrame:
         """
         Compute features and anomaly scores for all new transactions
         """
-        features = self.feature_extractor.extract_features(self.txn_df)
-        self.txn_df['anomaly_score'] = self.anomaly_detector.compute_scores(features)
-        self.txn_df.to_csv(self.txn_path, index=False)
-        return self.txn_df[['txn_id','user_id','fund_id','anomaly_score']]
+        batches = []
+        while True:
+            scores, num_records = self._process_next()
+            if not num_records:
+                break
+            if not scores.empty:
+                batches.append(scores)
+        if not batches:
+            return pd.DataFrame(columns=SCORE_COLUMNS)
+        return pd.concat(batches, ignore_index=True)
+
+    def run(self, poll_interval_seconds: float = 1.0):
+        """
+        Tail the log forever, processing new transactions as they arrive
+        """
+        while True:
+            if not self._process_next()[1]:
+                time.sleep(poll_interval_seconds)
 
 if __name__ == "__main__":
-    processor = TransactionStreamProcessor('transactions.csv')
+    processor = TransactionStreamProcessor('transactions_log', 'transactions_log/processor.ckpt', 'transaction_scores.csv')
     print(processor.process_transactions())
+    print(processor.metrics)
@@ -0,0 +1,465 @@
+"""
+txn_dedup_index.py
+------------------
+Purpose:
+    Idempotency index for webhook replays. Payment providers retry
+    webhooks, so every txn_id is checked here before it is stored.
+
+    - Exact membership lives in an in-memory hash set, persisted as an
+      append-only file with one txn_id per line.
+    - An optional Bloom filter sits in front of the set. Its bitmap is
+      snapshotted on close, so on startup only the snapshot (plus the tail
+      of the id file written after it) is loaded before serving. The exact
+      set is then loaded in a background thread; Bloom negatives never
+      need it, Bloom positives wait until it is ready.
+    - API workers share the id file. exclusive() holds an fcntl.flock on
+      it and first reads the ids other processes appended, so a check and
+      the store that follows it are atomic across workers.
+    - On open, a torn last line (crash mid-write) is truncated away.
+    - follow_log() makes a SegmentedTransactionLog the durable record of
+      seen ids: ids are then kept in memory on add, read back from log
+      records other workers appended, and written to the id file only by
+      checkpoint() for log records already fsynced. On startup the log is
+      replayed from the position the id file covers (<index>.logpos), so
+      ids lost with an unsynced index tail are recovered from the log, and
+      the id file never holds an id whose record a crash could still lose.
+    - txn_ids must be non-empty str without line breaks (ValueError otherwise).
+"""
+
+import os
+import json
+import math
+import time
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List
+
+import numpy as np
+
+_UINT64_MASK = (1 << 64) - 1
+# log records read per step while following the transaction log
+LOG_READ_RECORDS = 10000
+
+
+def check_txn_id(txn_id) -> str:
+    """
+    Validate a txn_id for the index: one line of the id file per id
+    """
+    if not isinstance(txn_id, str) or not txn_id or '\n' in txn_id:
+        raise ValueError(f"txn_id must be a non-empty str without line breaks, got {txn_id!r}")
+    return txn_id
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Args:
+            capacity: expected number of distinct keys
+            error_rate: target false positive rate at capacity
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @staticmethod
+    def _digests(keys: List[str]) -> np.ndarray:
+        raw = b''.join(hashlib.blake2b(k.encode('utf-8'), digest_size=16).digest() for k in keys)
+        return np.frombuffer(raw, dtype=np.uint64).reshape(-1, 2)
+
+    def _positions(self, keys: List[str]) -> np.ndarray:
+        # double hashing: h1 + i*h2 for i in [0, k)
+        digests = self._digests(keys)
+        h1 = digests[:, :1]
+        h2 = digests[:, 1:] | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1 + steps * h2) % np.uint64(self.num_bits)
+
+    def add_many(self, keys: List[str]):
+        if not keys:
+            return
+        pos = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3),
+                         np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    def add(self, key: str):
+        self.add_many([key])
+
+    def __contains__(self, key: str) -> bool:
+        # scalar path in plain Python: numpy call overhead dominates for one key
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        bits = memoryview(self.bits)
+        for i in range(self.num_hashes):
+            pos = ((h1 + i * h2) & _UINT64_MASK) % self.num_bits
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, path: str, covered_bytes: int):
+        """
+        Snapshot the bitmap. covered_bytes records how much of the id file it reflects.
+        """
+        header = np.array([self.capacity, self.num_bits, self.num_hashes, covered_bytes], dtype=np.int64)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, header)
+            np.save(f, self.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, error_rate: float = 0.001):
+        """
+        Returns:
+            (BloomFilter, covered_bytes)
+        """
+        with open(path, 'rb') as f:
+            capacity, num_bits, num_hashes, covered_bytes = np.load(f).tolist()
+            bits = np.load(f)
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.error_rate = error_rate
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.bits = bits
+        return bloom, covered_bytes
+
+
+class TxnDedupIndex:
+    def __init__(self, index_path: str, bloom_capacity: int = None, error_rate: float = 0.001,
+                 sync_every_n: int = 100):
+        """
+        Args:
+            index_path: file with one seen txn_id per line
+            bloom_capacity: enable the Bloom filter front sized for this many ids
+            error_rate: Bloom filter false positive rate
+            sync_every_n: fsync the id file after this many new ids
+        """
+        self.index_path = index_path
+        self.bloom_path = index_path + '.bloom.npy'
+        self.log_pos_path = index_path + '.logpos'
+        self.sync_every_n = sync_every_n
+        self._lock = threading.Lock()
+        self._process_lock = threading.RLock()
+        self._lock_depth = 0
+        self._ready = threading.Event()
+        self._seen = set()
+        self._pending = 0
+        self._log = None
+        self._log_read_pos = (0, 0)
+
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._file = open(index_path, 'a', encoding='utf-8')
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            file_size = self._truncate_torn_tail()
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        # bytes of the id file reflected in memory (ours and other processes')
+        self._read_pos = file_size
+
+        self.bloom = None
+        if bloom_capacity:
+            self._init_bloom(bloom_capacity, error_rate, file_size)
+            threading.Thread(target=self._load_exact, args=(file_size,), daemon=True).start()
+        else:
+            self._load_exact(file_size)
+
+    def _truncate_torn_tail(self) -> int:
+        """
+        Cut the id file back to its last complete line. Writers flush whole
+        lines under the file lock, so a partial line is a crash leftover.
+        """
+        size = os.fstat(self._file.fileno()).st_size
+        if not size:
+            return 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if b'\n' not in tail and len(tail) < size:
+                # leftover longer than the window: search the whole file
+                f.seek(0)
+                tail = f.read()
+        end = size - len(tail) + tail.rfind(b'\n') + 1
+        if end < size:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.seek(0, os.SEEK_END)
+        return end
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Hold the cross-process lock of the id file, with the ids other
+        workers appended already loaded. Re-entrant within a process.
+        """
+        with self._process_lock:
+            if self._lock_depth == 0:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._catch_up()
+                except BaseException:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                    raise
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size > self._read_pos:
+            ids = self._read_ids(self._read_pos, size)
+            with self._lock:
+                self._seen.update(ids)
+                if self.bloom is not None:
+                    self.bloom.add_many(ids)
+                self._read_pos = size
+        if self._log is not None:
+            self._catch_up_log()
+
+    def _catch_up_log(self):
+        while True:
+            records, position = self._log.read_from(self._log_read_pos, max_records=LOG_READ_RECORDS)
+            ids = [str(r['txn_id']) for r in records if r.get('txn_id') is not None]
+            with self._lock:
+                self._seen.update(ids)
+                if self.bloom is not None:
+                    self.bloom.add_many(ids)
+            self._log_read_pos = position
+            if len(records) < LOG_READ_RECORDS:
+                return
+
+    # ---------- log-backed mode ----------
+    def _read_log_pos(self):
+        try:
+            with open(self.log_pos_path, 'r') as f:
+                return tuple(json.load(f))
+        except FileNotFoundError:
+            return (0, 0)
+
+    def follow_log(self, log):
+        """
+        Back the index by a transaction log whose records carry 'txn_id'.
+        Every append to that log must happen under exclusive(). The log is
+        replayed from the position the id file covers, which restores ids
+        whose index entries were lost in a crash.
+        """
+        self._log = log
+        self._log_read_pos = self._read_log_pos()
+        with self.exclusive():
+            pass
+
+    def _checkpoint_locked(self):
+        # copy ids of fsynced log records into the id file; caller holds exclusive()
+        position = self._read_log_pos()
+        end = self._log.commit()
+        ids = []
+        while position < end:
+            records, position = self._log.read_from(position, max_records=LOG_READ_RECORDS)
+            if not records:
+                break
+            ids.extend(str(r['txn_id']) for r in records if r.get('txn_id') is not None)
+        ids = [t for t in ids if t and '\n' not in t]
+        with self._lock:
+            if ids:
+                self._file.write('\n'.join(ids) + '\n')
+                self._file.flush()
+                self._read_pos = self._file.tell()
+            self._sync_locked()
+        tmp_path = self.log_pos_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(list(position), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_pos_path)
+
+    def checkpoint(self):
+        """
+        Log-backed mode: commit the log and persist the ids of its records,
+        so the next startup replays less of the log
+        """
+        with self.exclusive():
+            self._checkpoint_locked()
+
+    def _read_ids(self, start: int = 0, end: int = None) -> List[str]:
+        with open(self.index_path, 'rb') as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+        return [line for line in data.decode('utf-8').split('\n') if line]
+
+    def _init_bloom(self, capacity: int, error_rate: float, file_size: int):
+        covered = 0
+        if os.path.exists(self.bloom_path):
+            self.bloom, covered = BloomFilter.load(self.bloom_path, error_rate)
+            if covered > file_size:
+                # snapshot is newer than the id file (e.g. file restored from backup)
+                self.bloom, covered = None, 0
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+        # ids appended after the snapshot was taken
+        self.bloom.add_many(self._read_ids(covered, file_size))
+
+    def _load_exact(self, file_size: int):
+        loaded = set(self._read_ids(0, file_size))
+        with self._lock:
+            loaded.update(self._seen)
+            self._seen = loaded
+        self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def seen(self, txn_id: str, wait: bool = True) -> bool:
+        """
+        O(1) duplicate check
+        Args:
+            txn_id: transaction id
+            wait: if the exact set is still loading, wait for it. With
+                  wait=False an undecidable id is reported as not seen.
+        """
+        check_txn_id(txn_id)
+        if self.bloom is not None and txn_id not in self.bloom:
+            return False
+        if not self._ready.is_set():
+            if not wait:
+                return False
+            self._ready.wait()
+        return txn_id in self._seen
+
+    def add_many(self, txn_ids: Iterable[str]) -> List[bool]:
+        """
+        Record txn_ids as seen. In log-backed mode the ids are only kept in
+        memory (their log records are the durable copy) and a checkpoint
+        runs every sync_every_n new ids.
+        Returns:
+            list of flags, True where the id was new
+        """
+        txn_ids = [check_txn_id(t) for t in txn_ids]
+        with self.exclusive():
+            flags = [not self.seen(t) for t in txn_ids]
+            with self._lock:
+                new_ids = []
+                for i, txn_id in enumerate(txn_ids):
+                    if flags[i] and txn_id not in self._seen:
+                        self._seen.add(txn_id)
+                        new_ids.append(txn_id)
+                    else:
+                        flags[i] = False
+                if new_ids and self._log is not None:
+                    if self.bloom is not None:
+                        self.bloom.add_many(new_ids)
+                    self._pending += len(new_ids)
+                elif new_ids:
+                    self._file.write('\n'.join(new_ids) + '\n')
+                    # whole lines reach the OS before the file lock is released
+                    self._file.flush()
+                    self._read_pos = self._file.tell()
+                    if self.bloom is not None:
+                        self.bloom.add_many(new_ids)
+                    self._pending += len(new_ids)
+                    if self._pending >= self.sync_every_n:
+                        self._sync_locked()
+            if self._log is not None and self._pending >= self.sync_every_n:
+                self._checkpoint_locked()
+        return flags
+
+    def add(self, txn_id: str) -> bool:
+        """
+        Returns True if txn_id was new, False if it is a duplicate
+        """
+        return self.add_many([txn_id])[0]
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def sync(self):
+        if self._log is not None:
+            self.checkpoint()
+            return
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        """
+        Persist and close; in log-backed mode call it before closing the log
+        """
+        with self.exclusive():
+            if self._log is not None:
+                self._checkpoint_locked()
+            with self._lock:
+                self._sync_locked()
+                if self.bloom is not None:
+                    # the bitmap reflects exactly the first _read_pos bytes
+                    self.bloom.save(self.bloom_path, self._read_pos)
+        self._file.close()
+
+
+def benchmark(num_ids: int = 10_000_000, workdir: str = None):
+    """
+    Startup and lookup cost of the dedup index at num_ids stored txn_ids
+    """
+    import uuid
+    import tempfile
+
+    workdir = workdir or tempfile.mkdtemp()
+    path = os.path.join(workdir, 'txn_ids.idx')
+    ids = [uuid.uuid4().hex for _ in range(num_ids)]
+    with open(path, 'w') as f:
+        f.write('\n'.join(ids) + '\n')
+
+    start = time.perf_counter()
+    index = TxnDedupIndex(path)
+    print(f"exact set load: {time.perf_counter() - start:.2f}s for {len(index)} ids")
+
+    probes = ids[:100000] + [uuid.uuid4().hex for _ in range(100000)]
+    start = time.perf_counter()
+    hits = sum(index.seen(t) for t in probes)
+    elapsed = time.perf_counter() - start
+    print(f"exact lookups: {elapsed / len(probes) * 1e6:.2f}us/lookup ({hits} hits)")
+
+    start = time.perf_counter()
+    index.bloom = BloomFilter(num_ids * 2)
+    index.bloom.add_many(ids)
+    index.close()
+    print(f"bloom build: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    index = TxnDedupIndex(path, bloom_capacity=num_ids * 2)
+    print(f"bloom startup (serving): {time.perf_counter() - start:.3f}s")
+    index._ready.wait()
+    print(f"exact set ready after: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    hits = sum(index.seen(t) for t in probes)
+    elapsed = time.perf_counter() - start
+    print(f"bloom+exact lookups: {elapsed / len(probes) * 1e6:.2f}us/lookup ({hits} hits)")
+    index.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 10_000_000)
+    else:
+        index = TxnDedupIndex('txn_ids.idx', bloom_capacity=1_000_000)
+        print(index.add('TXN123'), index.add('TXN123'))
+        index.close()
@@ -4,44 +4,132 @@ upi_webhook_ingestor.py
 Purpose:
     Receive UPI transaction webhooks from payment providers (Razorpay/NPCI sandbox)
     Parse incoming events and store them for downstream processing.
+    Transactions are appended to a segmented log (see transaction_log.py),
+    so ingest cost stays constant as history grows. Provider retries are
+    dropped by an optional txn_id dedup index (see txn_dedup_index.py).
+
+    With the index, check + store + mark-seen run under its cross-process
+    lock. The index follows the log (TxnDedupIndex.follow_log): the log is
+    the durable record of which txn_ids were stored, and on startup the
+    index is caught up from the log tail, so a crash neither loses a stored
+    id (duplicate on replay) nor keeps an id whose record was lost.
+    txn_ids are stored as str; an id with a line break is rejected.
+    Timestamps are stored as ISO 8601 in UTC (naive ones are taken as UTC),
+    so downstream parsing sees a single format.
 """
 
 import json
-from typing import Dict
+from typing import Dict, List
 import pandas as pd
-from datetime import datetime
+
+from data_ingestion.transaction_log import SegmentedTransactionLog
+from data_ingestion.txn_dedup_index import TxnDedupIndex, check_txn_id
+from utils.helpers import now_iso, to_utc_iso
+from utils.logger import get_logger
+
+logger = get_logger("UPIWebhookIngestor")
 
 class UPIWebhookIngestor:
-    def __init__(self, storage_path: str):
+    def __init__(self, storage_path: str, sync_every_n: int = 100, sync_interval_ms: int = 50,
+                 dedup_index: TxnDedupIndex = None):
         """
-        storage_path: CSV/DB path where incoming transactions are stored
+        storage_path: directory of the append-only transaction log
+        sync_every_n / sync_interval_ms: group commit settings for the log
+        dedup_index: optional index used to reject replayed txn_ids
         """
         self.storage_path = storage_path
-        try:
-            self.df = pd.read_csv(storage_path)
-        except FileNotFoundError:
-            self.df = pd.DataFrame(columns=['txn_id', 'user_id', 'fund_id', 'amount', 'status', 'timestamp', 'raw_payload'])
+        self.log = SegmentedTransactionLog(storage_path, sync_every_n=sync_every_n,
+                                           sync_interval_ms=sync_interval_ms)
+        self.dedup_index = dedup_index
+        if dedup_index is not None:
+            dedup_index.follow_log(self.log)
 
-    def ingest_webhook(self, payload: Dict):
+    @staticmethod
+    def parse_payload(payload: Dict) -> Dict:
         """
-        Ingest a single UPI webhook payload
-        Args:
-            payload: Dictionary representing webhook JSON
+        Convert a webhook payload into a transaction record
         """
-        txn = {
-            'txn_id': payload.get('txn_id'),
+        txn_id = payload.get('txn_id')
+        return {
+            'txn_id': check_txn_id(str(txn_id)) if txn_id is not None else None,
             'user_id': payload.get('user_id'),
             'fund_id': payload.get('fund_id'),
             'amount': payload.get('amount'),
             'status': payload.get('status'),
-            'timestamp': payload.get('timestamp', datetime.now()),
+            'timestamp': to_utc_iso(payload['timestamp']) if payload.get('timestamp') else now_iso(),
             'raw_payload': json.dumps(payload)
         }
-        self.df = pd.concat([self.df, pd.DataFrame([txn])], ignore_index=True)
-        self.df.to_csv(self.storage_path, index=False)
+
+    def ingest_webhook(self, payload: Dict):
+        """
+        Ingest a single UPI webhook payload
+        Args:
+            payload: Dictionary representing webhook JSON
+        """
+        txn = self.parse_payload(payload)
+        if self.dedup_index is None or txn['txn_id'] is None:
+            self.log.append(txn)
+            return f"Webhook ingested: {txn['txn_id']}"
+        with self.dedup_index.exclusive():
+            if self.dedup_index.seen(txn['txn_id']):
+                return f"Duplicate webhook ignored: {txn['txn_id']}"
+            # group commit: the index follows the log, so a record lost before its fsync
+            # is also forgotten by the index after a restart and the sender's retry is accepted
+            self.log.append(txn)
+            self.dedup_index.add(txn['txn_id'])
         return f"Webhook ingested: {txn['txn_id']}"
 
+    def ingest_batch(self, payloads: List[Dict]):
+        """
+        Ingest a batch of webhook payloads with a single group commit
+        Args:
+            payloads: list of webhook JSON dictionaries
+        """
+        txns = []
+        for payload in payloads:
+            try:
+                txns.append(self.parse_payload(payload))
+            except ValueError as e:
+                # one malformed payload must not block (and endlessly retry) the whole batch
+                logger.warning(f"Dropping webhook payload: {e}")
+        if self.dedup_index is None:
+            self.log.append_many(txns, sync=True)
+            return f"Webhook batch ingested: {len(txns)} transactions"
+        with self.dedup_index.exclusive():
+            txns = self._drop_duplicates(txns)
+            self.log.append_many(txns, sync=True)
+            self.dedup_index.add_many(t['txn_id'] for t in txns if t['txn_id'] is not None)
+        return f"Webhook batch ingested: {len(txns)} transactions"
+
+    def _drop_duplicates(self, txns: List[Dict]) -> List[Dict]:
+        """
+        Drop txn_ids already stored or repeated within the batch
+        """
+        unique, batch_ids = [], set()
+        for txn in txns:
+            txn_id = txn['txn_id']
+            if txn_id is not None:
+                if txn_id in batch_ids or self.dedup_index.seen(txn_id):
+                    continue
+                batch_ids.add(txn_id)
+            unique.append(txn)
+        return unique
+
+    def load_transactions(self) -> pd.DataFrame:
+        """
+        Load every stored transaction as a DataFrame
+        """
+        return self.log.to_dataframe()
+
+    def close(self):
+        # the index checkpoints against the log, so it closes first
+        if self.dedup_index is not None:
+            self.dedup_index.close()
+        self.log.close()
+
 if __name__ == "__main__":
-    ingestor = UPIWebhookIngestor('transactions.csv')
+    ingestor = UPIWebhookIngestor('transactions_log', dedup_index=TxnDedupIndex('transactions_log/txn_ids.idx'))
     sample_payload = {'txn_id': 'TXN123', 'user_id': 101, 'fund_id': 201, 'amount': 500, 'status': 'SUCCESS'}
     print(ingestor.ingest_webhook(sample_payload))
+    print(ingestor.ingest_webhook(sample_payload))
+    ingestor.close()
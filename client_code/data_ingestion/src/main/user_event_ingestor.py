@@ -4,31 +4,48 @@ user_event_ingestor.py
 Purpose:
     Collects and stores user-generated events from the platform,
     e.g., login, contribution, withdrawal, device changes.
+    Events go to a store partitioned by user and day (see user_event_store.py)
+    so per-user reads never scan the full history.
 """
 
+import os
 import pandas as pd
 from datetime import datetime
 
+from data_ingestion.user_event_store import EventIdAllocator, PartitionedUserEventStore
+
 class UserEventIngestor:
-    def __init__(self, storage_path: str):
+    def __init__(self, storage_path: str, num_shards: int = 64):
+        """
+        storage_path: root directory of the partitioned event store
+        num_shards: number of user_id hash shards
+        """
         self.storage_path = storage_path
-        try:
-            self.events_df = pd.read_csv(storage_path)
-        except FileNotFoundError:
-            self.events_df = pd.DataFrame(columns=['event_id', 'user_id', 'event_type', 'timestamp', 'metadata'])
+        self.store = PartitionedUserEventStore(storage_path, num_shards=num_shards)
+        self.id_allocator = EventIdAllocator(os.path.join(storage_path, 'event_id.seq'))
 
     def ingest_event(self, user_id: int, event_type: str, metadata: dict = None):
         new_event = {
-            'event_id': len(self.events_df)+1,
+            'event_id': self.id_allocator.next_id(),
             'user_id': user_id,
             'event_type': event_type,
-            'timestamp': datetime.now(),
+            'timestamp': datetime.now().isoformat(),
             'metadata': metadata
         }
-        self.events_df = pd.concat([self.events_df, pd.DataFrame([new_event])], ignore_index=True)
-        self.events_df.to_csv(self.storage_path, index=False)
+        self.store.append(new_event)
         return f"Event ingested for user {user_id}"
 
+    def get_user_events(self, user_id: int, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Events of a single user within [start, end]
+        """
+        return self.store.get_user_events(user_id, start, end)
+
+    def close(self):
+        self.store.close()
+
 if __name__ == "__main__":
-    ingestor = UserEventIngestor('user_events.csv')
+    ingestor = UserEventIngestor('user_events')
     print(ingestor.ingest_event(101, 'login', {'ip':'192.168.1.1'}))
+    print(ingestor.get_user_events(101))
+    ingestor.close()
@@ -0,0 +1,211 @@
+"""
+user_event_store.py
+-------------------
+Purpose:
+    Partitioned storage for user events, sharded by a stable hash of
+    user_id and by event day:
+
+        <root>/shard=<NN>/<YYYY-MM-DD>.jsonl
+
+    Each line is "<user_id>\t<event json>", so one user's events for a time
+    range are read from a handful of small files and filtered by prefix
+    without parsing other users' events.
+
+    Several processes may append to the same partition: files are opened
+    with O_APPEND and every line is written with a single os.write under an
+    flock on the file, so lines never interleave. A line torn by a crash is
+    sealed with a newline when the partition is next opened for writing and
+    skipped by readers, as in transaction_log.py.
+"""
+
+import os
+import json
+import zlib
+import fcntl
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+def _write_all(fd: int, data: bytes):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class EventIdAllocator:
+    def __init__(self, path: str, block_size: int = 1000):
+        """
+        Hand out unique event ids.
+        Ids are reserved from a file-backed high-water mark in blocks, under an
+        exclusive file lock, so concurrent threads and processes never collide.
+        Ids increase within one process only: each process draws from its own
+        block, so across processes they are not in event order (order events
+        by timestamp). Unused ids of a block are skipped after a restart.
+        The high-water mark is replaced atomically, so a crash while reserving
+        never resets it.
+        Args:
+            path: file holding the high-water mark
+            block_size: ids reserved per trip to disk
+        """
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _reserve_block(self):
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, 'r') as f:
+                        high_water = int(f.read().strip() or 0)
+                except FileNotFoundError:
+                    high_water = 0
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(str(high_water + self.block_size))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._next = high_water + 1
+        self._limit = high_water + self.block_size + 1
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._limit:
+                self._reserve_block()
+            event_id = self._next
+            self._next += 1
+            return event_id
+
+
+class PartitionedUserEventStore:
+    def __init__(self, root: str, num_shards: int = 64):
+        """
+        Args:
+            root: base directory of the store
+            num_shards: number of user_id hash shards (fixed for the life of the store)
+        """
+        self.root = root
+        self.num_shards = num_shards
+        self._lock = threading.Lock()
+        self._handles = {}
+        os.makedirs(root, exist_ok=True)
+
+    def shard_of(self, user_id) -> int:
+        # crc32 rather than hash(): stable across processes and restarts
+        return zlib.crc32(str(user_id).encode('utf-8')) % self.num_shards
+
+    def _shard_dir(self, shard: int) -> str:
+        return os.path.join(self.root, f"shard={shard:02d}")
+
+    def _partition_path(self, user_id, day: str) -> str:
+        return os.path.join(self._shard_dir(self.shard_of(user_id)), f"{day}.jsonl")
+
+    def append(self, event: Dict):
+        """
+        Append one event. event must carry 'user_id' and an ISO 'timestamp'.
+        """
+        day = str(event['timestamp'])[:10]
+        path = self._partition_path(event['user_id'], day)
+        line = f"{event['user_id']}\t{json.dumps(event, default=str)}\n".encode('utf-8')
+        with self._lock:
+            # bound open files; appends concentrate on the current day anyway
+            if path not in self._handles and len(self._handles) >= self.num_shards:
+                for old in self._handles.values():
+                    os.close(old)
+                self._handles.clear()
+            fd = self._handles.get(path)
+            if fd is None:
+                fd = self._handles[path] = self._open_partition(path)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                _write_all(fd, line)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _open_partition(path: str) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            # seal a line torn by a crash so the next event starts on a line of its own
+            size = os.fstat(fd).st_size
+            if size:
+                with open(path, 'rb') as f:
+                    f.seek(size - 1)
+                    torn = f.read(1) != b'\n'
+                if torn:
+                    _write_all(fd, b'\n')
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        return fd
+
+    def _days_in_range(self, shard: int, start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+        if start is not None and end is not None:
+            days = (end.date() - start.date()).days
+            return [(start.date() + timedelta(days=i)).isoformat() for i in range(days + 1)]
+        shard_dir = self._shard_dir(shard)
+        if not os.path.isdir(shard_dir):
+            return []
+        days = sorted(name[:-len('.jsonl')] for name in os.listdir(shard_dir) if name.endswith('.jsonl'))
+        if start is not None:
+            days = [d for d in days if d >= start.date().isoformat()]
+        if end is not None:
+            days = [d for d in days if d <= end.date().isoformat()]
+        return days
+
+    def get_user_events(self, user_id, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Fetch one user's events with start <= timestamp <= end
+        Args:
+            user_id: user to fetch
+            start / end: optional time bounds
+        Returns:
+            DataFrame of events ordered by timestamp
+        """
+        shard = self.shard_of(user_id)
+        prefix = f"{user_id}\t"
+        events = []
+        for day in self._days_in_range(shard, start, end):
+            path = os.path.join(self._shard_dir(shard), f"{day}.jsonl")
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if not line.startswith(prefix) or not line.endswith('\n'):
+                        continue
+                    try:
+                        events.append(json.loads(line[len(prefix):]))
+                    except ValueError:
+                        # torn by a crash (see _open_partition)
+                        continue
+
+        df = pd.DataFrame(events, columns=['event_id', 'user_id', 'event_type', 'timestamp', 'metadata'])
+        if df.empty:
+            return df
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if start is not None:
+            df = df[df['timestamp'] >= start]
+        if end is not None:
+            df = df[df['timestamp'] <= end]
+        return df.sort_values('timestamp').reset_index(drop=True)
+
+    def sync(self):
+        with self._lock:
+            for fd in self._handles.values():
+                os.fsync(fd)
+
+    def close(self):
+        with self._lock:
+            for fd in self._handles.values():
+                os.fsync(fd)
+                os.close(fd)
+            self._handles.clear()
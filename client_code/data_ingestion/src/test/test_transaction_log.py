@@ -0,0 +1,44 @@
+from data_ingestion.transaction_log import SegmentedTransactionLog
+
+
+def _log(tmp_path, **kwargs):
+    # a long interval: only the record count triggers a commit
+    return SegmentedTransactionLog(str(tmp_path / "log"), sync_interval_ms=60000, **kwargs)
+
+
+def test_group_commit_syncs_every_n_records(tmp_path):
+    log = _log(tmp_path, sync_every_n=3)
+    for i in range(2):
+        log.append({'txn_id': f'T{i}'})
+    assert log._pending == 2
+    log.append({'txn_id': 'T2'})
+    assert log._pending == 0
+    log.close()
+
+
+def test_records_roll_over_segments_and_read_back_in_order(tmp_path):
+    log = _log(tmp_path, max_segment_bytes=200)
+    log.append_many([{'txn_id': f'T{i}', 'amount': i} for i in range(20)])
+    assert len(log.segments()) > 1
+
+    records, position = log.read_from((0, 0), max_records=5)
+    rest, end = log.read_from(position)
+    assert [r['txn_id'] for r in records + rest] == [f'T{i}' for i in range(20)]
+    assert end == log.end_position()
+    assert log.bytes_after(end) == 0
+    log.close()
+
+
+def test_recovery_truncates_a_torn_tail(tmp_path):
+    log = _log(tmp_path)
+    log.append_many([{'txn_id': 'T0'}, {'txn_id': 'T1'}])
+    segment, size = log.end_position()
+    log.close()
+    with open(log._segment_path(segment), 'ab') as f:
+        f.write(b'0000abcd\t{"txn_id": "T2"')
+
+    reopened = _log(tmp_path)
+    assert reopened.end_position() == (segment, size)
+    reopened.append({'txn_id': 'T3'})
+    assert [r['txn_id'] for r in reopened.iter_records()] == ['T0', 'T1', 'T3']
+    reopened.close()
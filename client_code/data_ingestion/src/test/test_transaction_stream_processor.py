@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from data_ingestion.transaction_log import SegmentedTransactionLog
+from data_ingestion.transaction_stream_processor import TransactionStreamProcessor
+
+MIXED_TIMESTAMPS = ['2024-01-01', '2024-01-01 12:00', '2024-01-01T12:30:00+05:30',
+                    '2024-01-02T00:00:00Z', '2024-01-02T01:00:00.123456']
+
+
+def _write_log(log_dir, records):
+    log = SegmentedTransactionLog(str(log_dir))
+    log.append_many(records, sync=True)
+    log.close()
+
+
+def _records(n, timestamps=MIXED_TIMESTAMPS):
+    rng = np.random.default_rng(7)
+    return [{'txn_id': f'T{i}', 'user_id': f'u{i % 4}', 'fund_id': f'f{i % 2}',
+             'amount': float(rng.integers(100, 1000)), 'timestamp': timestamps[i % len(timestamps)]}
+            for i in range(n)]
+
+
+def _processor(tmp_path, **kwargs):
+    return TransactionStreamProcessor(str(tmp_path / 'log'), str(tmp_path / 'proc.ckpt'),
+                                      str(tmp_path / 'scores.csv'), **kwargs)
+
+
+def test_mixed_timestamp_formats_are_scored(tmp_path):
+    _write_log(tmp_path / 'log', _records(20))
+    processor = _processor(tmp_path, batch_size=7)
+    scores = processor.process_transactions()
+
+    assert len(scores) == 20
+    assert processor.metrics['dead_letter_records'] == 0
+    assert processor.checkpoint['watermark'] == '2024-01-02T01:00:00.123456+00:00'
+    assert processor.metrics['event_time_lag_seconds'] > 0
+
+
+def test_unscoreable_batch_is_dead_lettered_and_skipped(tmp_path):
+    records = _records(6)
+    records[4]['timestamp'] = 'not a timestamp'
+    _write_log(tmp_path / 'log', records)
+    processor = _processor(tmp_path, batch_size=3)
+    scores = processor.process_transactions()
+
+    assert list(scores['txn_id']) == ['T0', 'T1', 'T2']
+    assert processor.metrics['dead_letter_records'] == 3
+    with open(processor.dead_letter_path) as f:
+        assert [json.loads(line)['record']['txn_id'] for line in f] == ['T3', 'T4', 'T5']
+    # the checkpoint moved past the bad batch
+    assert processor.checkpoint['records_processed'] == 6
+    assert _processor(tmp_path).process_transactions().empty
+
+
+def test_restart_resumes_from_state_matching_the_checkpoint(tmp_path):
+    records = _records(40, timestamps=[f'2024-01-01T00:{m:02d}:00Z' for m in range(60)])
+    _write_log(tmp_path / 'log', records)
+
+    # crash after 7 batches of 4: only the first 6 were checkpointed
+    crashed = _processor(tmp_path, batch_size=4, checkpoint_every_n=3, checkpoint_interval_seconds=1e9)
+    for _ in range(7):
+        crashed.process_batch()
+    assert crashed.metrics['checkpoints'] == 2
+    with open(crashed.checkpoint_path) as f:
+        assert json.load(f)['records_processed'] == 24
+
+    resumed = _processor(tmp_path, batch_size=4, checkpoint_every_n=3, checkpoint_interval_seconds=1e9)
+    resumed.process_transactions()
+
+    whole_dir = tmp_path / 'whole'
+    whole_dir.mkdir()
+    _write_log(whole_dir / 'log', records)
+    whole = _processor(whole_dir)
+    whole.process_transactions()
+
+    for got, expected in zip(resumed.anomaly_detector.user_stats.summary_arrays(),
+                             whole.anomaly_detector.user_stats.summary_arrays()):
+        np.testing.assert_array_equal(got, expected)
+    # at-least-once: the uncheckpointed batch is re-appended to the sink
+    sink = pd.read_csv(resumed.sink_path)
+    assert len(sink) == 44 and sink['txn_id'].nunique() == 40
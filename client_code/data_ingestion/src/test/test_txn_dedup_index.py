@@ -0,0 +1,40 @@
+import pytest
+
+from data_ingestion.txn_dedup_index import TxnDedupIndex
+
+
+def test_ids_survive_a_reopen_with_the_bloom_snapshot(tmp_path):
+    path = str(tmp_path / "ids.idx")
+    index = TxnDedupIndex(path, bloom_capacity=1000)
+    assert index.add_many(['T1', 'T2', 'T1']) == [True, True, False]
+    index.close()
+
+    reopened = TxnDedupIndex(path, bloom_capacity=1000)
+    assert reopened.seen('T1') and reopened.seen('T2')
+    assert not reopened.seen('T3')
+    assert not reopened.add('T2')
+    reopened.close()
+
+
+def test_reopen_truncates_a_torn_last_id(tmp_path):
+    path = str(tmp_path / "ids.idx")
+    index = TxnDedupIndex(path)
+    index.add('T1')
+    index.close()
+    with open(path, 'a') as f:
+        f.write('T2')
+
+    reopened = TxnDedupIndex(path)
+    assert len(reopened) == 1
+    assert reopened.add('T2')
+    reopened.close()
+    with open(path) as f:
+        assert f.read() == 'T1\nT2\n'
+
+
+def test_rejects_ids_that_do_not_fit_one_line(tmp_path):
+    index = TxnDedupIndex(str(tmp_path / "ids.idx"))
+    for bad in ('', 'T1\nT2', 7):
+        with pytest.raises(ValueError):
+            index.add(bad)
+    index.close()
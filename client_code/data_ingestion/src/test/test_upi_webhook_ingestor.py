@@ -0,0 +1,79 @@
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from utils.client_packages import REPO_ROOT
+from data_ingestion.upi_webhook_ingestor import UPIWebhookIngestor
+from data_ingestion.txn_dedup_index import TxnDedupIndex, check_txn_id
+from data_ingestion.transaction_log import SegmentedTransactionLog
+
+
+def _ingestor(tmp_path, bloom_capacity=None):
+    index = TxnDedupIndex(str(tmp_path / "ids.idx"), bloom_capacity=bloom_capacity, sync_every_n=50)
+    return UPIWebhookIngestor(str(tmp_path / "log"), dedup_index=index)
+
+
+def _crash_after_ingesting(tmp_path, n):
+    # ingest in a child process that exits without close(): no final checkpoint
+    script = textwrap.dedent(f"""
+        import os
+        from utils.client_packages import register_client_packages
+        register_client_packages()
+        from data_ingestion.upi_webhook_ingestor import UPIWebhookIngestor
+        from data_ingestion.txn_dedup_index import TxnDedupIndex
+        index = TxnDedupIndex({str(tmp_path / "ids.idx")!r}, sync_every_n=50)
+        ing = UPIWebhookIngestor({str(tmp_path / "log")!r}, dedup_index=index)
+        for i in range({n}):
+            ing.ingest_webhook({{'txn_id': f'T{{i}}', 'amount': 1.0}})
+        ing.ingest_batch([{{'txn_id': 'B1'}}, {{'txn_id': 7}}])
+        os._exit(0)
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True)
+
+
+@pytest.mark.parametrize("bloom_capacity", [None, 1000])
+def test_dedup_survives_crash(tmp_path, bloom_capacity):
+    _crash_after_ingesting(tmp_path, 120)
+    ing = _ingestor(tmp_path, bloom_capacity)
+    try:
+        # ids past the last checkpoint are recovered from the log tail
+        assert ing.ingest_webhook({'txn_id': 'T119'}).startswith("Duplicate")
+        assert ing.ingest_webhook({'txn_id': 'B1'}).startswith("Duplicate")
+        assert ing.ingest_webhook({'txn_id': '7'}).startswith("Duplicate")
+        assert ing.ingest_webhook({'txn_id': 'T120'}).startswith("Webhook ingested")
+    finally:
+        ing.close()
+    df = SegmentedTransactionLog(str(tmp_path / "log"), read_only=True).to_dataframe()
+    assert len(df) == df['txn_id'].nunique() == 123
+    ids = (tmp_path / "ids.idx").read_text().split('\n')[:-1]
+    assert sorted(ids) == sorted(df['txn_id'])
+
+
+def test_batch_drops_invalid_txn_ids(tmp_path):
+    ing = _ingestor(tmp_path)
+    try:
+        ing.ingest_batch([{'txn_id': 'a\nb'}, {'txn_id': ''}, {'txn_id': 'ok'}, {'txn_id': 'ok'}])
+        with pytest.raises(ValueError):
+            ing.dedup_index.add(5)
+    finally:
+        ing.close()
+    df = ing.load_transactions()
+    assert list(df['txn_id']) == ['ok']
+
+
+def test_check_txn_id():
+    assert check_txn_id('T1') == 'T1'
+    for bad in (None, 5, '', 'x\ny'):
+        with pytest.raises(ValueError):
+            check_txn_id(bad)
+
+
+def test_timestamps_are_normalized_to_utc_iso():
+    parse = UPIWebhookIngestor.parse_payload
+    assert parse({'txn_id': 'T1', 'timestamp': '2024-01-01T05:30:00+05:30'})['timestamp'] == '2024-01-01T00:00:00+00:00'
+    assert parse({'txn_id': 'T1', 'timestamp': '2024-01-01 12:00'})['timestamp'] == '2024-01-01T12:00:00+00:00'
+    assert parse({'txn_id': 'T1'})['timestamp'].endswith('+00:00')
+    with pytest.raises(ValueError):
+        parse({'txn_id': 'T1', 'timestamp': 'yesterday-ish'})
@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+
+from data_ingestion.user_event_store import EventIdAllocator, PartitionedUserEventStore
+
+
+def _append_events(root, worker, n):
+    store = PartitionedUserEventStore(root, num_shards=1)
+    allocator = EventIdAllocator(os.path.join(root, 'event_id.seq'), block_size=10)
+    payload = 'x' * 5000  # larger than a pipe buffer / stdio block
+    for i in range(n):
+        store.append({'event_id': allocator.next_id(), 'user_id': 'u1', 'event_type': f'w{worker}',
+                      'timestamp': f'2024-01-01T00:00:{i % 60:02d}', 'metadata': {'i': i, 'pad': payload}})
+    store.close()
+
+
+def test_concurrent_appends_do_not_interleave_and_ids_are_unique(tmp_path):
+    root = str(tmp_path)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_append_events, args=(root, w, 200)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    events = PartitionedUserEventStore(root, num_shards=1).get_user_events('u1')
+    assert len(events) == 800
+    assert events['event_id'].is_unique
+    for worker in range(4):
+        ids = events.loc[events['event_type'] == f'w{worker}'].sort_values('metadata', key=lambda m: m.str['i'])
+        assert ids['event_id'].is_monotonic_increasing
+
+
+def test_torn_tail_is_skipped_and_sealed(tmp_path):
+    store = PartitionedUserEventStore(str(tmp_path), num_shards=1)
+    store.append({'event_id': 1, 'user_id': 'u1', 'event_type': 'login', 'timestamp': '2024-01-01T10:00:00'})
+    store.close()
+    path = store._partition_path('u1', '2024-01-01')
+    with open(path, 'ab') as f:
+        f.write(b'u1\t{"event_id": 2, "user_id": "u1", "event_ty')
+
+    store = PartitionedUserEventStore(str(tmp_path), num_shards=1)
+    assert list(store.get_user_events('u1')['event_id']) == [1]
+    store.append({'event_id': 3, 'user_id': 'u1', 'event_type': 'logout', 'timestamp': '2024-01-01T11:00:00'})
+    store.close()
+    assert list(store.get_user_events('u1')['event_id']) == [1, 3]
+
+
+def test_allocator_resumes_after_the_reserved_block(tmp_path):
+    path = str(tmp_path / 'event_id.seq')
+    first = EventIdAllocator(path, block_size=5)
+    assert [first.next_id() for _ in range(3)] == [1, 2, 3]
+    second = EventIdAllocator(path, block_size=5)
+    assert second.next_id() == 6
@@ -40,7 +40,7 @@ class CollusionDetector:
         return user_clusters
 
 if __name__ == "__main__":
-    from graph_builder import GraphBuilder
+    from gnn_fraud_graph.graph_builder import GraphBuilder
     import pandas as pd
     # Sample data
     users = pd.DataFrame({'user_id':[1,2,3,4]})
@@ -23,7 +23,7 @@ def plot_graph(graph, suspicious_users=None):
     plt.show()
 
 if __name__ == "__main__":
-    from graph_builder import GraphBuilder
+    from gnn_fraud_graph.graph_builder import GraphBuilder
     import pandas as pd
     users = pd.DataFrame({'user_id':[1,2,3]})
     funds = pd.DataFrame({'fund_id':[101]})
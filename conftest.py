@@ -0,0 +1,14 @@
+"""
+conftest.py
+-----------
+Test-suite bootstrap: client_code services import as packages
+(data_ingestion.*, anomaly_detection.*) and API modules as core.*, routers.*, schemas.*
+"""
+
+import os
+import sys
+
+from utils.client_packages import REPO_ROOT, register_client_packages
+
+register_client_packages()
+sys.path.insert(0, os.path.join(REPO_ROOT, "api"))
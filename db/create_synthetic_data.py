@@ -4,7 +4,7 @@ generate_fundwise_data.py
 Hybrid-AI synthetic dataset generator for FundWise (RBI HaRBInger 2025)
 
 Generates:
-  /fundwise_dataset/
+  <outdir>/
     /postgres/
       users.csv
       transactions.csv
@@ -21,64 +21,48 @@ Generates:
       txn_embeddings.json
     README.md
 
+With --format parquet (or arrow) every table is instead written as a
+directory of typed Parquet (Arrow IPC) files. Time-keyed tables are hive
+partitioned by month of their main timestamp (month=YYYY-MM), and rows
+inside each file are sorted by user, so readers can prune on both
+(see utils/dataset_io.py):
+    /postgres/transactions/month=2025-09/part-00000.parquet
+
+Rows are sampled with vectorized NumPy code in fixed-size chunks. Chunks are
+spread over a process pool and streamed to disk in order, so memory stays
+bounded by (workers x chunk size) regardless of --scale. Every chunk gets
+its own seed derived from --seed, so output does not depend on --workers.
+
 Usage:
-  - Configure sizes and toggles below
-  - Ensure OPENAI_API_KEY in environment if using OpenAI
-  - pip install required packages
+  python create_synthetic_data.py --outdir dataset --scale 100 --workers 8
+  python create_synthetic_data.py --format parquet --scale 1000
+  python create_synthetic_data.py --use-openai   # GPT cluster notes + real embeddings
+                                                 # (needs OPENAI_API_KEY)
 """
 
 import os
-import csv
 import json
-import uuid
 import time
 import hashlib
-import random
-from datetime import datetime, timedelta
-from faker import Faker
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 import numpy as np
-import networkx as nx
-from tqdm import tqdm
-from dotenv import load_dotenv
-import os
-from openai import OpenAI
-
-load_dotenv(dotenv_path="./deployment_config/.env")
-print("Loaded API key?", bool(os.getenv("OPENAI_API_KEY")))
-
+import pandas as pd
+from faker import Faker
 
-# Optional OpenAI integration
-USE_OPENAI = True   # set False to skip GPT/embeddings
+# OpenAI settings (only used with --use-openai)
 OPENAI_MODEL = "gpt-4o-mini"  # or text-davinci-003 etc.
 OPENAI_EMBED_MODEL = "text-embedding-3-large"
-# Install openai package if USE_OPENAI is True
-try:
-    if USE_OPENAI:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-
-        if not openai_api_key:
-            raise RuntimeError("OPENAI_API_KEY not set in environment")
-
-        client = OpenAI(api_key=openai_api_key)
+OPENAI_BATCH = 16
+OPENAI_SLEEP = 0.5
 
-except Exception as e:
-    print(f"OpenAI unavailable: {e}. Proceeding without OpenAI.")
-    USE_OPENAI = False
-    client = None
 # ---------- CONFIG ----------
-OUTDIR = "/home/ntlpt60/PycharmProjects/startup/Fundwise_iit/dataset"
-PG_DIR = os.path.join(OUTDIR, "postgres")
-VEC_DIR = os.path.join(OUTDIR, "vector_db")
-os.makedirs(PG_DIR, exist_ok=True)
-os.makedirs(VEC_DIR, exist_ok=True)
-
 SEED = 42
-random.seed(SEED)
-np.random.seed(SEED)
-F = Faker()
-F.seed_instance(SEED)
 
-# sizes (recommended for hackathon)
+# sizes at --scale 1 (recommended for hackathon)
 NUM_USERS = 1000
 NUM_TXNS = 30000
 NUM_BEHAVIOR = 8000
@@ -87,27 +71,58 @@ NUM_ESCROW = 700
 NUM_FEEDBACK = 2500
 NUM_TRUST_LOGS = 5000
 NUM_AUDIT = 7000
-# vector samples
+# vector samples (not scaled)
 NUM_USER_EMB = NUM_USERS
 NUM_TXN_EMB = 10000  # sample of transactions for embeddings
-
-# OpenAI batching
-OPENAI_BATCH = 16
-OPENAI_SLEEP = 0.5
-
-# ---------- HELPERS ----------
-def uid():
-    return str(uuid.uuid4())
-
-def now_ts():
-    return datetime.utcnow().isoformat()
-
-def recent_datetime(days=90):
-    return datetime.utcnow() - timedelta(days=random.randint(0, days), seconds=random.randint(0, 86400))
-
-def hash_chain(prev_hash, payload_str):
-    s = (str(prev_hash or "") + "|" + payload_str).encode("utf-8")
-    return hashlib.sha256(s).hexdigest()
+EMBED_DIM = 768
+
+CHUNK_ROWS = 200000
+
+# Faker is only used to build small vocabularies; rows sample from them
+NAME_POOL_SIZE = 1000
+SENTENCE_POOL_SIZE = 500
+EMAIL_DOMAINS = np.array(["gmail.com", "yahoo.com", "hotmail.com"])
+
+TABLE_HEADERS = {
+    "users": ["user_id","name","kyc_id","mobile","email","device_id","created_at","risk_level","credibility_score","is_flagged","last_login"],
+    "transactions": ["txn_id","user_id","txn_type","amount","timestamp","counterparty","status","risk_flag","channel","ip_address","device_id"],
+    "behavior_signals": ["signal_id","user_id","device_pattern_score","geo_distance_score","txn_velocity","anomaly_flag","ip_address","created_at"],
+    "collusion_graph": ["edge_id","user_src","user_dest","relationship_type","weight","last_interaction"],
+    "escrow_ledger": ["block_id","txn_hash","sender","receiver","amount","prev_hash","timestamp","status","dispute_reason"],
+    "feedback_loop": ["feedback_id","user_id","target_user_id","feedback_type","remarks","timestamp"],
+    "trustscore_logs": ["log_id","user_id","score","components","decision","timestamp"],
+    "audit_trail": ["audit_id","entity","entity_id","action","performed_by","details","timestamp"],
+}
+# stable per-table seed keys, so adding a table never shifts the others
+TABLE_SEED_KEYS = {name: i for i, name in enumerate(TABLE_HEADERS)}
+
+# columnar output: month partition source, sort key and dictionary-encoded enums
+PARTITION_COLUMNS = {
+    "transactions": "timestamp",
+    "behavior_signals": "created_at",
+    "escrow_ledger": "timestamp",
+    "feedback_loop": "timestamp",
+    "trustscore_logs": "timestamp",
+    "audit_trail": "timestamp",
+}
+SORT_COLUMNS = {
+    "users": "user_id",
+    "transactions": "user_id",
+    "behavior_signals": "user_id",
+    "collusion_graph": "user_src",
+    "escrow_ledger": "sender",
+    "feedback_loop": "user_id",
+    "trustscore_logs": "user_id",
+}
+ENUM_COLUMNS = {
+    "users": ["risk_level"],
+    "transactions": ["txn_type", "status", "channel"],
+    "collusion_graph": ["relationship_type"],
+    "escrow_ledger": ["status", "dispute_reason"],
+    "feedback_loop": ["feedback_type"],
+    "audit_trail": ["entity", "action"],
+}
+FILE_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
 
 # ---------- SCHEMAS (for create_tables.sql) ----------
 CREATE_TABLES_SQL = """
@@ -203,191 +218,281 @@ CREATE TABLE IF NOT EXISTS audit_trail (
 );
 """
 
-# ---------- GENERATORS ----------
-def generate_users(n):
-    users = []
-    for _ in range(n):
-        u = {
-            "user_id": uid(),
-            "name": F.name(),
-            "kyc_id": f"{F.bothify(text='PAN?????')}"[:50],
-            "mobile": F.msisdn()[:15],
-            "email": F.free_email(),
-            "device_id": str(uuid.uuid4()),
-            "created_at": recent_datetime(365).isoformat(),
-            "risk_level": random.choices(["low","medium","high"], weights=[0.8,0.15,0.05])[0],
-            "credibility_score": round(random.random(), 4),
-            "is_flagged": False,
-            "last_login": recent_datetime(30).isoformat()
-        }
-        users.append(u)
-    return users
-
-def generate_transactions(users, n):
-    txns = []
-    user_ids = [u["user_id"] for u in users]
-    channels = ["UPI","CARD","WALLET","NETBANKING","AGENT"]
-    statuses = ["success", "pending", "failed"]
-    for _ in range(n):
-        uid_choice = random.choice(user_ids)
-        amount = round(max(1.0, np.random.exponential(scale=200)), 2)
-        txn = {
-            "txn_id": uid(),
-            "user_id": uid_choice,
-            "txn_type": random.choices(["deposit","withdrawal","transfer","escrow"], weights=[0.4,0.2,0.3,0.1])[0],
-            "amount": amount,
-            "timestamp": recent_datetime(90).isoformat(),
-            "counterparty": random.choice(user_ids + [None]),
-            "status": random.choices(statuses, weights=[0.95,0.03,0.02])[0],
-            "risk_flag": None,
-            "channel": random.choice(channels),
-            "ip_address": F.ipv4_private(),
-            "device_id": str(uuid.uuid4())
-        }
-        txns.append(txn)
-    return txns
-
-def generate_behavior_signals(users, n):
-    signals = []
-    user_ids = [u["user_id"] for u in users]
-    for _ in range(n):
-        uid_choice = random.choice(user_ids)
-        s = {
-            "signal_id": uid(),
-            "user_id": uid_choice,
-            "device_pattern_score": round(random.random(), 4),
-            "geo_distance_score": round(random.random(), 4),
-            "txn_velocity": round(random.expovariate(1/0.5), 4),
-            "anomaly_flag": False,
-            "ip_address": F.ipv4_private(),
-            "created_at": recent_datetime(30).isoformat()
-        }
+# ---------- VECTORIZED HELPERS ----------
+_HEX_CHARS = np.array(list("0123456789abcdef"))
+_UUID_DASHES = [8, 13, 18, 23]
+_UUID_HEX_SLOTS = [i for i in range(36) if i not in _UUID_DASHES]
+
+def uuid4_array(rng, n):
+    """n random version-4 UUID strings, without a Python loop"""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    nibbles = np.empty((n, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+    chars = np.full((n, 36), "-", dtype="<U1")
+    chars[:, _UUID_HEX_SLOTS] = _HEX_CHARS[nibbles]
+    return chars.view("<U36").ravel()
+
+def recent_datetimes(rng, n, days, now):
+    """Like now - timedelta(days=randint(0, days), seconds=randint(0, 86400))"""
+    offset_s = rng.integers(0, days + 1, size=n) * 86400 + rng.integers(0, 86401, size=n)
+    return now - offset_s.astype("timedelta64[s]")
+
+def private_ipv4(rng, n):
+    """Addresses from 10/8, 172.16/12 and 192.168/16, like Faker.ipv4_private"""
+    octets = rng.integers(0, 256, size=(n, 3)).astype(str)
+    block = rng.integers(0, 3, size=n)
+    first = np.where(block == 0, "10", np.where(block == 1, "172", "192"))
+    second = np.where(block == 0, octets[:, 0],
+                      np.where(block == 1, (16 + rng.integers(0, 16, size=n)).astype(str), "168"))
+    return pd.Series(first) + "." + second + "." + octets[:, 1] + "." + octets[:, 2]
+
+def random_letters(rng, n, k):
+    codes = rng.integers(ord("A"), ord("Z") + 1, size=(n, k)).astype(np.uint32)
+    return codes.view(f"<U{k}").ravel()
+
+def hash_chain(prev_hash, payload_str):
+    s = (str(prev_hash or "") + "|" + payload_str).encode("utf-8")
+    return hashlib.sha256(s).hexdigest()
+
+def build_vocab(seed):
+    """Small Faker-backed vocabularies sampled by the vectorized generators"""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        "first_names": np.array([fake.first_name() for _ in range(NAME_POOL_SIZE)]),
+        "last_names": np.array([fake.last_name() for _ in range(NAME_POOL_SIZE)]),
+        "remarks": np.array([fake.sentence(nb_words=8) for _ in range(SENTENCE_POOL_SIZE)]),
+        "audit_details": np.array([json.dumps({"note": fake.sentence(nb_words=6)}) for _ in range(SENTENCE_POOL_SIZE)]),
+    }
+
+# ---------- WORKER STATE ----------
+# user ids are stored as fixed-width bytes to keep the per-worker copy small
+_CTX = {}
+
+def _init_worker(user_ids, vocab, now):
+    _CTX["user_ids"] = user_ids
+    _CTX["vocab"] = vocab
+    _CTX["now"] = now
+
+def _pick_users(rng, n):
+    return _CTX["user_ids"][rng.integers(0, len(_CTX["user_ids"]), size=n)].astype("<U36")
+
+# ---------- GENERATORS (one chunk each) ----------
+def generate_users(rng, start, n):
+    vocab, now = _CTX["vocab"], _CTX["now"]
+    first = vocab["first_names"][rng.integers(0, NAME_POOL_SIZE, size=n)]
+    last = vocab["last_names"][rng.integers(0, NAME_POOL_SIZE, size=n)]
+    email = (pd.Series(first).str.lower() + "." + pd.Series(last).str.lower() +
+             rng.integers(1, 1000, size=n).astype(str) + "@" + EMAIL_DOMAINS[rng.integers(0, len(EMAIL_DOMAINS), size=n)])
+    return pd.DataFrame({
+        "user_id": _CTX["user_ids"][start:start + n].astype("<U36"),
+        "name": pd.Series(first) + " " + pd.Series(last),
+        "kyc_id": np.char.add("PAN", random_letters(rng, n, 5)),
+        "mobile": rng.integers(10 ** 12, 10 ** 13, size=n).astype(str),
+        "email": email,
+        "device_id": uuid4_array(rng, n),
+        "created_at": recent_datetimes(rng, n, 365, now),
+        "risk_level": rng.choice(["low","medium","high"], size=n, p=[0.8,0.15,0.05]),
+        "credibility_score": rng.random(n).round(4),
+        "is_flagged": np.zeros(n, dtype=bool),
+        "last_login": recent_datetimes(rng, n, 30, now),
+    })
+
+def generate_transactions(rng, start, n):
+    n_users = len(_CTX["user_ids"])
+    # counterparty may be None with probability 1/(users+1), as random.choice(user_ids + [None])
+    counterparty = pd.Series(_pick_users(rng, n), dtype=object)
+    counterparty[rng.integers(0, n_users + 1, size=n) == n_users] = None
+    return pd.DataFrame({
+        "txn_id": uuid4_array(rng, n),
+        "user_id": _pick_users(rng, n),
+        "txn_type": rng.choice(["deposit","withdrawal","transfer","escrow"], size=n, p=[0.4,0.2,0.3,0.1]),
+        "amount": np.maximum(1.0, rng.exponential(scale=200, size=n)).round(2),
+        "timestamp": recent_datetimes(rng, n, 90, _CTX["now"]),
+        "counterparty": counterparty,
+        "status": rng.choice(["success", "pending", "failed"], size=n, p=[0.95,0.03,0.02]),
+        "risk_flag": None,
+        "channel": rng.choice(["UPI","CARD","WALLET","NETBANKING","AGENT"], size=n),
+        "ip_address": private_ipv4(rng, n),
+        "device_id": uuid4_array(rng, n),
+    })
+
+def generate_behavior_signals(rng, start, n):
+    return pd.DataFrame({
+        "signal_id": uuid4_array(rng, n),
+        "user_id": _pick_users(rng, n),
+        "device_pattern_score": rng.random(n).round(4),
+        "geo_distance_score": rng.random(n).round(4),
+        "txn_velocity": rng.exponential(scale=0.5, size=n).round(4),
         # Mark some anomalies
-        if random.random() < 0.02:
-            s["anomaly_flag"] = True
-        signals.append(s)
-    return signals
-
-def generate_collusion_graph(users, edges):
-    user_ids = [u["user_id"] for u in users]
-    G = nx.Graph()
-    G.add_nodes_from(user_ids)
+        "anomaly_flag": rng.random(n) < 0.02,
+        "ip_address": private_ipv4(rng, n),
+        "created_at": recent_datetimes(rng, n, 30, _CTX["now"]),
+    })
+
+def generate_feedback(rng, start, n):
+    user_ids = _CTX["user_ids"]
+    a = rng.integers(0, len(user_ids), size=n)
+    b = (a + rng.integers(1, len(user_ids), size=n)) % len(user_ids)  # distinct from a
+    remarks = pd.Series(_CTX["vocab"]["remarks"][rng.integers(0, SENTENCE_POOL_SIZE, size=n)], dtype=object)
+    remarks[rng.random(n) >= 0.1] = None
+    return pd.DataFrame({
+        "feedback_id": uuid4_array(rng, n),
+        "user_id": user_ids[a].astype("<U36"),
+        "target_user_id": user_ids[b].astype("<U36"),
+        "feedback_type": rng.choice(["green","red"], size=n, p=[0.9,0.1]),
+        "remarks": remarks,
+        "timestamp": recent_datetimes(rng, n, 60, _CTX["now"]),
+    })
+
+def generate_trustscore_logs(rng, start, n):
+    comps = {k: rng.random(n).round(4) for k in ["velocity", "gnn", "anomaly", "rules"]}
+    score = np.clip(100.0 * (1 - (comps["velocity"]*0.2 + comps["gnn"]*0.35 + comps["anomaly"]*0.35)), 0.0, 100.0)
+    components = ('{"velocity": ' + pd.Series(comps["velocity"]).astype(str) +
+                  ', "gnn": ' + pd.Series(comps["gnn"]).astype(str) +
+                  ', "anomaly": ' + pd.Series(comps["anomaly"]).astype(str) +
+                  ', "rules": ' + pd.Series(comps["rules"]).astype(str) + '}')
+    decision = np.where(score < 40,
+                        '{"flagged": true, "reason": "composite_score"}',
+                        '{"flagged": false, "reason": "composite_score"}')
+    return pd.DataFrame({
+        "log_id": uuid4_array(rng, n),
+        "user_id": _pick_users(rng, n),
+        "score": score.round(2),
+        "components": components,
+        "decision": decision,
+        "timestamp": recent_datetimes(rng, n, 90, _CTX["now"]),
+    })
+
+CHUNK_GENERATORS = {
+    "users": generate_users,
+    "transactions": generate_transactions,
+    "behavior_signals": generate_behavior_signals,
+    "feedback_loop": generate_feedback,
+    "trustscore_logs": generate_trustscore_logs,
+}
+
+def _generate_chunk(table, start, n, seed_seq, sample_n, fmt, table_dir, part):
+    """
+    Worker entry point: returns (CSV bytes, optional row sample).
+    Columnar formats are written by the worker itself and return no bytes.
+    """
+    rng = np.random.default_rng(seed_seq)
+    df = CHUNK_GENERATORS[table](rng, start, n)
+    sample = df.sample(n=min(sample_n, n), random_state=rng.integers(2 ** 31)) if sample_n else None
+    if fmt != "csv":
+        write_columnar_part(df, table, table_dir, part, fmt)
+        return None, sample
+    data = format_timestamps(df).to_csv(index=False, header=False).encode("utf-8")
+    return data, sample
+
+# ---------- GENERATORS (parent process) ----------
+def generate_collusion_graph(rng, user_ids, edges, now):
+    n_users = len(user_ids)
     # Add community clusters + some rings
     # Make a few dense clusters (fraud rings)
-    rings = []
-    for _ in range(max(3, int(len(users)/300))):
-        ring_size = random.randint(4, 12)
-        ring = random.sample(user_ids, ring_size)
-        rings.append(ring)
-        for i in range(len(ring)):
-            for j in range(i+1, len(ring)):
-                G.add_edge(ring[i], ring[j], weight=round(random.random(),3), relationship_type=random.choice(["frequent_txn","shared_wallet","shared_ip"]))
-    # Add random edges
-    while G.number_of_edges() < edges:
-        a, b = random.sample(user_ids, 2)
-        if G.has_edge(a,b): continue
-        G.add_edge(a, b, weight=round(random.random(),3), relationship_type=random.choice(["frequent_txn","shared_wallet","shared_ip","device_link"]))
-    # produce edge list
-    edges_list = []
-    for u,v,data in G.edges(data=True):
-        edges_list.append({
-            "edge_id": uid(),
-            "user_src": u,
-            "user_dest": v,
-            "relationship_type": data.get("relationship_type", "frequent_txn"),
-            "weight": data.get("weight", 1.0),
-            "last_interaction": recent_datetime(60).isoformat()
-        })
-    return edges_list
-
-def generate_escrow_ledger(txns, n):
-    ledger = []
-    prev_hash = None
-    sample_txns = random.sample(txns, min(n, len(txns)))
-    for t in sample_txns:
-        payload = f"{t['txn_id']}|{t['user_id']}|{t['amount']}|{t['timestamp']}"
-        txn_hash = hash_chain(prev_hash, payload)
-        entry = {
-            "block_id": None,  # fill sequentially later
-            "txn_hash": txn_hash,
-            "sender": t["user_id"],
-            "receiver": t["counterparty"] or t["user_id"],
-            "amount": t["amount"],
-            "prev_hash": prev_hash,
-            "timestamp": recent_datetime(30).isoformat(),
-            "status": random.choice(["held","released","disputed"]),
-            "dispute_reason": None
-        }
-        if entry["status"] == "disputed":
-            entry["dispute_reason"] = random.choice(["payer_claim","duplicate_txn","identity_mismatch"])
-        ledger.append(entry)
+    ring_src, ring_dst = [], []
+    for _ in range(max(3, int(n_users/300))):
+        ring = rng.choice(n_users, size=rng.integers(4, 13), replace=False)
+        i, j = np.triu_indices(len(ring), k=1)
+        ring_src.append(ring[i])
+        ring_dst.append(ring[j])
+    src, dst = np.concatenate(ring_src), np.concatenate(ring_dst)
+    pair_codes = np.minimum(src, dst).astype(np.int64) * n_users + np.maximum(src, dst)
+    pair_codes, first = np.unique(pair_codes, return_index=True)
+    rel = rng.choice(["frequent_txn","shared_wallet","shared_ip"], size=len(src))[first]
+
+    # Add random edges, drawn in vectorized rounds until the target is met
+    max_edges = n_users * (n_users - 1) // 2
+    target = min(edges, max_edges)
+    while len(pair_codes) < target:
+        need = target - len(pair_codes)
+        a = rng.integers(0, n_users, size=int(need * 1.2) + 16)
+        b = rng.integers(0, n_users, size=len(a))
+        keep = a != b
+        codes = np.minimum(a, b)[keep].astype(np.int64) * n_users + np.maximum(a, b)[keep]
+        codes = np.unique(codes)
+        codes = codes[~np.isin(codes, pair_codes)]
+        codes = rng.permutation(codes)[:need]
+        pair_codes = np.concatenate([pair_codes, codes])
+        rel = np.concatenate([rel, rng.choice(["frequent_txn","shared_wallet","shared_ip","device_link"], size=len(codes))])
+
+    n = len(pair_codes)
+    return pd.DataFrame({
+        "edge_id": uuid4_array(rng, n),
+        "user_src": user_ids[pair_codes // n_users].astype("<U36"),
+        "user_dest": user_ids[pair_codes % n_users].astype("<U36"),
+        "relationship_type": rel,
+        "weight": rng.random(n).round(3),
+        "last_interaction": recent_datetimes(rng, n, 60, now),
+    })
+
+def generate_escrow_ledger(rng, txn_sample, n, now):
+    # hash chain is inherently sequential; it runs over a bounded sample
+    sample = txn_sample.iloc[rng.permutation(len(txn_sample))[:n]].reset_index(drop=True)
+    n = len(sample)
+    timestamps = np.datetime_as_string(sample["timestamp"].to_numpy(), unit="us")
+    hashes, prev_hashes, prev_hash = [], [], None
+    for txn_id, user_id, amount, ts in zip(sample["txn_id"], sample["user_id"], sample["amount"], timestamps):
+        txn_hash = hash_chain(prev_hash, f"{txn_id}|{user_id}|{amount}|{ts}")
+        prev_hashes.append(prev_hash)
+        hashes.append(txn_hash)
         prev_hash = txn_hash
-    # assign block ids
-    for i, e in enumerate(ledger, start=1):
-        e["block_id"] = i
-    return ledger
-
-def generate_feedback(users, n):
-    feedbacks = []
-    user_ids = [u["user_id"] for u in users]
-    for _ in range(n):
-        a, b = random.sample(user_ids,2)
-        f = {
-            "feedback_id": uid(),
-            "user_id": a,
-            "target_user_id": b,
-            "feedback_type": random.choices(["green","red"], weights=[0.9,0.1])[0],
-            "remarks": None,
-            "timestamp": recent_datetime(60).isoformat()
-        }
-        if random.random() < 0.1:
-            f["remarks"] = F.sentence(nb_words=8)
-        feedbacks.append(f)
-    return feedbacks
-
-def generate_trustscore_logs(users, n):
-    logs = []
-    user_ids = [u["user_id"] for u in users]
-    for _ in range(n):
-        uid_choice = random.choice(user_ids)
-        comps = {
-            "velocity": round(random.random(),4),
-            "gnn": round(random.random(),4),
-            "anomaly": round(random.random(),4),
-            "rules": round(random.random(),4)
-        }
-        score = max(0.0, min(100.0, 100.0 * (1 - (comps["velocity"]*0.2 + comps["gnn"]*0.35 + comps["anomaly"]*0.35))))
-        logs.append({
-            "log_id": uid(),
-            "user_id": uid_choice,
-            "score": round(score,2),
-            "components": json.dumps(comps),
-            "decision": json.dumps({"flagged": score < 40, "reason": "composite_score"}),
-            "timestamp": recent_datetime(90).isoformat()
-        })
-    return logs
-
-def generate_audit_trail(users, txns, n):
-    audits = []
-    entities = ["users","transactions","trustscore_logs","escrow_ledger","feedback_loop"]
-    for _ in range(n):
-        ent = random.choice(entities)
-        ent_id = uid() if ent!="transactions" else random.choice(txns)["txn_id"]
-        audits.append({
-            "audit_id": uid(),
-            "entity": ent,
-            "entity_id": ent_id,
-            "action": random.choice(["create","update","delete","flag","override"]),
-            "performed_by": random.choice(["system","admin",random.choice(users)["user_id"]]),
-            "details": json.dumps({"note": F.sentence(nb_words=6)}),
-            "timestamp": recent_datetime(120).isoformat()
-        })
-    return audits
+    status = rng.choice(["held","released","disputed"], size=n)
+    dispute = pd.Series(rng.choice(["payer_claim","duplicate_txn","identity_mismatch"], size=n), dtype=object)
+    dispute[status != "disputed"] = None
+    return pd.DataFrame({
+        "block_id": np.arange(1, n + 1),
+        "txn_hash": hashes,
+        "sender": sample["user_id"],
+        "receiver": sample["counterparty"].fillna(sample["user_id"]),
+        "amount": sample["amount"],
+        "prev_hash": prev_hashes,
+        "timestamp": recent_datetimes(rng, n, 30, now),
+        "status": status,
+        "dispute_reason": dispute,
+    })
+
+def generate_audit_trail(rng, user_ids, txn_sample, vocab, n, now):
+    entities = np.array(["users","transactions","trustscore_logs","escrow_ledger","feedback_loop"])
+    entity = entities[rng.integers(0, len(entities), size=n)]
+    entity_id = np.where(entity == "transactions",
+                         txn_sample["txn_id"].to_numpy()[rng.integers(0, len(txn_sample), size=n)],
+                         uuid4_array(rng, n))
+    actor = rng.integers(0, 3, size=n)
+    performed_by = np.where(actor == 0, "system",
+                            np.where(actor == 1, "admin", user_ids[rng.integers(0, len(user_ids), size=n)].astype("<U36")))
+    return pd.DataFrame({
+        "audit_id": uuid4_array(rng, n),
+        "entity": entity,
+        "entity_id": entity_id,
+        "action": rng.choice(["create","update","delete","flag","override"], size=n),
+        "performed_by": performed_by,
+        "details": vocab["audit_details"][rng.integers(0, SENTENCE_POOL_SIZE, size=n)],
+        "timestamp": recent_datetimes(rng, n, 120, now),
+    })
 
 # ---------- OpenAI helpers (if enabled) ----------
-def gpt_generate_collusion_description(cluster_users):
+def make_openai_client():
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    load_dotenv(dotenv_path="./deployment_config/.env")
+    try:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise RuntimeError("OPENAI_API_KEY not set in environment")
+        return OpenAI(api_key=openai_api_key)
+    except Exception as e:
+        print(f"OpenAI unavailable: {e}. Proceeding without OpenAI.")
+        return None
+
+def gpt_generate_collusion_description(client, cluster_users):
     """Use OpenAI to generate a short human-friendly description of a collusion cluster."""
-    if not USE_OPENAI:
+    if client is None:
         return f"Collusion cluster with {len(cluster_users)} suspicious accounts."
     prompt = f"Write a 2-sentence audit-friendly description for a collusion cluster of {len(cluster_users)} users. Example user_ids: {cluster_users[:5]} ... Keep it formal and concise."
     try:
@@ -402,10 +507,10 @@ def gpt_generate_collusion_description(cluster_users):
         print("OpenAI GPT error:", e)
         return f"Collusion cluster with {len(cluster_users)} suspicious accounts."
 
-def openai_embed_texts(texts, batch_size=OPENAI_BATCH):
-    if not USE_OPENAI:
+def openai_embed_texts(client, rng, texts, batch_size=OPENAI_BATCH):
+    if client is None:
         # fallback: generate random vectors (consistent)
-        return [np.round(np.random.normal(size=768).tolist(), 6) for _ in range(len(texts))]
+        return rng.normal(size=(len(texts), EMBED_DIM)).round(6).tolist()
     embeddings = []
     for i in range(0, len(texts), batch_size):
         batch = texts[i:i+batch_size]
@@ -419,139 +524,244 @@ def openai_embed_texts(texts, batch_size=OPENAI_BATCH):
         except Exception as e:
             print("OpenAI embedding error:", e)
             # fallback to random
-            embeddings.extend([np.round(np.random.normal(size=768).tolist(), 6) for _ in batch])
+            embeddings.extend(rng.normal(size=(len(batch), EMBED_DIM)).round(6).tolist())
     return embeddings
 
 # ---------- EXPORTERS ----------
-def write_csv(path, rows, headers):
-    with open(path, "w", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-        writer.writeheader()
-        for r in rows:
-            # flatten any None to empty strings for CSV
-            clean = {k: ("" if r.get(k) is None else r.get(k)) for k in headers}
-            writer.writerow(clean)
+def format_timestamps(df):
+    """ISO-format datetime columns in C; to_csv(date_format=...) calls strftime per value"""
+    df = df.copy(deep=False)
+    for col in df.select_dtypes(include="datetime").columns:
+        df[col] = np.datetime_as_string(df[col].to_numpy(), unit="us")
+    return df
+
+def write_csv(path, df, headers, mode="w"):
+    # None/NaN become empty strings, as psql COPY ... CSV expects
+    format_timestamps(df).to_csv(path, mode=mode, columns=headers, index=False, header=(mode == "w"))
+
+def write_columnar_part(df, table, table_dir, part, fmt):
+    """
+    Write one chunk as typed Parquet/Arrow IPC files, one per month partition
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+
+    df = df.copy(deep=False)
+    for col in ENUM_COLUMNS.get(table, []):
+        df[col] = df[col].astype("category")
+    if table in SORT_COLUMNS:
+        df = df.sort_values(SORT_COLUMNS[table], kind="stable")
+
+    if table in PARTITION_COLUMNS:
+        months = df[PARTITION_COLUMNS[table]].dt.strftime("%Y-%m")
+        groups = [(f"month={month}", group) for month, group in df.groupby(months, sort=True)]
+    else:
+        groups = [("", df)]
+
+    for subdir, group in groups:
+        tbl = pa.Table.from_pandas(group, preserve_index=False)
+        # all-null columns (e.g. risk_flag) would otherwise get Arrow's null type
+        for i, field in enumerate(tbl.schema):
+            if pa.types.is_null(field.type):
+                tbl = tbl.set_column(i, field.name, tbl.column(i).cast(pa.string()))
+        out_dir = os.path.join(table_dir, subdir)
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"part-{part:05d}.{FILE_EXTENSIONS[fmt]}")
+        if fmt == "parquet":
+            pq.write_table(tbl, path, row_group_size=64 * 1024, compression="zstd")
+        else:
+            feather.write_feather(tbl, path, compression="lz4")
+
+def write_table(dest, df, table, fmt, part=0):
+    if fmt == "csv":
+        write_csv(dest, df, TABLE_HEADERS[table], mode="w" if part == 0 else "a")
+    else:
+        write_columnar_part(df, table, dest, part, fmt)
 
 def write_json(path, obj):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(obj, f, indent=2, default=str)
 
+def stream_table(executor, path, table, total_rows, chunk_rows, seed, max_in_flight, sample_rows=0, fmt="csv"):
+    """
+    Generate a table chunk-by-chunk on the pool and append chunks to path in order
+    (for columnar formats, path is the table directory and workers write parts).
+    Returns:
+        concatenated row sample (sample_rows in total), or None
+    """
+    n_chunks = max(1, -(-total_rows // chunk_rows))
+    seeds = np.random.SeedSequence([seed, TABLE_SEED_KEYS[table]]).spawn(n_chunks)
+    samples, in_flight = [], deque()
+
+    def drain_one(f):
+        data, sample = in_flight.popleft().result()
+        if data is not None:
+            f.write(data)
+        if sample is not None:
+            samples.append(sample)
+
+    with open(path, "wb") if fmt == "csv" else open(os.devnull, "wb") as f:
+        if fmt == "csv":
+            f.write((",".join(TABLE_HEADERS[table]) + "\n").encode("utf-8"))
+        for i in range(n_chunks):
+            start = i * chunk_rows
+            n = min(chunk_rows, total_rows - start)
+            chunk_sample = -(-sample_rows * n // total_rows) if sample_rows else 0
+            in_flight.append(executor.submit(_generate_chunk, table, start, n, seeds[i], chunk_sample,
+                                             fmt, path, i))
+            if len(in_flight) >= max_in_flight:
+                drain_one(f)
+        while in_flight:
+            drain_one(f)
+    return pd.concat(samples, ignore_index=True) if samples else None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic FundWise dataset")
+    parser.add_argument("--outdir", default="dataset", help="output directory")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier on all table sizes (1 = 30k transactions)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="generator processes")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows generated per task")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv",
+                        help="csv for psql COPY; parquet/arrow for typed, partitioned analytics reads")
+    parser.add_argument("--as-of", default=None,
+                        help="reference 'now' (ISO) for timestamps; fix it for reproducible output")
+    parser.add_argument("--use-openai", action="store_true",
+                        help="GPT cluster descriptions and real embeddings (needs OPENAI_API_KEY)")
+    parser.add_argument("--skip-embeddings", action="store_true", help="do not write vector_db JSONs")
+    return parser.parse_args()
+
 # ---------- MAIN ----------
 def main():
-    print("Generating users...")
-    users = generate_users(NUM_USERS)
-    print("Generating transactions...")
-    txns = generate_transactions(users, NUM_TXNS)
-    print("Generating behavior signals...")
-    behaviors = generate_behavior_signals(users, NUM_BEHAVIOR)
+    args = parse_args()
+    start_time = time.perf_counter()
+    pg_dir = os.path.join(args.outdir, "postgres")
+    vec_dir = os.path.join(args.outdir, "vector_db")
+    os.makedirs(pg_dir, exist_ok=True)
+    os.makedirs(vec_dir, exist_ok=True)
+
+    def scaled(n):
+        return max(2, int(round(n * args.scale)))
+
+    sizes = {
+        "users": scaled(NUM_USERS),
+        "transactions": scaled(NUM_TXNS),
+        "behavior_signals": scaled(NUM_BEHAVIOR),
+        "collusion_graph": scaled(NUM_EDGES),
+        "escrow_ledger": scaled(NUM_ESCROW),
+        "feedback_loop": scaled(NUM_FEEDBACK),
+        "trustscore_logs": scaled(NUM_TRUST_LOGS),
+        "audit_trail": scaled(NUM_AUDIT),
+    }
+    now = np.datetime64(args.as_of or datetime.utcnow().isoformat(), "us")
+    root_rng = np.random.default_rng(np.random.SeedSequence([args.seed, len(TABLE_SEED_KEYS)]))
+
+    client = make_openai_client() if args.use_openai else None
+    vocab = build_vocab(args.seed)
+    user_ids = uuid4_array(root_rng, sizes["users"]).astype("S36")
+    fmt = args.format
+    if fmt == "csv":
+        paths = {table: os.path.join(pg_dir, f"{table}.csv") for table in TABLE_HEADERS}
+    else:
+        paths = {table: os.path.join(pg_dir, table) for table in TABLE_HEADERS}
+        for path in paths.values():
+            # stale parts from an earlier run would silently join the dataset
+            shutil.rmtree(path, ignore_errors=True)
+
+    # bound memory: at most two chunks per worker are pending at any time
+    max_in_flight = 2 * max(1, args.workers)
+    txn_sample_rows = max(NUM_ESCROW, NUM_TXN_EMB, sizes["escrow_ledger"])
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(user_ids, vocab, now)) as executor:
+        for table in ["users", "transactions", "behavior_signals", "feedback_loop", "trustscore_logs"]:
+            print(f"Generating {table} ({sizes[table]} rows)...")
+            sample = stream_table(executor, paths[table], table, sizes[table], args.chunk_rows, args.seed,
+                                  max_in_flight, sample_rows=txn_sample_rows if table == "transactions" else 0,
+                                  fmt=fmt)
+            if table == "transactions":
+                txn_sample = sample
+
     print("Generating collusion graph edges...")
-    edges = generate_collusion_graph(users, NUM_EDGES)
+    edges = generate_collusion_graph(root_rng, user_ids, sizes["collusion_graph"], now)
+    write_table(paths["collusion_graph"], edges, "collusion_graph", fmt)
     print("Generating escrow ledger...")
-    ledger = generate_escrow_ledger(txns, NUM_ESCROW)
-    print("Generating feedback entries...")
-    feedbacks = generate_feedback(users, NUM_FEEDBACK)
-    print("Generating trustscore logs...")
-    logs = generate_trustscore_logs(users, NUM_TRUST_LOGS)
+    ledger = generate_escrow_ledger(root_rng, txn_sample, sizes["escrow_ledger"], now)
+    write_table(paths["escrow_ledger"], ledger, "escrow_ledger", fmt)
     print("Generating audit trail entries...")
-    audits = generate_audit_trail(users, txns, NUM_AUDIT)
-
-    # If USE_OPENAI: generate cluster descriptions (optional)
-    cluster_descs = []
-    if USE_OPENAI:
+    for i, start in enumerate(range(0, sizes["audit_trail"], args.chunk_rows)):
+        n = min(args.chunk_rows, sizes["audit_trail"] - start)
+        audits = generate_audit_trail(root_rng, user_ids, txn_sample, vocab, n, now)
+        write_table(paths["audit_trail"], audits, "audit_trail", fmt, part=i)
+
+    # If --use-openai: generate cluster descriptions (optional)
+    if client is not None:
+        import networkx as nx
         # find some dense subgraphs (fraud rings) and describe
         G = nx.Graph()
-        G.add_nodes_from([u["user_id"] for u in users])
-        for e in edges[:min(1000,len(edges))]:
-            G.add_edge(e["user_src"], e["user_dest"])
+        G.add_nodes_from(user_ids.astype("<U36"))
+        G.add_edges_from(zip(edges["user_src"][:1000], edges["user_dest"][:1000]))
         # find communities
         comps = list(nx.algorithms.community.greedy_modularity_communities(G))
+        cluster_descs = []
         for c in comps[:10]:
             sample = list(c)[:20]
-            d = gpt_generate_collusion_description(sample)
-            cluster_descs.append({"members": sample, "description": d})
-
-    # Embeddings generation
-    # Build user textual contexts for embeddings
-    print("Preparing user textual contexts for embeddings...")
-    user_texts = []
-    for u in users:
-        txt = f"User {u['name']}, kyc:{u['kyc_id']}, risk:{u['risk_level']}, credibility:{u['credibility_score']:.3f}"
-        user_texts.append(txt)
-    print("Generating user embeddings (may call OpenAI)...")
-    user_embeddings = openai_embed_texts(user_texts)  # list of vectors
-
-    # Transaction embeddings: sample some txns
-    print("Preparing txn texts for embeddings...")
-    txn_sample = random.sample(txns, min(NUM_TXN_EMB, len(txns)))
-    txn_texts = [f"Txn {t['txn_id']} user {t['user_id']} amount {t['amount']} channel {t['channel']}" for t in txn_sample]
-    print("Generating txn embeddings (may call OpenAI)...")
-    txn_embeddings = openai_embed_texts(txn_texts)
-
-    # write CSVs
-    print("Writing CSVs...")
-    # users
-    users_path = os.path.join(PG_DIR, "users.csv")
-    write_csv(users_path, users, ["user_id","name","kyc_id","mobile","email","device_id","created_at","risk_level","credibility_score","is_flagged","last_login"])
-
-    txns_path = os.path.join(PG_DIR, "transactions.csv")
-    write_csv(txns_path, txns, ["txn_id","user_id","txn_type","amount","timestamp","counterparty","status","risk_flag","channel","ip_address","device_id"])
-
-    beh_path = os.path.join(PG_DIR, "behavior_signals.csv")
-    write_csv(beh_path, behaviors, ["signal_id","user_id","device_pattern_score","geo_distance_score","txn_velocity","anomaly_flag","ip_address","created_at"])
-
-    edges_path = os.path.join(PG_DIR, "collusion_graph.csv")
-    write_csv(edges_path, edges, ["edge_id","user_src","user_dest","relationship_type","weight","last_interaction"])
-
-    escrow_path = os.path.join(PG_DIR, "escrow_ledger.csv")
-    write_csv(escrow_path, ledger, ["block_id","txn_hash","sender","receiver","amount","prev_hash","timestamp","status","dispute_reason"])
-
-    fb_path = os.path.join(PG_DIR, "feedback_loop.csv")
-    write_csv(fb_path, feedbacks, ["feedback_id","user_id","target_user_id","feedback_type","remarks","timestamp"])
-
-    logs_path = os.path.join(PG_DIR, "trustscore_logs.csv")
-    write_csv(logs_path, logs, ["log_id","user_id","score","components","decision","timestamp"])
-
-    audit_path = os.path.join(PG_DIR, "audit_trail.csv")
-    write_csv(audit_path, audits, ["audit_id","entity","entity_id","action","performed_by","details","timestamp"])
+            cluster_descs.append({"members": sample, "description": gpt_generate_collusion_description(client, sample)})
+        write_json(os.path.join(vec_dir, "collusion_cluster_descriptions.json"), cluster_descs)
+
+    if not args.skip_embeddings:
+        # Embeddings generation: users are re-read from the first rows of the users table
+        print("Preparing user textual contexts for embeddings...")
+        if fmt == "csv":
+            users_head = pd.read_csv(paths["users"], nrows=NUM_USER_EMB)
+        else:
+            import pyarrow.dataset as ds
+            users_head = ds.dataset(paths["users"], format="parquet" if fmt == "parquet" else "ipc").head(NUM_USER_EMB).to_pandas()
+        user_texts = [f"User {u.name}, kyc:{u.kyc_id}, risk:{u.risk_level}, credibility:{u.credibility_score:.3f}"
+                      for u in users_head.itertuples()]
+        print("Generating user embeddings (may call OpenAI)...")
+        user_embeddings = openai_embed_texts(client, root_rng, user_texts)
+
+        print("Preparing txn texts for embeddings...")
+        txn_emb_sample = txn_sample.head(NUM_TXN_EMB)
+        txn_texts = [f"Txn {t.txn_id} user {t.user_id} amount {t.amount} channel {t.channel}"
+                     for t in txn_emb_sample.itertuples()]
+        print("Generating txn embeddings (may call OpenAI)...")
+        txn_embeddings = openai_embed_texts(client, root_rng, txn_texts)
+
+        print("Writing vector DB JSONs...")
+        source = "gpt-hybrid" if client is not None else "synthetic"
+        ts = datetime.utcnow().isoformat()
+        write_json(os.path.join(vec_dir, "user_behavior_embeddings.json"),
+                   [{"user_id": u, "embedding": emb, "source": source, "timestamp": ts}
+                    for u, emb in zip(users_head["user_id"], user_embeddings)])
+        write_json(os.path.join(vec_dir, "txn_embeddings.json"),
+                   [{"txn_id": t, "embedding": emb, "source": source, "timestamp": ts}
+                    for t, emb in zip(txn_emb_sample["txn_id"], txn_embeddings)])
 
     # create SQL files
-    create_sql_path = os.path.join(PG_DIR, "create_tables.sql")
+    create_sql_path = os.path.join(pg_dir, "create_tables.sql")
     with open(create_sql_path, "w", encoding="utf-8") as f:
         f.write(CREATE_TABLES_SQL)
 
-    load_sql_path = os.path.join(PG_DIR, "load_data.sql")
-    with open(load_sql_path, "w", encoding="utf-8") as f:
-        f.write("-- Use psql or COPY to load CSVs\n")
-        f.write("BEGIN;\n")
-        f.write(f"COPY users FROM '{os.path.abspath(users_path)}' CSV HEADER;\n")
-        f.write(f"COPY transactions FROM '{os.path.abspath(txns_path)}' CSV HEADER;\n")
-        f.write(f"COPY behavior_signals FROM '{os.path.abspath(beh_path)}' CSV HEADER;\n")
-        f.write(f"COPY collusion_graph FROM '{os.path.abspath(edges_path)}' CSV HEADER;\n")
-        f.write(f"COPY escrow_ledger FROM '{os.path.abspath(escrow_path)}' CSV HEADER;\n")
-        f.write(f"COPY feedback_loop FROM '{os.path.abspath(fb_path)}' CSV HEADER;\n")
-        f.write(f"COPY trustscore_logs FROM '{os.path.abspath(logs_path)}' CSV HEADER;\n")
-        f.write(f"COPY audit_trail FROM '{os.path.abspath(audit_path)}' CSV HEADER;\n")
-        f.write("COMMIT;\n")
-
-    # write embeddings JSON for vector DB
-    print("Writing vector DB JSONs...")
-    user_vecs = []
-    for u, emb in zip(users, user_embeddings):
-        user_vecs.append({"user_id": u["user_id"], "embedding": emb, "source": "gpt-hybrid", "timestamp": now_ts()})
-    write_json(os.path.join(VEC_DIR, "user_behavior_embeddings.json"), user_vecs)
-
-    txn_vecs = []
-    for t, emb in zip(txn_sample, txn_embeddings):
-        txn_vecs.append({"txn_id": t["txn_id"], "embedding": emb, "source": "gpt-hybrid", "timestamp": now_ts()})
-    write_json(os.path.join(VEC_DIR, "txn_embeddings.json"), txn_vecs)
+    if fmt == "csv":
+        load_sql_path = os.path.join(pg_dir, "load_data.sql")
+        with open(load_sql_path, "w", encoding="utf-8") as f:
+            f.write("-- Use psql or COPY to load CSVs\n")
+            f.write("BEGIN;\n")
+            for table, path in paths.items():
+                f.write(f"COPY {table} FROM '{os.path.abspath(path)}' CSV HEADER;\n")
+            f.write("COMMIT;\n")
 
     # README
-    with open(os.path.join(OUTDIR, "README.md"), "w", encoding="utf-8") as f:
+    with open(os.path.join(args.outdir, "README.md"), "w", encoding="utf-8") as f:
         f.write("# FundWise Dataset\n\n")
-        f.write("Generated by generate_fundwise_data.py\n\n")
-        f.write(f"Users: {len(users)}\\nTransactions: {len(txns)}\\nBehavior signals: {len(behaviors)}\\nEdges: {len(edges)}\\nEscrow: {len(ledger)}\\nFeedback: {len(feedbacks)}\\nTrust logs: {len(logs)}\\nAudit: {len(audits)}\\n")
+        f.write(f"Generated by generate_fundwise_data.py (scale={args.scale}, seed={args.seed}, format={fmt})\n\n")
+        for table, n in sizes.items():
+            f.write(f"- {table}: {len(edges) if table == 'collusion_graph' else n}\n")
 
-    print("Done. Files written to:", os.path.abspath(OUTDIR))
+    print(f"Done in {time.perf_counter() - start_time:.1f}s. Files written to:", os.path.abspath(args.outdir))
 
 
 if __name__ == "__main__":
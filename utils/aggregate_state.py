@@ -0,0 +1,301 @@
+"""
+aggregate_state.py
+-------------------
+Mergeable per-key aggregate state for incremental feature computation.
+
+A partial state is a DataFrame indexed by key (e.g. user_id) with the columns
+    count, sum, m2, min, max, last_ts
+where m2 is the sum of squared deviations from the key's mean. Unlike a raw
+sum of squares, m2 merges without catastrophic cancellation (Chan et al.):
+
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    m2 = m2_a + m2_b + delta^2 * n_a * n_b / n
+
+The accumulated state is an AggregateState: a key -> row dict over
+preallocated field arrays that grow geometrically, so merging a partial costs
+O(partial) no matter how many keys have been seen.
+
+Typical flow:
+    state = empty_aggregates()
+    state = merge_aggregates(state, partial_aggregates(batch, "user_id", "amount", "timestamp"))
+    features = finalize_aggregates(state)
+
+Partials computed on different workers merge the same way, in any order.
+
+Exactness: with scale set (e.g. 100 for amounts in paise, 10**6 for
+durations in microseconds) values are aggregated as whole numbers of
+1/scale units. Their sums stay exactly representable in float64 below
+2**53 units, so count, sum, mean, min and max come out bit-identical
+however the rows are split into batches, chunks or workers, and
+finalize_aggregates over a single partial is the batch result. m2 (and so
+std) is merged in floating point and agrees across splits to about 1e-12
+relative, not bitwise. A state remembers its scale; merging partials of
+another scale raises ValueError.
+"""
+
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+AGG_FIELDS = ["count", "sum", "m2", "min", "max", "last_ts"]
+AGG_DTYPES = {
+    "count": "int64",
+    "sum": "float64",
+    "m2": "float64",
+    "min": "float64",
+    "max": "float64",
+    "last_ts": "datetime64[ns]",
+}
+
+
+def _empty_frame(index_name: str) -> pd.DataFrame:
+    state = pd.DataFrame({f: pd.Series(dtype=AGG_DTYPES[f]) for f in AGG_FIELDS})
+    state.index.name = index_name
+    return state
+
+
+class AggregateState:
+    """
+    Accumulated per-key aggregates.
+
+    Rows live in preallocated arrays, one per field, that double when full;
+    a dict maps each key to its row. Known keys are merged in place, unseen
+    keys take the next free rows, and nothing is reindexed or copied.
+    """
+
+    # class-level default: states pickled before scales existed hold unscaled values
+    scale = None
+
+    def __init__(self, index_name: str = "user_id", initial_capacity: int = 1024, scale: Optional[int] = None):
+        self.index_name = index_name
+        self.scale = scale
+        self._rows = {}
+        self._keys = []
+        capacity = max(int(initial_capacity), 1)
+        self._arrays = {f: np.empty(capacity, dtype=AGG_DTYPES[f]) for f in AGG_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def empty(self) -> bool:
+        return not self._keys
+
+    def _reserve(self, size: int):
+        capacity = len(self._arrays["count"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        used = len(self._keys)
+        for f, values in self._arrays.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:used] = values[:used]
+            self._arrays[f] = grown
+
+    def merge(self, other: Union[pd.DataFrame, "AggregateState"]) -> "AggregateState":
+        """
+        Merge a partial state (unique keys, as built by partial_aggregates)
+        or another AggregateState into this one, in place.
+
+        Args:
+            other: partial state of a new batch or another worker
+
+        Returns:
+            AggregateState: self
+        """
+        if isinstance(other, AggregateState):
+            other = other.to_frame()
+        if other.empty:
+            return self
+        other_scale = other.attrs.get("scale")
+        if self.empty:
+            self.scale = other_scale
+        elif other_scale != self.scale:
+            raise ValueError(f"Cannot merge aggregates of scale {other_scale} into a state of scale "
+                             f"{self.scale}; rebuild the state from the source data")
+        keys = other.index.tolist()
+        rows = self._rows
+        positions = np.fromiter((rows.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+        incoming = {f: other[f].to_numpy(dtype=AGG_DTYPES[f]) for f in AGG_FIELDS}
+        hit = positions >= 0
+        if hit.any():
+            pos = positions[hit]
+            merged = _merge_arrays({f: self._arrays[f][pos] for f in AGG_FIELDS},
+                                   {f: incoming[f][hit] for f in AGG_FIELDS})
+            for f in AGG_FIELDS:
+                self._arrays[f][pos] = merged[f]
+        if not hit.all():
+            new = ~hit
+            new_keys = [k for k, seen in zip(keys, hit.tolist()) if not seen]
+            start = len(self._keys)
+            end = start + len(new_keys)
+            self._reserve(end)
+            for f in AGG_FIELDS:
+                self._arrays[f][start:end] = incoming[f][new]
+            rows.update(zip(new_keys, range(start, end)))
+            self._keys.extend(new_keys)
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: the state indexed by key, in first-seen order
+        """
+        used = len(self._keys)
+        if not used:
+            frame = _empty_frame(self.index_name)
+        else:
+            frame = pd.DataFrame({f: self._arrays[f][:used].copy() for f in AGG_FIELDS},
+                                 index=pd.Index(self._keys, name=self.index_name))
+        frame.attrs["scale"] = self.scale
+        return frame
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "AggregateState":
+        """
+        Build a state from its DataFrame form (e.g. a state pickled before
+        AggregateState existed).
+        """
+        state = cls(frame.index.name or "user_id", max(len(frame), 1024), frame.attrs.get("scale"))
+        return state.merge(frame)
+
+
+def empty_aggregates(index_name: str = "user_id", scale: Optional[int] = None) -> AggregateState:
+    """
+    Create an empty aggregate state.
+
+    Args:
+        index_name (str): name of the key the state is indexed by
+        scale (int): units per value of the partials it will hold (see partial_aggregates)
+
+    Returns:
+        AggregateState: state with no keys
+    """
+    return AggregateState(index_name, scale=scale)
+
+
+def partial_aggregates(
+    df: pd.DataFrame, key: str, value: str, time_col: Optional[str] = None, scale: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Aggregate one batch into a state, in a single groupby pass.
+
+    Args:
+        df (pd.DataFrame): batch of rows
+        key (str): grouping column
+        value (str): numeric column to aggregate (NaNs are ignored, as in pandas)
+        time_col (str): optional timestamp column tracked as last_ts
+        scale (int): aggregate round(value * scale) whole units, for sums that
+            do not depend on how rows are batched (finalize_aggregates scales back)
+
+    Returns:
+        pd.DataFrame: state indexed by key
+    """
+    values = pd.to_numeric(df[value], errors="coerce").to_numpy(dtype=np.float64)
+    if scale is not None:
+        values = np.rint(values * scale)
+    frame = pd.DataFrame({key: df[key].to_numpy(), "v": values})
+    if time_col is not None:
+        frame["ts"] = pd.to_datetime(df[time_col]).to_numpy()
+    grouped = frame.groupby(key, sort=False)
+    agg = grouped.agg(
+        count=("v", "count"),
+        sum=("v", "sum"),
+        var=("v", "var"),
+        min=("v", "min"),
+        max=("v", "max"),
+    )
+
+    state = _empty_frame(key).reindex(agg.index)
+    state["count"] = agg["count"].astype("int64")
+    state["sum"] = agg["sum"]
+    state["m2"] = (agg["var"] * (agg["count"] - 1)).fillna(0.0)
+    state["min"] = agg["min"]
+    state["max"] = agg["max"]
+    if time_col is not None:
+        state["last_ts"] = grouped["ts"].max().astype("datetime64[ns]")
+    state.attrs["scale"] = scale
+    return state
+
+
+def _merge_arrays(a: Dict[str, np.ndarray], b: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    n_a, n_b = a["count"], b["count"]
+    n = n_a + n_b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_a = np.where(n_a > 0, a["sum"] / n_a, 0.0)
+        mean_b = np.where(n_b > 0, b["sum"] / n_b, 0.0)
+        delta = mean_b - mean_a
+        m2 = a["m2"] + b["m2"] + np.where(n > 0, delta * delta * n_a * n_b / n, 0.0)
+    return {
+        "count": n,
+        "sum": a["sum"] + b["sum"],
+        "m2": m2,
+        "min": np.fmin(a["min"], b["min"]),
+        "max": np.fmax(a["max"], b["max"]),
+        # NaT-aware max: NaT compares as the smallest datetime64 integer
+        "last_ts": np.maximum(a["last_ts"].astype("int64"), b["last_ts"].astype("int64"))
+                     .astype("datetime64[ns]"),
+    }
+
+
+def merge_aggregates(state: Union[AggregateState, pd.DataFrame],
+                     other: Union[pd.DataFrame, AggregateState]) -> AggregateState:
+    """
+    Merge a partial state into an existing one.
+
+    Keys already present are updated in place and unseen keys are appended,
+    so the cost is proportional to the size of other.
+
+    Args:
+        state (AggregateState): accumulated state (modified in place); a
+            DataFrame state is converted first
+        other (pd.DataFrame): partial state of a new batch or another worker
+
+    Returns:
+        AggregateState: merged state
+    """
+    if not isinstance(state, AggregateState):
+        state = AggregateState.from_frame(state)
+    return state.merge(other)
+
+
+def finalize_aggregates(state: Union[AggregateState, pd.DataFrame], names: Optional[Dict[str, str]] = None,
+                        reset_index: bool = True, sort: bool = False) -> pd.DataFrame:
+    """
+    Turn a state into features.
+
+    Args:
+        state (AggregateState): aggregate state (or its DataFrame form)
+        names (dict): optional renames of the output columns
+            count, sum, mean, std, min, max, last_ts
+        reset_index (bool): return the key as a column
+        sort (bool): order rows by key instead of first-seen order
+
+    Returns:
+        pd.DataFrame: per-key features in value units (see the state's scale);
+            std is the sample std (ddof=1), 0 for single rows
+    """
+    if isinstance(state, AggregateState):
+        state = state.to_frame()
+    scale = state.attrs.get("scale") or 1
+    if sort:
+        state = state.sort_index()
+    count = state["count"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, state["sum"].to_numpy() / count, np.nan) / scale
+        std = np.where(count > 1, np.sqrt(np.maximum(state["m2"].to_numpy(), 0.0) / (count - 1)), 0.0) / scale
+    features = pd.DataFrame({
+        "count": count,
+        "sum": state["sum"].to_numpy() / scale,
+        "mean": mean,
+        "std": std,
+        "max": state["max"].to_numpy() / scale,
+        "min": state["min"].to_numpy() / scale,
+        "last_ts": state["last_ts"].to_numpy(),
+    }, index=state.index)
+    if names:
+        features = features.rename(columns=names)
+    return features.reset_index() if reset_index else features
@@ -0,0 +1,85 @@
+"""
+client_packages.py
+-------------------
+Makes the client_code services importable under their package names.
+
+Each service keeps its modules in client_code/<service>/src/main without an
+__init__.py, and modules import each other package-qualified, e.g.
+
+    from data_ingestion.transaction_log import SegmentedTransactionLog
+    from anomaly_detection.anomaly_detector import AnomalyDetector
+
+Entry points (the API app, scheduler scripts, the test suite) call
+register_client_packages() once before importing any service module. A
+module's demo block runs through this file:
+
+    python -m utils.client_packages data_ingestion.ingestion_scheduler
+
+Features:
+    - one import scheme for modules inside and across services
+    - no sys.path entry per service, so equally named modules cannot shadow each other
+    - package_call: run a service function in a freshly started worker process
+      (e.g. joblib's loky), which has not registered the packages itself
+"""
+
+import importlib
+import os
+import runpy
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_CODE_DIR = os.path.join(REPO_ROOT, "client_code")
+
+
+def register_client_packages(client_code_dir: str = CLIENT_CODE_DIR):
+    """
+    Register every client_code service as a namespace-style package.
+
+    Args:
+        client_code_dir (str): directory holding the service folders
+
+    Returns:
+        list: names of the registered packages
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    registered = []
+    for name in sorted(os.listdir(client_code_dir)):
+        main_dir = os.path.join(client_code_dir, name, "src", "main")
+        if not os.path.isdir(main_dir) or name in sys.modules:
+            continue
+        package = types.ModuleType(name)
+        package.__path__ = [main_dir]
+        package.__package__ = name
+        sys.modules[name] = package
+        registered.append(name)
+    return registered
+
+
+def package_call(module: str, name: str, *args, **kwargs):
+    """
+    Call module.name(*args, **kwargs), registering the client packages first.
+
+    Functions of a registered package pickle by reference to a module that a
+    spawned worker cannot import; this function lives in an importable
+    module, so hand it to the pool instead, e.g.
+
+        delayed(package_call)(__spec__.name, "_score_chunk", scaler, model, chunk)
+
+    Args:
+        module (str): package-qualified module name
+        name (str): attribute of the module to call
+
+    Returns:
+        the call's result
+    """
+    register_client_packages()
+    return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    register_client_packages()
+    # the module sees its own arguments, as with python -m <module> ...
+    module = sys.argv.pop(1)
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
@@ -0,0 +1,246 @@
+"""
+dataset_io.py
+--------------
+Shared reader for the FundWise datasets written by db/create_synthetic_data.py.
+
+Features:
+- Parquet / Arrow IPC table directories (hive-partitioned by month=YYYY-MM)
+- Column projection: only the requested columns are decoded
+- Predicate pushdown on user_id and on a time column: month partitions
+  outside the range are never opened and Parquet row groups are skipped
+  using their min/max statistics
+- CSV fallback with the same signature (chunked scan, filtered per chunk)
+- iter_table: fixed-size chunk streaming for out-of-core feature jobs, with
+  the chunk size derived from a memory budget ([FEATURES] CHUNK_MEMORY_MB)
+"""
+
+import os
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Union
+
+import pandas as pd
+from utils.common_exceptions import ConfigError, ValidationError
+from utils.config_loader import load_ini
+from utils.logger import get_logger
+
+logger = get_logger("DatasetIO")
+
+CSV_CHUNK_ROWS = 500_000
+PARTITION_KEY = "month"
+CONFIG_PATH = "deployment_config/main_config.ini"
+DEFAULT_CHUNK_MEMORY_MB = 512
+PROBE_ROWS = 10_000
+# a chunk in flight also holds its parsed columns and per-chunk aggregates
+WORKING_SET_FACTOR = 4
+
+TimeBound = Optional[Union[str, datetime, pd.Timestamp]]
+
+
+def detect_format(path: str) -> str:
+    """
+    Work out how a table is stored.
+
+    Args:
+        path (str): CSV file, single Parquet/Arrow file, or table directory
+
+    Returns:
+        str: "csv", "parquet" or "arrow"
+    """
+    if os.path.isdir(path):
+        for _, _, files in os.walk(path):
+            for name in files:
+                if name.endswith(".parquet"):
+                    return "parquet"
+                if name.endswith((".arrow", ".feather", ".ipc")):
+                    return "arrow"
+        raise ValidationError(f"No Parquet or Arrow files under {path}")
+    if path.endswith(".parquet"):
+        return "parquet"
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        return "arrow"
+    if path.endswith(".csv"):
+        return "csv"
+    raise ValidationError(f"Unsupported dataset path: {path}")
+
+
+def _month_bounds(start: TimeBound, end: TimeBound):
+    low = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+    high = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+    return low, high
+
+
+def _read_columnar(path: str, fmt: str, columns, user_ids, start, end,
+                   time_column, user_column) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc", partitioning="hive")
+    names = dataset.schema.names
+    has_months = PARTITION_KEY in names
+
+    predicate = None
+
+    def _and(expr):
+        return expr if predicate is None else predicate & expr
+
+    if has_months and (start is not None or end is not None):
+        # month=YYYY-MM strings sort chronologically, so whole files are pruned
+        low, high = _month_bounds(start, end)
+        if low is not None:
+            predicate = _and(ds.field(PARTITION_KEY) >= low)
+        if high is not None:
+            predicate = _and(ds.field(PARTITION_KEY) <= high)
+    if start is not None:
+        predicate = _and(ds.field(time_column) >= pd.Timestamp(start).to_pydatetime())
+    if end is not None:
+        predicate = _and(ds.field(time_column) <= pd.Timestamp(end).to_pydatetime())
+    if user_ids is not None:
+        predicate = _and(ds.field(user_column).isin(list(user_ids)))
+
+    if columns is None:
+        columns = [c for c in names if c != PARTITION_KEY]
+    table = dataset.to_table(columns=list(columns), filter=predicate)
+    return table.to_pandas()
+
+
+def _read_csv(path: str, columns, user_ids, start, end, time_column, user_column) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = list(columns) if columns is not None else list(header)
+    filter_cols = [c for c in (user_column if user_ids is not None else None,
+                               time_column if start is not None or end is not None else None) if c]
+    usecols = wanted + [c for c in filter_cols if c not in wanted]
+    parse_dates = [time_column] if time_column in usecols else None
+    user_set = set(map(str, user_ids)) if user_ids is not None else None
+    start_ts = pd.Timestamp(start) if start is not None else None
+    end_ts = pd.Timestamp(end) if end is not None else None
+
+    parts = []
+    for chunk in pd.read_csv(path, usecols=usecols, parse_dates=parse_dates, chunksize=CSV_CHUNK_ROWS):
+        mask = pd.Series(True, index=chunk.index)
+        if user_set is not None:
+            mask &= chunk[user_column].astype(str).isin(user_set)
+        if start_ts is not None:
+            mask &= chunk[time_column] >= start_ts
+        if end_ts is not None:
+            mask &= chunk[time_column] <= end_ts
+        parts.append(chunk.loc[mask, wanted])
+    if not parts:
+        return pd.DataFrame(columns=wanted)
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    user_ids: Optional[Iterable] = None,
+    start: TimeBound = None,
+    end: TimeBound = None,
+    time_column: str = "timestamp",
+    user_column: str = "user_id",
+) -> pd.DataFrame:
+    """
+    Read a table, decoding only the requested columns and matching rows.
+
+    Args:
+        path (str): table directory, Parquet/Arrow file or CSV file
+        columns (list): columns to return (default: all)
+        user_ids (iterable): keep only these users
+        start / end: inclusive bounds on time_column
+        time_column (str): column the time bounds apply to
+            (e.g. "created_at" for behavior_signals)
+        user_column (str): column user_ids applies to
+
+    Returns:
+        pd.DataFrame: filtered table with the requested columns
+
+    Raises:
+        ValidationError: if the path is not a supported dataset
+    """
+    if not os.path.exists(path):
+        raise ValidationError(f"Dataset not found: {path}")
+
+    fmt = detect_format(path)
+    if fmt == "csv":
+        logger.info(f"read_table: scanning CSV {path} (no pushdown available)")
+        return _read_csv(path, columns, user_ids, start, end, time_column, user_column)
+    return _read_columnar(path, fmt, columns, user_ids, start, end, time_column, user_column)
+
+
+def configured_chunk_memory_mb(config_path: str = CONFIG_PATH) -> int:
+    """
+    Memory budget of one out-of-core chunk, from [FEATURES] CHUNK_MEMORY_MB.
+
+    Args:
+        config_path (str): INI file to read
+
+    Returns:
+        int: budget in MiB (DEFAULT_CHUNK_MEMORY_MB if the file or key is missing)
+    """
+    try:
+        features = load_ini(config_path).get("FEATURES", {})
+    except ConfigError:
+        return DEFAULT_CHUNK_MEMORY_MB
+    return int(features.get("chunk_memory_mb", DEFAULT_CHUNK_MEMORY_MB))
+
+
+def chunk_rows_for_budget(path: str, columns: Optional[List[str]] = None,
+                          memory_mb: Optional[int] = None) -> int:
+    """
+    Rows per chunk that keep one chunk's working set within a memory budget.
+    The in-memory size of a row is measured on the first PROBE_ROWS rows.
+
+    Args:
+        path (str): table directory, Parquet/Arrow file or CSV file
+        columns (list): columns that will be read
+        memory_mb (int): budget in MiB (default: configured_chunk_memory_mb())
+
+    Returns:
+        int: rows per chunk
+    """
+    memory_mb = memory_mb or configured_chunk_memory_mb()
+    fmt = detect_format(path)
+    if fmt == "csv":
+        probe = pd.read_csv(path, usecols=columns, nrows=PROBE_ROWS)
+    else:
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc", partitioning="hive")
+        probe = dataset.head(PROBE_ROWS, columns=columns).to_pandas()
+    bytes_per_row = probe.memory_usage(deep=True).sum() / max(len(probe), 1)
+    rows = int(memory_mb * 2**20 / (max(bytes_per_row, 1.0) * WORKING_SET_FACTOR))
+    logger.info(f"chunk_rows_for_budget: {bytes_per_row:.0f} B/row -> {rows} rows per {memory_mb} MiB chunk")
+    return max(rows, 1)
+
+
+def iter_table(path: str, columns: Optional[List[str]] = None, chunk_rows: Optional[int] = None,
+               memory_mb: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream a table as DataFrames of at most chunk_rows rows, so only one
+    chunk is materialized at a time.
+
+    Args:
+        path (str): table directory, Parquet/Arrow file or CSV file
+        columns (list): columns to read (default: all)
+        chunk_rows (int): rows per chunk (default: derived from memory_mb)
+        memory_mb (int): memory budget per chunk (default: [FEATURES] CHUNK_MEMORY_MB)
+
+    Yields:
+        pd.DataFrame: consecutive chunks of the table
+    """
+    if not os.path.exists(path):
+        raise ValidationError(f"Dataset not found: {path}")
+    chunk_rows = chunk_rows or chunk_rows_for_budget(path, columns, memory_mb)
+    fmt = detect_format(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+        return
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc", partitioning="hive")
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c != PARTITION_KEY]
+    # no read-ahead: at most one decoded batch is alive besides the caller's chunk
+    for batch in dataset.to_batches(columns=list(columns), batch_size=chunk_rows,
+                                    batch_readahead=0, fragment_readahead=0):
+        if batch.num_rows:
+            yield batch.to_pandas()
@@ -0,0 +1,320 @@
+"""
+dataset_loader.py
+------------------
+Typed, memory-compact loading of the eight FundWise tables
+(see CREATE_TABLES_SQL in db/create_synthetic_data.py).
+
+Features:
+- Explicit per-table schema instead of read_csv type inference
+- Low-cardinality enums as categoricals, timestamps parsed once to datetime64
+- FLOAT scores downcast to float32
+- UUID references dictionary-encoded to int32 codes; user references of every
+  table share one codec, so codes join across tables and decode back to UUIDs.
+  Unique row ids (txn_id, signal_id, ...) stay strings: a codec entry per row
+  costs more than the string it replaces
+- Chunked raw -> typed conversion, so the untyped frame never exists in full
+- Per-table memory report (raw vs typed bytes, codec growth included)
+"""
+
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from utils.common_exceptions import ValidationError
+from utils.dataset_io import read_table
+from utils.logger import get_logger
+
+logger = get_logger("DatasetLoader")
+
+CHUNK_ROWS = 500_000
+
+# column kinds: uuid:<codec domain> | category | datetime | float32 | float64 | int32 | bool | string
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "users": {
+        "user_id": "uuid:user", "name": "string", "kyc_id": "string", "mobile": "string",
+        "email": "string", "device_id": "string", "created_at": "datetime",
+        "risk_level": "category", "credibility_score": "float32", "is_flagged": "bool",
+        "last_login": "datetime",
+    },
+    "transactions": {
+        "txn_id": "string", "user_id": "uuid:user", "txn_type": "category",
+        "amount": "float64", "timestamp": "datetime", "counterparty": "uuid:user",
+        "status": "category", "risk_flag": "category", "channel": "category",
+        "ip_address": "string", "device_id": "string",
+    },
+    "behavior_signals": {
+        "signal_id": "string", "user_id": "uuid:user", "device_pattern_score": "float32",
+        "geo_distance_score": "float32", "txn_velocity": "float32", "anomaly_flag": "bool",
+        "ip_address": "string", "created_at": "datetime",
+    },
+    "collusion_graph": {
+        "edge_id": "string", "user_src": "uuid:user", "user_dest": "uuid:user",
+        "relationship_type": "category", "weight": "float32", "last_interaction": "datetime",
+    },
+    "escrow_ledger": {
+        "block_id": "int32", "txn_hash": "string", "sender": "uuid:user", "receiver": "uuid:user",
+        "amount": "float64", "prev_hash": "string", "timestamp": "datetime",
+        "status": "category", "dispute_reason": "category",
+    },
+    "feedback_loop": {
+        "feedback_id": "string", "user_id": "uuid:user", "target_user_id": "uuid:user",
+        "feedback_type": "category", "remarks": "string", "timestamp": "datetime",
+    },
+    "trustscore_logs": {
+        "log_id": "string", "user_id": "uuid:user", "score": "float32",
+        "components": "string", "decision": "string", "timestamp": "datetime",
+    },
+    "audit_trail": {
+        "audit_id": "string", "entity": "category", "entity_id": "string",
+        "action": "category", "performed_by": "uuid:user", "details": "string",
+        "timestamp": "datetime",
+    },
+}
+
+# main time column per table, used for start/end filtering
+TIME_COLUMNS = {
+    "users": "created_at",
+    "transactions": "timestamp",
+    "behavior_signals": "created_at",
+    "collusion_graph": "last_interaction",
+    "escrow_ledger": "timestamp",
+    "feedback_loop": "timestamp",
+    "trustscore_logs": "timestamp",
+    "audit_trail": "timestamp",
+}
+
+
+class UUIDCodec:
+    """
+    Reversible UUID <-> int32 dictionary. Codes are assigned in first-seen
+    order and never change, so frames encoded at different times stay joinable.
+    Missing values encode to -1.
+    """
+
+    def __init__(self, values: Optional[Iterable[str]] = None):
+        self._values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._lookup = None
+        if values is not None:
+            self.encode(np.asarray(list(values), dtype=object))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def memory_usage(self) -> int:
+        """
+        Approximate bytes held by the dictionary (strings, list, dict, codes)
+        """
+        strings = sum(sys.getsizeof(v) for v in self._values)
+        codes = sys.getsizeof(2**31) * len(self._codes)
+        return strings + codes + sys.getsizeof(self._values) + sys.getsizeof(self._codes)
+
+    def encode(self, values) -> np.ndarray:
+        """
+        Encode an array-like of UUID strings to int32 codes, extending the
+        dictionary with unseen values.
+        """
+        local_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        # only the distinct values of the chunk touch the Python dict
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapping[-1] = -1
+        for i, value in enumerate(uniques):
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self._values)
+                self._values.append(value)
+            mapping[i] = code
+        if len(self._values) > np.iinfo(np.int32).max:
+            raise ValidationError("UUIDCodec overflow: more than 2**31 distinct values")
+        self._lookup = None
+        return mapping[local_codes]
+
+    def codes_for(self, values) -> np.ndarray:
+        """
+        Look up codes without extending the dictionary (-1 if unknown)
+        """
+        return np.fromiter((self._codes.get(v, -1) for v in values), dtype=np.int32)
+
+    def decode(self, codes) -> np.ndarray:
+        """
+        Map int32 codes back to UUID strings (None for -1)
+        """
+        if self._lookup is None or len(self._lookup) != len(self._values) + 1:
+            self._lookup = np.array(self._values + [None], dtype=object)
+        codes = np.asarray(codes)
+        return self._lookup[np.where(codes < 0, len(self._values), codes)]
+
+    def save(self, path: str):
+        np.save(path, np.array(self._values, dtype=str))
+
+    @classmethod
+    def load(cls, path: str) -> "UUIDCodec":
+        return cls(np.load(path).tolist())
+
+
+def _convert_chunk(chunk: pd.DataFrame, schema: Dict[str, str], codecs: Dict[str, UUIDCodec]) -> pd.DataFrame:
+    typed = {}
+    for col in chunk.columns:
+        kind = schema.get(col, "string")
+        values = chunk[col]
+        if kind.startswith("uuid:"):
+            typed[col] = codecs[kind[5:]].encode(values.astype(object).where(values.notna(), None))
+        elif kind == "category":
+            typed[col] = values.astype("category")
+        elif kind == "datetime":
+            typed[col] = values if pd.api.types.is_datetime64_any_dtype(values) \
+                else pd.to_datetime(values, format="ISO8601", errors="coerce")
+        elif kind in ("float32", "float64"):
+            typed[col] = pd.to_numeric(values, errors="coerce").astype(kind)
+        elif kind == "int32":
+            typed[col] = values.astype(np.int32)
+        elif kind == "bool":
+            typed[col] = values.astype(str).str.lower().eq("true") if values.dtype != bool else values
+        else:
+            typed[col] = values
+    return pd.DataFrame(typed, index=chunk.index)
+
+
+def _concat_typed(parts: List[pd.DataFrame], columns: List[str], schema: Dict[str, str]) -> pd.DataFrame:
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    out = {}
+    for col in columns:
+        if schema.get(col) == "category":
+            # plain concat falls back to object when chunk categories differ
+            out[col] = union_categoricals([p[col] for p in parts], ignore_order=True)
+        else:
+            out[col] = pd.concat([p[col] for p in parts], ignore_index=True)
+    return pd.DataFrame(out)
+
+
+class DatasetLoader:
+    """
+    Load FundWise tables with an explicit, compact schema.
+
+    Example:
+        loader = DatasetLoader("dataset/postgres")
+        txns = loader.load("transactions", columns=["user_id", "amount", "timestamp"])
+        txns["user_uuid"] = loader.decode("transactions", "user_id", txns["user_id"])
+    """
+
+    def __init__(self, data_dir: str, chunk_rows: int = CHUNK_ROWS):
+        """
+        Args:
+            data_dir (str): directory holding <table>.csv files or
+                <table>/ Parquet/Arrow directories
+            chunk_rows (int): rows converted per chunk when reading CSV
+        """
+        self.data_dir = data_dir
+        self.chunk_rows = chunk_rows
+        self.codecs: Dict[str, UUIDCodec] = {}
+        self.memory_report: Dict[str, Dict[str, int]] = {}
+
+    def _table_path(self, table: str) -> str:
+        if table not in TABLE_SCHEMAS:
+            raise ValidationError(f"Unknown table: {table}")
+        directory = os.path.join(self.data_dir, table)
+        if os.path.isdir(directory):
+            return directory
+        csv_path = os.path.join(self.data_dir, f"{table}.csv")
+        if os.path.exists(csv_path):
+            return csv_path
+        raise ValidationError(f"No data for table {table} in {self.data_dir}")
+
+    def codec(self, domain: str) -> UUIDCodec:
+        if domain not in self.codecs:
+            self.codecs[domain] = UUIDCodec()
+        return self.codecs[domain]
+
+    def _raw_chunks(self, path: str, table: str, columns, start, end):
+        time_column = TIME_COLUMNS[table]
+        if path.endswith(".csv"):
+            if start is not None or end is not None:
+                # the shared reader already filters CSV per chunk
+                yield read_table(path, columns=columns, start=start, end=end, time_column=time_column)
+                return
+            # everything as str: typing is done by the schema, not by inference
+            yield from pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=True,
+                                   chunksize=self.chunk_rows)
+        else:
+            yield read_table(path, columns=columns, start=start, end=end, time_column=time_column)
+
+    def load(self, table: str, columns: Optional[List[str]] = None,
+             start=None, end=None, report: bool = True) -> pd.DataFrame:
+        """
+        Load one table with its typed schema.
+
+        Args:
+            table (str): one of TABLE_SCHEMAS
+            columns (list): optional column projection
+            start / end: optional inclusive bounds on the table's time column
+            report (bool): measure raw vs typed memory (deep memory_usage per chunk)
+
+        Returns:
+            pd.DataFrame: typed table; UUID columns hold int32 codes
+        """
+        schema = TABLE_SCHEMAS[table]
+        path = self._table_path(table)
+        columns = list(columns) if columns is not None else list(schema)
+        codecs = {kind[5:]: self.codec(kind[5:]) for col, kind in schema.items()
+                  if col in columns and kind.startswith("uuid:")}
+
+        raw_bytes, parts = 0, []
+        codec_before = sum(codec.memory_usage() for codec in codecs.values()) if report else 0
+        for chunk in self._raw_chunks(path, table, columns, start, end):
+            if report:
+                raw_bytes += int(chunk.memory_usage(deep=True).sum())
+            parts.append(_convert_chunk(chunk[columns], schema, codecs))
+            del chunk
+        df = _concat_typed(parts, columns, schema)
+
+        if report:
+            # int32 codes are only compact if the dictionary behind them is counted too
+            codec_bytes = sum(codec.memory_usage() for codec in codecs.values()) - codec_before
+            typed_bytes = int(df.memory_usage(deep=True).sum()) + codec_bytes
+            self.memory_report[table] = {"rows": len(df), "raw_bytes": raw_bytes,
+                                         "typed_bytes": typed_bytes, "codec_bytes": codec_bytes}
+            logger.info(f"{table}: {len(df)} rows, {raw_bytes / 2**20:.1f} MiB raw -> "
+                        f"{typed_bytes / 2**20:.1f} MiB typed")
+        return df
+
+    def load_all(self, tables: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        return {table: self.load(table) for table in (tables or TABLE_SCHEMAS)}
+
+    def decode(self, table: str, column: str, codes) -> np.ndarray:
+        """
+        Turn int32 codes of a UUID column back into UUID strings
+        """
+        kind = TABLE_SCHEMAS[table].get(column, "")
+        if not kind.startswith("uuid:"):
+            raise ValidationError(f"{table}.{column} is not a UUID column")
+        return self.codec(kind[5:]).decode(codes)
+
+    def save_codecs(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for domain, codec in self.codecs.items():
+            codec.save(os.path.join(directory, f"{domain}.npy"))
+
+    def load_codecs(self, directory: str):
+        """
+        Restore codecs saved by an earlier run so new loads reuse the same codes
+        """
+        for name in os.listdir(directory):
+            if name.endswith(".npy"):
+                self.codecs[name[:-4]] = UUIDCodec.load(os.path.join(directory, name))
+
+
+if __name__ == "__main__":
+    import sys
+
+    loader = DatasetLoader(sys.argv[1] if len(sys.argv) > 1 else "dataset/postgres")
+    loader.load_all()
+    for table, stats in loader.memory_report.items():
+        ratio = stats["raw_bytes"] / max(stats["typed_bytes"], 1)
+        print(f"{table:18s} rows={stats['rows']:>10d}  raw={stats['raw_bytes'] / 2**20:9.1f} MiB  "
+              f"typed={stats['typed_bytes'] / 2**20:9.1f} MiB  ({ratio:.1f}x)")
@@ -8,6 +8,8 @@ General helper functions used across modules.
 from datetime import datetime, timezone
 import uuid
 
+import pandas as pd
+
 
 def now_iso() -> str:
     """
@@ -19,6 +21,44 @@ def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def to_utc_iso(value) -> str:
+    """
+    Normalize one timestamp to an ISO 8601 string in UTC.
+    Naive timestamps are taken to be UTC already.
+
+    Args:
+        value: ISO string, datetime or pd.Timestamp
+
+    Returns:
+        str: e.g. "2024-01-01T12:00:00+00:00"
+
+    Raises:
+        ValueError: if value is not a timestamp
+    """
+    ts = pd.Timestamp(value)
+    if ts is pd.NaT:
+        raise ValueError(f"Not a timestamp: {value!r}")
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.isoformat()
+
+
+def parse_utc_timestamps(values, errors: str = "raise") -> pd.Series:
+    """
+    Parse ISO 8601 timestamps of mixed formats and offsets into naive UTC.
+    Naive inputs are taken to be UTC already.
+
+    Args:
+        values: Series / sequence of ISO strings or datetimes
+        errors (str): "raise" or "coerce" (unparseable -> NaT)
+
+    Returns:
+        pd.Series: datetime64 without tz, on values' index if it is a Series
+    """
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values)
+    return pd.to_datetime(values, format="ISO8601", utc=True, errors=errors).dt.tz_localize(None)
+
+
 def generate_id(prefix: str = "") -> str:
     """
     Generate a unique ID with optional prefix.
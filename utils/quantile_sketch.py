@@ -0,0 +1,260 @@
+"""
+quantile_sketch.py
+-------------------
+Streaming, mergeable quantile estimation (t-digest).
+
+Features:
+- Constant memory: about `compression` centroids however many points were seen
+- Vectorized updates: points are buffered, then sorted together with the
+  centroids and bucketed by floor(k(q)) on the arcsine k-scale, so every
+  compression pass is a sort plus a couple of bincounts
+- Accurate tails: the k-scale keeps centroids tiny near q=0 and q=1,
+  which is where large-transaction thresholds live
+- Mergeable and serializable, so workers build digests independently and
+  the results combine into one
+- QuantileSketchStore: a global digest plus one per group value
+  (e.g. per fund_id and per channel)
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class TDigest:
+    """
+    Merging t-digest with a vectorized compression step.
+    """
+
+    def __init__(self, compression: float = 200.0, buffer_size: int = 8192):
+        """
+        Args:
+            compression (float): size/accuracy trade-off (~compression centroids)
+            buffer_size (int): points buffered before a compression pass
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + self._buffered
+
+    def add_many(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def add(self, value: float):
+        self.add_many([value])
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        parts_m, parts_w = [self.means], [self.weights]
+        if self._buffer:
+            points = np.concatenate(self._buffer)
+            parts_m.append(points)
+            parts_w.append(np.ones(len(points)))
+        if extra_means is not None:
+            parts_m.append(extra_means)
+            parts_w.append(extra_weights)
+        self._buffer, self._buffered = [], 0
+
+        means, weights = np.concatenate(parts_m), np.concatenate(parts_w)
+        if not len(means):
+            return
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        total = weights.sum()
+        cum = np.cumsum(weights)
+        q_mid = (cum - weights / 2) / total
+        # k1 scale: k(q) = delta / (2 pi) * asin(2q - 1); one unit of k per centroid
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_mid - 1, -1.0, 1.0))
+        buckets = np.floor(k).astype(np.int64)
+        # sorted input -> non-decreasing buckets; renumber densely for bincount
+        _, dense = np.unique(buckets, return_inverse=True)
+        w = np.bincount(dense, weights=weights)
+        self.weights = w
+        self.means = np.bincount(dense, weights=weights * means) / w
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """
+        Fold another digest (e.g. from another worker) into this one
+        """
+        other_means, other_weights = other.means, other.weights
+        if other._buffer:
+            points = np.concatenate(other._buffer)
+            other_means = np.concatenate([other_means, points])
+            other_weights = np.concatenate([other_weights, np.ones(len(points))])
+        if len(other_means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(other_means, other_weights)
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate one or more quantiles
+        Args:
+            q: float or array of floats in [0, 1]
+        Returns:
+            float or np.ndarray (nan while empty)
+        """
+        if self._buffer:
+            self._compress()
+        scalar = np.ndim(q) == 0
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if not len(self.means):
+            out = np.full(len(q), np.nan)
+            return float(out[0]) if scalar else out
+
+        total = self.weights.sum()
+        mids = np.cumsum(self.weights) - self.weights / 2
+        # anchor the ends on the exact min/max seen
+        xp = np.concatenate([[0.0], mids, [total]])
+        fp = np.concatenate([[self.min], self.means, [self.max]])
+        out = np.interp(q * total, xp, fp)
+        return float(out[0]) if scalar else out
+
+    def to_dict(self) -> dict:
+        if self._buffer:
+            self._compress()
+        return {
+            "compression": self.compression,
+            "min": self.min if np.isfinite(self.min) else None,
+            "max": self.max if np.isfinite(self.max) else None,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        digest = cls(compression=data["compression"])
+        digest.means = np.asarray(data["means"], dtype=np.float64)
+        digest.weights = np.asarray(data["weights"], dtype=np.float64)
+        digest.min = data["min"] if data["min"] is not None else np.inf
+        digest.max = data["max"] if data["max"] is not None else -np.inf
+        return digest
+
+
+class QuantileSketchStore:
+    """
+    A global t-digest plus one digest per value of each group column.
+
+    Example:
+        store = QuantileSketchStore(group_cols=("fund_id", "channel"))
+        store.update(batch)
+        thresholds = store.thresholds(batch, 0.95, group_col="fund_id")
+    """
+
+    GLOBAL = "__global__"
+
+    def __init__(self, value_col: str = "amount", group_cols=("fund_id", "channel"),
+                 compression: float = 200.0, min_count: int = 100):
+        """
+        Args:
+            value_col (str): column whose distribution is tracked
+            group_cols (tuple): columns that get per-value digests
+            compression (float): t-digest compression
+            min_count (int): observations a group digest needs before it is
+                used; smaller groups fall back to the global digest
+        """
+        self.value_col = value_col
+        self.group_cols = tuple(group_cols)
+        self.compression = compression
+        self.min_count = min_count
+        self.digests: Dict[str, Dict[str, TDigest]] = {self.GLOBAL: {self.GLOBAL: TDigest(compression)}}
+
+    def _digest(self, group_col: str, key) -> TDigest:
+        per_group = self.digests.setdefault(group_col, {})
+        key = str(key)
+        if key not in per_group:
+            per_group[key] = TDigest(self.compression)
+        return per_group[key]
+
+    @property
+    def global_digest(self) -> TDigest:
+        return self.digests[self.GLOBAL][self.GLOBAL]
+
+    def update(self, df: pd.DataFrame):
+        values = pd.to_numeric(df[self.value_col], errors="coerce").to_numpy(dtype=np.float64)
+        self.global_digest.add_many(values)
+        for col in self.group_cols:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            # one sort instead of a boolean mask per group
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for i, key in enumerate(uniques):
+                self._digest(col, key).add_many(values[order[bounds[i]:bounds[i + 1]]])
+
+    def quantile(self, q: float, group_col: Optional[str] = None, key=None) -> float:
+        if group_col is not None:
+            digest = self.digests.get(group_col, {}).get(str(key))
+            if digest is not None and digest.count >= self.min_count:
+                return digest.quantile(q)
+        return self.global_digest.quantile(q)
+
+    def thresholds(self, df: pd.DataFrame, q: float, group_col: Optional[str] = None) -> np.ndarray:
+        """
+        Per-row q-quantile of the row's group (global fallback), one lookup per group
+        """
+        global_value = self.global_digest.quantile(q)
+        if group_col is None or group_col not in df.columns:
+            return np.full(len(df), global_value)
+        codes, uniques = pd.factorize(df[group_col])
+        per_group = np.array([self.quantile(q, group_col, key) for key in uniques] + [global_value])
+        return per_group[np.where(codes < 0, len(uniques), codes)]
+
+    def merge(self, other: "QuantileSketchStore") -> "QuantileSketchStore":
+        for group_col, digests in other.digests.items():
+            for key, digest in digests.items():
+                if group_col == self.GLOBAL:
+                    self.global_digest.merge(digest)
+                else:
+                    self._digest(group_col, key).merge(digest)
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "value_col": self.value_col,
+            "group_cols": list(self.group_cols),
+            "compression": self.compression,
+            "min_count": self.min_count,
+            "digests": {col: {key: d.to_dict() for key, d in digests.items()}
+                        for col, digests in self.digests.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketchStore":
+        store = cls(data["value_col"], data["group_cols"], data["compression"], data["min_count"])
+        store.digests = {col: {key: TDigest.from_dict(d) for key, d in digests.items()}
+                         for col, digests in data["digests"].items()}
+        return store
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "QuantileSketchStore":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.aggregate_state import empty_aggregates, finalize_aggregates, merge_aggregates, partial_aggregates
+
+
+def _batch():
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        'user_id': rng.choice(['u1', 'u2', 'u3'], 500),
+        'amount': np.round(rng.lognormal(8, 1, 500), 2),
+        'timestamp': pd.date_range('2024-01-01', periods=500, freq='h'),
+    })
+
+
+def _incremental(df, splits, scale=None):
+    state = empty_aggregates(scale=scale)
+    for part in np.array_split(np.arange(len(df)), splits):
+        state = merge_aggregates(state, partial_aggregates(df.iloc[part], 'user_id', 'amount', 'timestamp', scale))
+    return finalize_aggregates(state, sort=True)
+
+
+def test_merged_batches_match_one_pass():
+    df = _batch()
+    expected = finalize_aggregates(partial_aggregates(df, 'user_id', 'amount', 'timestamp'), sort=True)
+    merged = _incremental(df, splits=7)
+
+    pd.testing.assert_frame_equal(merged.drop(columns=['sum', 'mean', 'std']),
+                                  expected.drop(columns=['sum', 'mean', 'std']))
+    np.testing.assert_allclose(merged[['sum', 'mean', 'std']], expected[['sum', 'mean', 'std']], rtol=1e-12)
+    grouped = df.groupby('user_id')['amount']
+    np.testing.assert_allclose(merged['std'], grouped.std().to_numpy(), rtol=1e-12)
+    assert (merged['last_ts'].to_numpy() == df.groupby('user_id')['timestamp'].max().to_numpy()).all()
+
+
+def test_scaled_sums_do_not_depend_on_the_split():
+    df = _batch()
+    one, many = _incremental(df, 1, scale=100), _incremental(df, 13, scale=100)
+    pd.testing.assert_series_equal(one['sum'], many['sum'])
+    pd.testing.assert_series_equal(one['mean'], many['mean'])
+
+
+def test_merging_another_scale_is_refused():
+    df = _batch()
+    state = merge_aggregates(empty_aggregates(scale=100), partial_aggregates(df, 'user_id', 'amount', scale=100))
+    with pytest.raises(ValueError):
+        merge_aggregates(state, partial_aggregates(df, 'user_id', 'amount'))
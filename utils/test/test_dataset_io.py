@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from utils.common_exceptions import ValidationError
+from utils.dataset_io import detect_format, iter_table, read_table
+
+
+def _transactions():
+    return pd.DataFrame({
+        'user_id': ['u1', 'u2', 'u1', 'u3'],
+        'amount': [10.0, 20.0, 30.0, 40.0],
+        'timestamp': pd.to_datetime(['2024-01-05', '2024-01-20', '2024-02-03', '2024-03-01']),
+    })
+
+
+def _write_partitioned(df, root):
+    for month, part in df.groupby(df['timestamp'].dt.strftime('%Y-%m')):
+        directory = root / f"month={month}"
+        directory.mkdir(parents=True)
+        part.to_parquet(directory / "part-0.parquet", index=False)
+
+
+def test_columnar_read_projects_and_filters(tmp_path):
+    root = tmp_path / "transactions"
+    _write_partitioned(_transactions(), root)
+    assert detect_format(str(root)) == "parquet"
+
+    out = read_table(str(root), columns=['user_id', 'amount'], user_ids=['u1'],
+                     start='2024-01-01', end='2024-01-31')
+    assert list(out.columns) == ['user_id', 'amount']
+    assert out['amount'].tolist() == [10.0]
+
+
+def test_csv_read_matches_the_columnar_filters(tmp_path):
+    path = tmp_path / "transactions.csv"
+    _transactions().to_csv(path, index=False)
+
+    out = read_table(str(path), columns=['user_id', 'amount'], user_ids=['u1'], start='2024-02-01')
+    assert out['amount'].tolist() == [30.0]
+
+
+def test_iter_table_streams_fixed_size_chunks(tmp_path):
+    root = tmp_path / "transactions"
+    _write_partitioned(_transactions(), root)
+    chunks = list(iter_table(str(root), columns=['amount'], chunk_rows=1))
+    assert sum(len(c) for c in chunks) == 4
+    assert all(len(c) <= 1 for c in chunks)
+
+
+def test_unsupported_paths_are_rejected(tmp_path):
+    with pytest.raises(ValidationError):
+        read_table(str(tmp_path / "missing.csv"))
+    (tmp_path / "data.txt").write_text("x")
+    with pytest.raises(ValidationError):
+        detect_format(str(tmp_path / "data.txt"))
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset_loader import DatasetLoader, UUIDCodec
+
+
+def _write_tables(data_dir):
+    pd.DataFrame({
+        'txn_id': ['t1', 't2', 't3'], 'user_id': ['a', 'b', 'a'], 'txn_type': ['debit', 'credit', 'debit'],
+        'amount': [1.5, 2.5, 3.5], 'timestamp': ['2024-01-01T10:00:00', '2024-01-02T10:00:00', None],
+        'counterparty': ['b', None, 'c'], 'status': ['ok', 'ok', 'failed'], 'risk_flag': ['low'] * 3,
+        'channel': ['upi', 'card', 'upi'], 'ip_address': ['1.1.1.1'] * 3, 'device_id': ['d1'] * 3,
+    }).to_csv(data_dir / "transactions.csv", index=False)
+    pd.DataFrame({
+        'edge_id': ['e1'], 'user_src': ['c'], 'user_dest': ['a'], 'relationship_type': ['peer'],
+        'weight': [0.5], 'last_interaction': ['2024-01-03T00:00:00'],
+    }).to_csv(data_dir / "collusion_graph.csv", index=False)
+
+
+def test_load_applies_the_typed_schema(tmp_path):
+    _write_tables(tmp_path)
+    loader = DatasetLoader(str(tmp_path), chunk_rows=2)
+    txns = loader.load("transactions")
+
+    assert txns['user_id'].dtype == np.int32
+    assert isinstance(txns['channel'].dtype, pd.CategoricalDtype)
+    assert txns['timestamp'].dtype.kind == 'M' and txns['timestamp'].isna().sum() == 1
+    assert txns['counterparty'].tolist()[1] == -1
+    assert loader.memory_report["transactions"]["rows"] == 3
+
+
+def test_user_codes_join_across_tables_and_decode(tmp_path):
+    _write_tables(tmp_path)
+    loader = DatasetLoader(str(tmp_path))
+    txns = loader.load("transactions", columns=['user_id', 'counterparty'])
+    edges = loader.load("collusion_graph", columns=['user_src', 'user_dest'])
+
+    assert edges['user_dest'].iloc[0] == txns['user_id'].iloc[0]
+    assert loader.decode("collusion_graph", "user_src", edges['user_src']).tolist() == ['c']
+
+
+def test_codec_round_trips_through_save_and_load(tmp_path):
+    codec = UUIDCodec(['a', 'b'])
+    codes = codec.encode(np.array(['b', None, 'c'], dtype=object))
+    assert codes.tolist() == [1, -1, 2]
+    codec.save(str(tmp_path / "user.npy"))
+
+    restored = UUIDCodec.load(str(tmp_path / "user.npy"))
+    assert restored.codes_for(['c', 'x']).tolist() == [2, -1]
+    assert restored.decode(np.array([0, -1])).tolist() == ['a', None]
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from utils.quantile_sketch import QuantileSketchStore, TDigest
+
+
+def test_tail_quantiles_are_close_to_exact_in_rank():
+    values = np.random.default_rng(2).lognormal(8, 1.5, 100_000)
+    digest = TDigest()
+    digest.add_many(values)
+    for q in (0.5, 0.95, 0.99, 0.999):
+        rank = (values <= digest.quantile(q)).mean()
+        assert abs(rank - q) < 5e-4
+    assert len(digest.means) < 2 * digest.compression
+
+
+def test_merged_digests_agree_with_one_digest():
+    values = np.random.default_rng(3).normal(100, 10, 40_000)
+    whole, merged = TDigest(), TDigest()
+    whole.add_many(values)
+    for part in np.array_split(values, 4):
+        worker = TDigest()
+        worker.add_many(part)
+        merged.merge(worker)
+    assert merged.count == whole.count
+    np.testing.assert_allclose(merged.quantile([0.05, 0.95]), whole.quantile([0.05, 0.95]), rtol=1e-3)
+
+
+def test_small_groups_fall_back_to_the_global_digest(tmp_path):
+    df = pd.DataFrame({'amount': np.r_[np.arange(1, 201, dtype=float), [5000.0]],
+                       'fund_id': ['big'] * 200 + ['small']})
+    store = QuantileSketchStore(group_cols=('fund_id',), min_count=100)
+    store.update(df)
+    path = str(tmp_path / 'sketch.json')
+    store.save(path)
+    restored = QuantileSketchStore.load(path)
+
+    thresholds = restored.thresholds(pd.DataFrame({'fund_id': ['big', 'small', None]}), 0.5, 'fund_id')
+    assert thresholds[0] == restored.quantile(0.5, 'fund_id', 'big')
+    assert thresholds[1] == thresholds[2] == restored.global_digest.quantile(0.5)